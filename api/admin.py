@@ -26,4 +26,15 @@ admin.site.register(Campaign_Time)
 admin.site.register(Impression)
 admin.site.register(Impression_Detail)
 admin.site.register(Impression_Reach_Id)
+admin.site.register(Gps_Device_Id)
+admin.site.register(Impression_Hourly)
+admin.site.register(Impression_Daily)
+admin.site.register(Ingestion_Job)
+admin.site.register(Ingestion_Batch)
+admin.site.register(Rollup_Watermark)
+admin.site.register(Rollup_Refresh)
+admin.site.register(Live_Counter_Flush)
+admin.site.register(Event_Archive)
+admin.site.register(Billboard_Poi_Catchment)
+admin.site.register(Billboard_Zone)
 # Register your models here.
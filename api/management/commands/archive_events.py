@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from api.services.retention import archive_cv_events, archive_gps_events
+
+
+class Command(BaseCommand):
+    help = "Archive Cv/Gps rows older than the retention window to gzipped NDJSON files and delete them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=['cv', 'gps', 'all'], default='all')
+        parser.add_argument('--days', type=int, default=None, help="Override CV_RETENTION_DAYS / GPS_RETENTION_DAYS")
+
+    def handle(self, *args, **options):
+        archives = []
+        if options['kind'] in ('cv', 'all'):
+            archives += archive_cv_events(options['days'])
+        if options['kind'] in ('gps', 'all'):
+            archives += archive_gps_events(options['days'])
+        for archive in archives:
+            self.stdout.write(f"{archive.kind} {archive.date}: {archive.row_count} rows -> {archive.file.name}")
+        self.stdout.write(self.style.SUCCESS(f"Archived {sum(archive.row_count for archive in archives)} rows"))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import Cv, Rollup_Watermark
+from api.services.cv_rollup import CV_LEGACY_ROLLUP_BATCH, CV_WATERMARK
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark the Cv rows the id watermark already rolled up, run once before the first batch-marked rollup "
+        "so they are not counted again"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            watermark = Rollup_Watermark.objects.select_for_update().filter(name=CV_WATERMARK).first()
+            if watermark is None:
+                self.stdout.write("No rollup watermark, nothing to mark")
+                return
+            marked = 0
+            last_id = 0
+            while last_id < watermark.last_id:
+                upper = min(last_id + options['batch_size'], watermark.last_id)
+                marked += Cv.objects.filter(
+                    id__gt=last_id, id__lte=upper, rollup_batch__isnull=True,
+                ).update(rollup_batch=CV_LEGACY_ROLLUP_BATCH)
+                last_id = upper
+        self.stdout.write(self.style.SUCCESS(
+            f"Marked {marked} Cv rows up to id {watermark.last_id} as rolled up"
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Impression
+from api.services.rollup import rebuild_all_impression_rollups
+from api.services.sketches import QuantileSketch
+
+
+class Command(BaseCommand):
+    help = "Seed dwell time quantile sketches of impressions stored before they existed and rebuild the rollups"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        # only the stored mean survives for these rows, it counts as one sample
+        impressions = Impression.objects.filter(dwalltime__isnull=False, dwalltime_sketch__isnull=True).only('id', 'dwalltime')
+        batch = []
+        updated = 0
+        for impression in impressions.iterator(chunk_size=options['batch_size']):
+            try:
+                impression.dwalltime_sketch = QuantileSketch.from_values([impression.dwalltime]).to_bytes()
+            except ValueError:
+                # negative or non-finite legacy means cannot be binned
+                continue
+            batch.append(impression)
+            if len(batch) >= options['batch_size']:
+                updated += Impression.objects.bulk_update(batch, ['dwalltime_sketch'])
+                batch = []
+        updated += Impression.objects.bulk_update(batch, ['dwalltime_sketch'])
+        total = rebuild_all_impression_rollups(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Seeded dwell sketches of {updated} impressions, rebuilt {total} hourly rollup buckets"))
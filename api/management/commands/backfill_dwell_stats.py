@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from api.models import Impression
+from api.services.rollup import rebuild_all_impression_rollups
+
+
+class Command(BaseCommand):
+    help = "Seed the dwell time state of impressions stored before it existed and rebuild the rollups"
+
+    def handle(self, *args, **options):
+        # only the stored mean survives for these rows, it counts as one sample
+        updated = Impression.objects.filter(dwalltime__isnull=False, dwalltime_count=0).update(
+            dwalltime_count=1,
+            dwalltime_sum=F('dwalltime'),
+            dwalltime_sum_sq=F('dwalltime') * F('dwalltime'),
+            dwalltime_min=F('dwalltime'),
+            dwalltime_max=F('dwalltime'),
+        )
+        total = rebuild_all_impression_rollups()
+        self.stdout.write(self.style.SUCCESS(f"Seeded dwell state of {updated} impressions, rebuilt {total} hourly rollup buckets"))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Billboard, Poi
+from api.services.bulk import update_rows
+from api.services.geo import encode_geohash
+
+
+class Command(BaseCommand):
+    help = "Fill the geohash of Billboard and Poi rows from their latitude/longitude"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        for model in (Billboard, Poi):
+            queryset = model.objects.order_by('id').values_list('id', 'latitude', 'longitude', 'geohash')
+            updated = 0
+            last_id = 0
+            while True:
+                rows = list(queryset.filter(id__gt=last_id)[:options['batch_size']])
+                if not rows:
+                    break
+                changed = [
+                    (geohash, pk) for pk, geohash, current in (
+                        (pk, encode_geohash(latitude, longitude), current) for pk, latitude, longitude, current in rows
+                    ) if geohash != current
+                ]
+                updated += update_rows(model, ['geohash'], changed)
+                last_id = rows[-1][0]
+            self.stdout.write(self.style.SUCCESS(f"Updated the geohash of {updated} {model.__name__} rows"))
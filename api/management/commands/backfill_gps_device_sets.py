@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from api.models import Gps
+from api.services.gps_devices import GPS_DEVICE_FIELDS, encode_gps_devices
+
+
+class Command(BaseCommand):
+    help = "Encode the device_ids / ips text of Gps rows into interned id sets and reach sketches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--all', action='store_true', help="Re-encode rows that already have sets")
+
+    def handle(self, *args, **options):
+        queryset = Gps.objects.filter(Q(device_ids__isnull=False) | Q(ips__isnull=False))
+        if not options['all']:
+            queryset = queryset.filter(device_set__isnull=True, ip_set__isnull=True)
+        queryset = queryset.order_by('id').only('id', 'device_ids', 'ips')
+
+        encoded = 0
+        last_id = 0
+        while True:
+            rows = list(queryset.filter(id__gt=last_id)[:options['batch_size']])
+            if not rows:
+                break
+            Gps.objects.bulk_update(encode_gps_devices(rows), GPS_DEVICE_FIELDS)
+            encoded += len(rows)
+            last_id = rows[-1].id
+        self.stdout.write(self.style.SUCCESS(f"Encoded device sets of {encoded} gps rows"))
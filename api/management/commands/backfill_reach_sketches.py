@@ -0,0 +1,43 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from api.models import Impression
+from api.services.rollup import refresh_impression_rollups
+from api.services.sketches import HyperLogLog
+
+
+class Command(BaseCommand):
+    help = "Build reach sketches for impressions that only have Impression_Reach_Id rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        through = Impression.reach.through
+        total = 0
+        last_id = 0
+        while True:
+            impressions = list(
+                Impression.objects.filter(id__gt=last_id, reach_sketch__isnull=True)
+                .order_by('id').only('id', 'billboard_id', 'date')[:batch_size]
+            )
+            if not impressions:
+                break
+            last_id = impressions[-1].id
+
+            reach_ids = defaultdict(list)
+            for impression_id, reach_id in through.objects.filter(
+                impression_id__in=[impression.id for impression in impressions]
+            ).values_list('impression_id', 'impression_reach_id__reach_id'):
+                reach_ids[impression_id].append(reach_id)
+
+            for impression in impressions:
+                impression.reach_sketch = HyperLogLog.from_values(reach_ids[impression.id]).to_bytes()
+            Impression.objects.bulk_update(impressions, ['reach_sketch'])
+            refresh_impression_rollups((impression.billboard_id, impression.date) for impression in impressions)
+            total += len(impressions)
+            self.stdout.write(f"{total} impressions sketched")
+
+        self.stdout.write(self.style.SUCCESS(f"Built reach sketches for {total} impressions"))
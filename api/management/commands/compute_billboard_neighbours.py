@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.services.neighbours import compute_billboard_neighbours
+
+
+class Command(BaseCommand):
+    help = "Recompute distance_of_closest_neighbour_m and total_neighbours of every Billboard_info"
+
+    def handle(self, *args, **options):
+        updated = compute_billboard_neighbours()
+        self.stdout.write(self.style.SUCCESS(f"Updated neighbours of {updated} billboard infos"))
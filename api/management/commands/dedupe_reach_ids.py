@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Min
+
+from api.models import Impression, Impression_Reach_Id
+from api.services.bulk import table_columns
+
+
+class Command(BaseCommand):
+    help = (
+        "Collapse Impression_Reach_Id rows sharing a reach_id onto one row. "
+        "Deploys run it before migrate, which adds the unique reach_id index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if not table_columns(Impression_Reach_Id):
+            self.stdout.write(self.style.SUCCESS("No reach id table yet, nothing to collapse"))
+            return
+        through = Impression.reach.through
+        duplicates = Impression_Reach_Id.objects.filter(reach_id__isnull=False).order_by().values('reach_id').annotate(
+            keep_id=Min('id'), rows=Count('id')
+        ).filter(rows__gt=1)
+
+        removed = 0
+        batch = []
+        for duplicate in duplicates.iterator():
+            batch.append(duplicate)
+            if len(batch) >= options['batch_size']:
+                removed += self.collapse(through, batch)
+                batch = []
+        if batch:
+            removed += self.collapse(through, batch)
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} duplicate reach ids"))
+
+    @transaction.atomic
+    def collapse(self, through, duplicates):
+        keep_ids = {duplicate['reach_id']: duplicate['keep_id'] for duplicate in duplicates}
+        stale = Impression_Reach_Id.objects.filter(reach_id__in=keep_ids).exclude(id__in=keep_ids.values())
+        stale_ids = dict(stale.values_list('id', 'reach_id'))
+
+        links = through.objects.filter(impression_reach_id_id__in=stale_ids).values_list('impression_id', 'impression_reach_id_id')
+        through.objects.bulk_create(
+            [
+                through(impression_id=impression_id, impression_reach_id_id=keep_ids[stale_ids[reach_pk]])
+                for impression_id, reach_pk in links
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        through.objects.filter(impression_reach_id_id__in=stale_ids).delete()
+        Impression_Reach_Id.objects.filter(id__in=stale_ids).delete()
+        return len(stale_ids)
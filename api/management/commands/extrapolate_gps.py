@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.services.extrapolation import GPS_EXTRAPOLATION_BATCH_SIZE, extrapolate_gps
+
+
+class Command(BaseCommand):
+    help = "Recompute extrapolated_ots/lts/reach of Gps rows, e.g. after changing extrapolation factors or baselines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start-date', default=None)
+        parser.add_argument('--end-date', default=None, help="Inclusive")
+        parser.add_argument('--batch-size', type=int, default=GPS_EXTRAPOLATION_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        updated = extrapolate_gps(options['start_date'], options['end_date'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Extrapolated {updated} gps rows"))
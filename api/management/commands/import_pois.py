@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.poi_import import POI_IMPORT_BATCH_SIZE, PoiImporter
+from api.services.streaming import UploadFormatError, chunked, iter_records
+
+
+class Command(BaseCommand):
+    help = "Import POIs from an NDJSON or CSV file (optionally gzipped), merging spatial duplicates"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', default=None, help="csv or ndjson, detected from the file name when omitted")
+
+    def handle(self, *args, **options):
+        importer = PoiImporter()
+        with open(options['path'], 'rb') as upload:
+            try:
+                offset = 0
+                for chunk in chunked(iter_records(upload, options['format']), POI_IMPORT_BATCH_SIZE):
+                    importer.ingest(chunk, offset)
+                    offset += len(chunk)
+            except UploadFormatError as e:
+                raise CommandError(str(e))
+            finally:
+                importer.refresh_catchments()
+        for error in importer.errors:
+            self.stderr.write(f"Row {error['index']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {importer.created}, merged {importer.merged}, rejected {importer.rejected} pois"
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max
+
+from api.models import Gps
+from api.services.bulk import table_columns
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove Gps rows sharing a (billboard, view, date, hour) bucket, keeping the latest one. "
+        "Deploys run it before migrate, which adds the unique_gps_bucket constraints."
+    )
+
+    def handle(self, *args, **options):
+        if not table_columns(Gps):
+            self.stdout.write(self.style.SUCCESS("No gps table yet, nothing to remove"))
+            return
+        duplicates = Gps.objects.order_by().values('billboard_id', 'view_id', 'date', 'hour').annotate(
+            rows=Count('id'), keep=Max('id')
+        ).filter(rows__gt=1)
+        removed = 0
+        for bucket in duplicates.iterator():
+            with transaction.atomic():
+                removed += Gps.objects.filter(
+                    billboard_id=bucket['billboard_id'], view_id=bucket['view_id'],
+                    date=bucket['date'], hour=bucket['hour'],
+                ).exclude(id=bucket['keep']).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} duplicate gps rows"))
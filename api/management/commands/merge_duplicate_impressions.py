@@ -0,0 +1,72 @@
+from statistics import mean
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from api.models import Impression, Impression_Hourly
+from api.services.bulk import delete_rows, table_columns, update_rows
+from api.services.constants import OBJECT_TYPE_COUNT_FIELDS
+from api.services.dwell import DWELL_FIELDS, merge_dwell_state, refresh_dwalltime
+from api.services.rollup import refresh_impression_rollups
+from api.services.sketches import merge_quantile_sketches, merge_sketches
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge Impression rows sharing a (billboard, date, hour) bucket. "
+        "Deploys run it before migrate, which adds the unique_impression_bucket constraint, "
+        "so it only merges the columns the table already has."
+    )
+
+    def handle(self, *args, **options):
+        columns = table_columns(Impression)
+        if not columns:
+            self.stdout.write(self.style.SUCCESS("No impressions table yet, nothing to merge"))
+            return
+        counts = ['impressions', 'ots', 'lts', 'frequency'] + list(OBJECT_TYPE_COUNT_FIELDS.values())
+        sums = [field for field in counts if field in columns]
+        dwell_state = set(DWELL_FIELDS) <= columns
+        fields = sums + ['dwalltime'] + (DWELL_FIELDS if dwell_state else [])
+        if 'reach_sketch' in columns:
+            fields.append('reach_sketch')
+        rollups = bool(table_columns(Impression_Hourly))
+
+        duplicates = Impression.objects.order_by().values('billboard_id', 'date', 'hour').annotate(
+            rows=Count('id')
+        ).filter(rows__gt=1)
+        merged = 0
+        for bucket in duplicates.iterator():
+            with transaction.atomic():
+                impressions = list(Impression.objects.filter(
+                    billboard_id=bucket['billboard_id'], date=bucket['date'], hour=bucket['hour']
+                ).only('billboard_id', 'date', 'hour', *fields).order_by('id'))
+                keep, others = impressions[0], impressions[1:]
+                for field in sums:
+                    setattr(keep, field, sum(getattr(impression, field) or 0 for impression in impressions))
+                if dwell_state:
+                    for other in others:
+                        merge_dwell_state(keep, other)
+                    dwell_sketch = merge_quantile_sketches(impression.dwalltime_sketch for impression in impressions)
+                    keep.dwalltime_sketch = dwell_sketch.to_bytes() if dwell_sketch.count else None
+                if dwell_state and keep.dwalltime_count:
+                    refresh_dwalltime(keep)
+                else:
+                    # legacy rows without dwell state only have their means
+                    dwalltimes = [impression.dwalltime for impression in impressions if impression.dwalltime is not None]
+                    keep.dwalltime = mean(dwalltimes) if dwalltimes else None
+                if 'reach_sketch' in fields:
+                    keep.reach_sketch = merge_sketches(impression.reach_sketch for impression in impressions).to_bytes()
+                for other in others:
+                    keep.reach.add(*other.reach.all())
+                    keep.impression_detail.add(*other.impression_detail.all())
+                update_rows(Impression, fields, [[getattr(keep, field) for field in fields] + [keep.id]])
+                # the rollup tables may not exist yet, so no delete signals
+                other_ids = [other.id for other in others]
+                Impression.reach.through.objects.filter(impression_id__in=other_ids).delete()
+                Impression.impression_detail.through.objects.filter(impression_id__in=other_ids).delete()
+                delete_rows(Impression, other_ids)
+            if rollups:
+                refresh_impression_rollups([(bucket['billboard_id'], bucket['date'])])
+            merged += len(others)
+        self.stdout.write(self.style.SUCCESS(f"Merged {merged} duplicate impressions"))
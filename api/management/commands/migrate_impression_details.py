@@ -0,0 +1,51 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from api.models import Impression, Impression_Detail
+from api.services.constants import OBJECT_TYPE_COUNT_FIELDS
+from api.services.rollup import refresh_impression_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the Impression_Detail vehicle breakdown into the per object_type count columns "
+        "of Impression and drop the migrated detail rows"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        through = Impression.impression_detail.through
+        migrated = 0
+        while True:
+            impression_ids = list(
+                through.objects.order_by('impression_id').values_list('impression_id', flat=True).distinct()[:options['batch_size']]
+            )
+            if not impression_ids:
+                break
+            with transaction.atomic():
+                links = through.objects.filter(impression_id__in=impression_ids)
+                counts = defaultdict(dict)
+                for row in links.values('impression_id', 'impression_detail__vehicle_type').annotate(
+                    total=Sum('impression_detail__vehicle_count')
+                ):
+                    field = OBJECT_TYPE_COUNT_FIELDS.get(row['impression_detail__vehicle_type'], 'other_count')
+                    counts[row['impression_id']][field] = counts[row['impression_id']].get(field, 0) + (row['total'] or 0)
+
+                # counts written by the rollup since the columns exist are kept and added to
+                impressions = list(Impression.objects.select_for_update().filter(id__in=impression_ids))
+                for impression in impressions:
+                    for field, total in counts[impression.id].items():
+                        setattr(impression, field, getattr(impression, field) + total)
+                Impression.objects.bulk_update(impressions, list(OBJECT_TYPE_COUNT_FIELDS.values()), batch_size=500)
+
+                detail_ids = list(links.values_list('impression_detail_id', flat=True))
+                links.delete()
+                Impression_Detail.objects.filter(id__in=detail_ids, impressions__isnull=True).delete()
+            refresh_impression_rollups({(impression.billboard_id, impression.date) for impression in impressions})
+            migrated += len(impressions)
+        self.stdout.write(self.style.SUCCESS(f"Migrated the vehicle breakdown of {migrated} impressions"))
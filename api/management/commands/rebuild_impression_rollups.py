@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.services.rollup import rebuild_all_impression_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the hourly and daily impression rollup tables from the Impression rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        total = rebuild_all_impression_rollups(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} hourly rollup buckets"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api.services.catchment import rebuild_billboard_catchments
+
+
+class Command(BaseCommand):
+    help = "Rebuild the POI catchment rows of every billboard, e.g. after changing POI_CATCHMENT_RADII_M"
+
+    def handle(self, *args, **options):
+        rows = rebuild_billboard_catchments()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} poi catchment rows"))
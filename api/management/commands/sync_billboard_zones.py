@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from api.models import Billboard_info
+from api.services.zones import sync_billboard_zones
+
+
+class Command(BaseCommand):
+    help = "Parse the visible_zone / observation_zone text of every Billboard_info into Billboard_Zone rows"
+
+    def handle(self, *args, **options):
+        infos = Billboard_info.objects.filter(
+            Q(visible_zone__isnull=False) | Q(observation_zone__isnull=False) | Q(zones__isnull=False)
+        ).distinct().only('id', 'visible_zone', 'observation_zone')
+        errors = sync_billboard_zones(infos.iterator())
+        for info_id, info_errors in errors.items():
+            for error in info_errors:
+                self.stderr.write(f"Billboard_info {info_id}: {error}")
+        self.stdout.write(self.style.SUCCESS(f"Synced zones, {len(errors)} infos with unreadable zones"))
@@ -1,10 +1,28 @@
 import uuid
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
 from django.contrib.auth.models import User
 from phonenumber_field.modelfields import PhoneNumberField
 from api.services.constants import *
 from django.utils import timezone
 from multiselectfield import MultiSelectField
+from api.services.geo import encode_geohash
+
+
+def set_geohash(instance, save_kwargs):
+    instance.geohash = encode_geohash(instance.latitude, instance.longitude)
+    update_fields = save_kwargs.get('update_fields')
+    if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+        save_kwargs['update_fields'] = {*update_fields, 'geohash'}
+
+
+def ingestion_upload_storage():
+    return FileSystemStorage(location=settings.INGESTION_UPLOAD_ROOT)
+
+
+def event_archive_storage():
+    return FileSystemStorage(location=settings.EVENT_ARCHIVE_ROOT)
 
 
 class Monitor(models.Model):
@@ -52,9 +70,15 @@ class Billboard(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     views = models.ManyToManyField('Billboard_View', related_name='billboards',blank=True,null=True)
+    # maintained from latitude/longitude in save(), see api.services.geo
+    geohash = models.CharField(max_length=12, null=True, blank=True, db_index=True)
 
     def __str__(self):
         return self.title 
+
+    def save(self, *args, **kwargs):
+        set_geohash(self, kwargs)
+        super().save(*args, **kwargs)
     
 class Billboard_View(models.Model):
     camera_id = models.CharField(max_length=255,null=True, blank=True)
@@ -239,11 +263,35 @@ class Poi(models.Model):
     bc_sub_category = models.CharField(choices=POI_TYPE, max_length=200, null=True, blank=True)
     source = models.CharField( max_length=200, null=True, blank=True)
     status = models.CharField(choices=POI_STATUS, max_length=200, null=True, blank=True)
+    geohash = models.CharField(max_length=12, null=True, blank=True, db_index=True)
     
     
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        set_geohash(self, kwargs)
+        super().save(*args, **kwargs)
     
+class Billboard_Poi_Catchment(models.Model):
+    # active POIs of a bc_category within radius_m of the billboard, see api.services.catchment
+    billboard = models.ForeignKey('Billboard', on_delete=models.CASCADE,related_name='poi_catchments')
+    bc_category = models.CharField(choices=BC_CATEGORY, max_length=200)
+    radius_m = models.IntegerField()
+    poi_count = models.IntegerField(default=0)
+    nearest_m = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['billboard', 'bc_category', 'radius_m'], name='unique_poi_catchment'),
+        ]
+        indexes = [
+            models.Index(fields=['bc_category', 'radius_m', 'poi_count'], name='poi_catchment_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return str(self.billboard_id) + " - " + self.bc_category + " - " + str(self.radius_m)
+
 class Cv_count(models.Model):
     object_type = models.CharField(max_length=255,null=True, blank=True,choices=OBJECT_TYPE)
     week_day = models.CharField(max_length=50,null=True, blank=True,choices=WEEK_DAY)
@@ -275,6 +323,25 @@ class Gps(models.Model):
     extrapolated_ots = models.IntegerField(null=True, blank=True)
     extrapolated_lts = models.IntegerField(null=True, blank=True)
     extrapolated_reach = models.IntegerField(null=True, blank=True)
+    # interned Gps_Device_Id ids of device_ids / ips, see api.services.id_sets
+    device_set = models.BinaryField(null=True, blank=True)
+    ip_set = models.BinaryField(null=True, blank=True)
+    device_sketch = models.BinaryField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'hour'], name='gps_date_hour_idx'),
+        ]
+        # NULLs are distinct in unique indexes, so buckets without a view
+        # get their own constraint
+        constraints = [
+            models.UniqueConstraint(
+                fields=['billboard', 'view', 'date', 'hour'], condition=models.Q(view__isnull=False), name='unique_gps_bucket',
+            ),
+            models.UniqueConstraint(
+                fields=['billboard', 'date', 'hour'], condition=models.Q(view__isnull=True), name='unique_gps_bucket_without_view',
+            ),
+        ]
     
     def __str__(self):
         return str(self.billboard.title + " - " + str(self.date) + " - " + str(self.hour))
@@ -288,6 +355,15 @@ class Cv(models.Model):
     exit_time = models.DateTimeField(null=True, blank=True)
     dwell_time = models.FloatField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # the rollup batch that counted this row into Impression, null while
+    # pending, -1 when its dwell time could not be counted
+    rollup_batch = models.BigIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['entry_time'], name='cv_entry_time_idx'),
+            models.Index(fields=['rollup_batch'], name='cv_rollup_batch_idx'),
+        ]
     
     def __str__(self):
         return str(self.camera_id + " - " + str(self.billboard.title))
@@ -305,13 +381,105 @@ class Impression(models.Model):
     ots = models.IntegerField(null=True, blank=True)
     lts = models.IntegerField(null=True, blank=True)
     impression_detail = models.ManyToManyField('Impression_Detail', related_name='impressions', blank=True)
+    reach_sketch = models.BinaryField(null=True, blank=True)
+    dwalltime_sketch = models.BinaryField(null=True, blank=True)
+    person_count = models.IntegerField(default=0)
+    car_count = models.IntegerField(default=0)
+    bus_count = models.IntegerField(default=0)
+    motorcycle_count = models.IntegerField(default=0)
+    truck_count = models.IntegerField(default=0)
+    van_count = models.IntegerField(default=0)
+    animal_count = models.IntegerField(default=0)
+    other_count = models.IntegerField(default=0)
+    # dwalltime is the mean of the dwell state below
+    dwalltime_count = models.IntegerField(default=0)
+    dwalltime_sum = models.FloatField(default=0)
+    dwalltime_sum_sq = models.FloatField(default=0)
+    dwalltime_min = models.FloatField(null=True, blank=True)
+    dwalltime_max = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['billboard', 'date', 'hour'], name='unique_impression_bucket'),
+        ]
+
     def __str__(self):
         return str(self.billboard.title + " - " + str(self.date) + " - " + str(self.hour))
     
+class Impression_Hourly(models.Model):
+    billboard = models.ForeignKey('Billboard', on_delete=models.DO_NOTHING,related_name='impression_hourly')
+    date = models.DateField()
+    hour = models.IntegerField()
+    impressions = models.IntegerField(default=0)
+    ots = models.IntegerField(default=0)
+    lts = models.IntegerField(default=0)
+    dwalltime_sum = models.FloatField(default=0)
+    dwalltime_count = models.IntegerField(default=0)
+    dwalltime_sum_sq = models.FloatField(default=0)
+    dwalltime_min = models.FloatField(null=True, blank=True)
+    dwalltime_max = models.FloatField(null=True, blank=True)
+    reach_sketch = models.BinaryField(null=True, blank=True)
+    dwalltime_sketch = models.BinaryField(null=True, blank=True)
+    person_count = models.IntegerField(default=0)
+    car_count = models.IntegerField(default=0)
+    bus_count = models.IntegerField(default=0)
+    motorcycle_count = models.IntegerField(default=0)
+    truck_count = models.IntegerField(default=0)
+    van_count = models.IntegerField(default=0)
+    animal_count = models.IntegerField(default=0)
+    other_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['billboard', 'date', 'hour'], name='unique_impression_hourly'),
+        ]
+
+    def __str__(self):
+        return str(str(self.billboard_id) + " - " + str(self.date) + " - " + str(self.hour))
+
+class Impression_Daily(models.Model):
+    billboard = models.ForeignKey('Billboard', on_delete=models.DO_NOTHING,related_name='impression_daily')
+    date = models.DateField()
+    impressions = models.IntegerField(default=0)
+    ots = models.IntegerField(default=0)
+    lts = models.IntegerField(default=0)
+    dwalltime_sum = models.FloatField(default=0)
+    dwalltime_count = models.IntegerField(default=0)
+    dwalltime_sum_sq = models.FloatField(default=0)
+    dwalltime_min = models.FloatField(null=True, blank=True)
+    dwalltime_max = models.FloatField(null=True, blank=True)
+    reach_sketch = models.BinaryField(null=True, blank=True)
+    dwalltime_sketch = models.BinaryField(null=True, blank=True)
+    person_count = models.IntegerField(default=0)
+    car_count = models.IntegerField(default=0)
+    bus_count = models.IntegerField(default=0)
+    motorcycle_count = models.IntegerField(default=0)
+    truck_count = models.IntegerField(default=0)
+    van_count = models.IntegerField(default=0)
+    animal_count = models.IntegerField(default=0)
+    other_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['billboard', 'date'], name='unique_impression_daily'),
+        ]
+
+    def __str__(self):
+        return str(str(self.billboard_id) + " - " + str(self.date))
+
 class Impression_Reach_Id(models.Model):
-    reach_id = models.CharField(max_length=255,null=True, blank=True)
+    reach_id = models.CharField(max_length=255,null=True, blank=True, unique=True)
     def __str__(self):
         return str(self.reach_id)
+
+class Gps_Device_Id(models.Model):
+    # Gps device ids and "ip:" prefixed ips, kept apart from the impression reach ids
+    device_id = models.CharField(max_length=255, unique=True)
+
+    def __str__(self):
+        return self.device_id
     
 class Impression_Detail(models.Model):
     vehicle_type = models.CharField(max_length=255,null=True, blank=True,choices=OBJECT_TYPE)
@@ -323,6 +491,112 @@ class Impression_Detail(models.Model):
         return str(self.vehicle_type + " - " + str(self.vehicle_count))
     
     
+class Rollup_Watermark(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name + " - " + str(self.last_id)
+
+class Rollup_Refresh(models.Model):
+    # a (billboard, date) whose impressions changed and whose rollups are not
+    # refreshed yet, written in the same transaction as the change
+    billboard = models.ForeignKey('Billboard', on_delete=models.DO_NOTHING,related_name='rollup_refreshes')
+    date = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return str(self.billboard_id) + " - " + str(self.date)
+
+class Live_Counter_Flush(models.Model):
+    # a live counter flush whose hashes are merged into Impression but may
+    # still be in Redis, written in the same transaction as the merge
+    token = models.CharField(max_length=32, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.token
+
+class Billboard_Zone(models.Model):
+    # Billboard_info.visible_zone / observation_zone parsed by api.services.zones
+    info = models.ForeignKey('Billboard_info', on_delete=models.CASCADE,related_name='zones')
+    kind = models.CharField(max_length=20, choices=ZONE_KIND)
+    # [polygon [ring [[longitude, latitude], ...], ...], ...], first ring outer, the rest holes
+    polygons = models.JSONField()
+    min_latitude = models.FloatField()
+    min_longitude = models.FloatField()
+    max_latitude = models.FloatField()
+    max_longitude = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['info', 'kind'], name='unique_billboard_zone'),
+        ]
+
+    def __str__(self):
+        return str(self.info_id) + " - " + self.kind
+
+class Event_Archive(models.Model):
+    kind = models.CharField(max_length=10, choices=EVENT_ARCHIVE_KIND)
+    date = models.DateField()
+    file = models.FileField(upload_to='event_archives/', storage=event_archive_storage)
+    row_count = models.IntegerField(default=0)
+    first_id = models.BigIntegerField(null=True, blank=True)
+    last_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'date'], name='event_archive_kind_date_idx'),
+        ]
+
+    def __str__(self):
+        return self.kind + " - " + str(self.date) + " - " + str(self.row_count)
+
+class Ingestion_Job(models.Model):
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING,related_name='ingestion_jobs',null=True, blank=True)
+    file = models.FileField(upload_to='ingestion_uploads/', storage=ingestion_upload_storage)
+    file_format = models.CharField(max_length=20)
+    checksum = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=20, choices=INGESTION_STATUS, default='PENDING')
+    total_rows = models.IntegerField(default=0)
+    total_batches = models.IntegerField(default=0)
+    processed_batches = models.IntegerField(default=0)
+    skipped_batches = models.IntegerField(default=0)
+    failed_batches = models.IntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return str(self.uuid) + " - " + self.status
+
+class Ingestion_Batch(models.Model):
+    job = models.ForeignKey('Ingestion_Job', on_delete=models.CASCADE,related_name='batches')
+    index = models.IntegerField()
+    checksum = models.CharField(max_length=64, db_index=True)
+    # set to checksum by the batch that ingests this content, the unique
+    # constraint stops a second batch with the same content
+    claimed_checksum = models.CharField(max_length=64, null=True, blank=True, unique=True)
+    payload = models.TextField(blank=True)
+    row_count = models.IntegerField(default=0)
+    status = models.CharField(max_length=20, choices=INGESTION_STATUS, default='PENDING')
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'index'], name='unique_ingestion_batch'),
+        ]
+
+    def __str__(self):
+        return str(self.job.uuid) + " - " + str(self.index) + " - " + self.status
+
 class Withdrawal(models.Model):
     user = models.ForeignKey(User, on_delete=models.DO_NOTHING,related_name='withdrawals')
     task_count = models.IntegerField(null=True, blank=True)
@@ -7,6 +7,7 @@ from .models import *
 from django.shortcuts import get_object_or_404
 from drf_spectacular.utils import extend_schema_field
 from collections import defaultdict
+from api.services.catchment import summarize_catchments
 
 def parse_iso8601(s):
     s = s.rstrip('Z')  # Remove trailing 'Z' if present
@@ -112,9 +113,20 @@ class Campaign_TimeSerializer(serializers.ModelSerializer):
 class CustomBillboardSerializer(serializers.ModelSerializer):
     location = LocationSerializer(required=False, allow_null=True)
     views = serializers.SerializerMethodField(required=False, allow_null=True)
+    poi_catchment = serializers.SerializerMethodField()
     class Meta:
         model = Billboard
-        fields = ['uuid',  'title', 'location', 'views','latitude','longitude']
+        fields = ['uuid',  'title', 'location', 'views','latitude','longitude','poi_catchment']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # opt-in with context={'poi_catchment': True}, prefetch poi_catchments for lists
+        if not self.context.get('poi_catchment'):
+            self.fields.pop('poi_catchment')
+
+    def get_poi_catchment(self, obj):
+        # {bc_category: {radius_m: {count, nearest_m}}}
+        return summarize_catchments(obj.poi_catchments.all()).get(obj.id, {})
 
     def get_views(self, obj):
         billboard_views = obj.views.all()
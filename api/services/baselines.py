@@ -0,0 +1,100 @@
+import uuid
+from datetime import date as date_type
+
+from django.core.cache import cache
+
+from api.models import Cv_count
+from api.services.constants import WEEK_DAY
+
+
+BASELINE_VERSION_KEY = 'baselines:version'
+BASELINE_CACHE_TIMEOUT = 24 * 60 * 60
+WEEK_DAYS = [value for value, _ in WEEK_DAY]
+
+
+# Active Cv_count rows are held as a lookup keyed by (object_type, weekday,
+# hour), each entry a short list of validity windows. Workers share the
+# built matrix through the cache under a version token; saving or deleting
+# a Cv_count row replaces the token so every process rebuilds once.
+
+class BaselineMatrix:
+
+    def __init__(self, rows, version=None):
+        self.version = version
+        self.windows = {}
+        # rows come oldest first, the latest one wins where windows overlap
+        for object_type, weekday, hour, valid_from, valid_to, passenger in rows:
+            self.windows.setdefault((object_type, weekday, hour), []).insert(0, (valid_from, valid_to, passenger))
+        self.object_types = sorted({key[0] for key in self.windows})
+
+    @classmethod
+    def build(cls, version=None):
+        rows = Cv_count.objects.exclude(status='Inactive').filter(
+            object_type__isnull=False, week_day__in=WEEK_DAYS, hour__isnull=False, passenger__isnull=False,
+        ).order_by('id').values_list('object_type', 'week_day', 'hour', 'valid_from', 'valid_to', 'passenger')
+        return cls(
+            [(object_type, WEEK_DAYS.index(week_day), hour, valid_from, valid_to, passenger)
+             for object_type, week_day, hour, valid_from, valid_to, passenger in rows],
+            version,
+        )
+
+    def rows(self):
+        return [
+            (object_type, weekday, hour, valid_from, valid_to, passenger)
+            for (object_type, weekday, hour), windows in self.windows.items()
+            for valid_from, valid_to, passenger in reversed(windows)
+        ]
+
+    def lookup(self, object_type, weekday, hour, on_date=None):
+        """Baseline count of object_type for a weekday (0 = Monday) and hour, or None."""
+        for valid_from, valid_to, passenger in self.windows.get((object_type, weekday, hour), ()):
+            if on_date is None:
+                return passenger
+            if (valid_from is None or valid_from <= on_date) and (valid_to is None or on_date <= valid_to):
+                return passenger
+        return None
+
+    def for_date(self, object_type, on_date, hour):
+        if isinstance(on_date, str):
+            on_date = date_type.fromisoformat(on_date)
+        return self.lookup(object_type, on_date.weekday(), hour, on_date)
+
+    def hourly(self, on_date, object_types=None):
+        """{object_type: [baseline for hour 0..23]} for one date."""
+        return {
+            object_type: [self.for_date(object_type, on_date, hour) for hour in range(24)]
+            for object_type in (object_types or self.object_types)
+        }
+
+
+_matrix = None
+
+
+def _payload_key(version):
+    return f'baselines:matrix:{version}'
+
+
+def get_baseline_matrix():
+    global _matrix
+    version = cache.get(BASELINE_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.add(BASELINE_VERSION_KEY, version, None)
+        version = cache.get(BASELINE_VERSION_KEY, version)
+    if _matrix is not None and _matrix.version == version:
+        return _matrix
+
+    rows = cache.get(_payload_key(version))
+    if rows is None:
+        matrix = BaselineMatrix.build(version)
+        cache.set(_payload_key(version), matrix.rows(), BASELINE_CACHE_TIMEOUT)
+    else:
+        matrix = BaselineMatrix(rows, version)
+    _matrix = matrix
+    return matrix
+
+
+def invalidate_baselines():
+    global _matrix
+    _matrix = None
+    cache.set(BASELINE_VERSION_KEY, uuid.uuid4().hex, None)
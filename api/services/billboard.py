@@ -1,6 +1,7 @@
 
 from api.models import Billboard
 from api.serializer import BillboardSerializer,CustomBillboardSerializer
+from api.services.catchment import filter_near_poi
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 import base64
@@ -24,19 +25,25 @@ class BillboardApiView(APIView):
         tags=["Billboard"],
         parameters=[
             OpenApiParameter(name='uuid', type=uuid.UUID, description="UUID of the billboard", required=False),
+            OpenApiParameter(name='near_poi', type=str, description="bc_category values separated by , with an active POI nearby", required=False),
+            OpenApiParameter(name='near_poi_radius', type=int, description="Catchment radius in meters for near_poi, the largest one by default", required=False),
         ],
        
     )
     def get(self, request):
+        billboards = Billboard.objects.prefetch_related('poi_catchments')
+        if request.query_params.get('near_poi'):
+            try:
+                billboards = filter_near_poi(billboards, request.query_params['near_poi'], request.query_params.get('near_poi_radius'))
+            except ValueError as e:
+                return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         if request.user.groups.filter(name='admin').exists():
-            billboards = Billboard.objects.all()
-            serializer = CustomBillboardSerializer(billboards, many=True)
+            serializer = CustomBillboardSerializer(billboards, many=True, context={'poi_catchment': True})
             return Response(serializer.data, status=status.HTTP_200_OK)
         elif request.user.groups.filter(name='supervisor').exists():
-            billboards = Billboard.objects.all()
             if request.query_params.get('uuid'):
                 billboards = billboards.filter(uuid=request.query_params.get('uuid'))
-            serializer = CustomBillboardSerializer(billboards, many=True)
+            serializer = CustomBillboardSerializer(billboards, many=True, context={'poi_catchment': True})
             return Response(serializer.data, status=status.HTTP_200_OK)
         else:
             return Response({"message": "You are not authorized to view this data"}, status=status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,72 @@
+from django.db import connection
+
+
+# bulk_update builds one CASE expression per field and row and bulk_create
+# one model instance per row, which dominates large batches; plain
+# executemany statements do not.
+
+PLAIN_TYPES = (type(None), bool, int, float, str)
+
+
+def _prepare(fields, values):
+    # plain values go to the driver as they are, anything else (dates, lists,
+    # bytes) through the field
+    return [
+        value if type(value) in PLAIN_TYPES else field.get_db_prep_save(value, connection)
+        for field, value in zip(fields, values)
+    ]
+
+
+def update_rows(model, fields, rows):
+    """rows are sequences of the field values followed by the primary key."""
+    rows = list(rows)
+    if not rows:
+        return 0
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(field) for field in fields]
+    assignments = ', '.join(f'{quote(field.column)} = %s' for field in fields)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {quote(model._meta.db_table)} SET {assignments} WHERE {quote(model._meta.pk.column)} = %s',
+            [_prepare(fields, row[:-1]) + [row[-1]] for row in rows],
+        )
+    return len(rows)
+
+
+def insert_rows(model, fields, rows):
+    """rows are sequences of the field values, no pk is returned."""
+    rows = list(rows)
+    if not rows:
+        return 0
+    quote = connection.ops.quote_name
+    fields = [model._meta.get_field(field) for field in fields]
+    columns = ', '.join(quote(field.column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})',
+            [_prepare(fields, row) for row in rows],
+        )
+    return len(rows)
+
+
+def delete_rows(model, pks):
+    """Plain DELETE by primary key, without the delete signals and cascades of QuerySet.delete()."""
+    pks = list(pks)
+    if not pks:
+        return 0
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {quote(model._meta.db_table)} WHERE {quote(model._meta.pk.column)} = %s',
+            [[pk] for pk in pks],
+        )
+    return len(pks)
+
+
+def table_columns(model):
+    """Column names of the table of model, empty while its table is not migrated yet."""
+    with connection.cursor() as cursor:
+        if model._meta.db_table not in connection.introspection.table_names(cursor):
+            return set()
+        return {column.name for column in connection.introspection.get_table_description(cursor, model._meta.db_table)}
@@ -0,0 +1,146 @@
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy.spatial import cKDTree
+
+from api.models import Billboard, Billboard_Poi_Catchment, Poi
+from api.services.bulk import insert_rows
+from api.services.geo import bounding_box, chord_length, chord_to_meters, unit_vectors
+from api.services.proximity import within_radius
+
+
+POI_CATCHMENT_DEFAULT_CATEGORY = 'Other'
+CATCHMENT_FIELDS = ['billboard', 'bc_category', 'radius_m', 'poi_count', 'nearest_m']
+CATCHMENT_TRACKED_FIELDS = {
+    Billboard: ('latitude', 'longitude'),
+    Poi: ('latitude', 'longitude', 'bc_category', 'status'),
+}
+
+
+# One row per billboard, bc_category and radius holding the number of
+# active POIs within that radius (cumulative, empty buckets are not stored)
+# and the nearest one. A POI or billboard that moves only rebuilds the
+# billboards around its old and new positions.
+
+def catchment_radii():
+    return sorted({int(radius) for radius in settings.POI_CATCHMENT_RADII_M})
+
+
+def active_pois():
+    return Poi.objects.exclude(status='Inactive').filter(latitude__isnull=False, longitude__isnull=False)
+
+
+def rebuild_billboard_catchments(billboard_ids=None):
+    """Recompute the catchment rows of the given billboards (all when None), returns the rows written."""
+    radii = catchment_radii()
+    billboards = Billboard.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    stale = Billboard_Poi_Catchment.objects.all()
+    if billboard_ids is not None:
+        billboard_ids = list(billboard_ids)
+        billboards = billboards.filter(id__in=billboard_ids)
+        stale = stale.filter(billboard_id__in=billboard_ids)
+    billboards = list(billboards.order_by('id').values_list('id', 'latitude', 'longitude'))
+
+    pois = active_pois()
+    if billboards and radii and billboard_ids is not None:
+        # only the POIs that can reach one of the billboards
+        boxes = [bounding_box(latitude, longitude, radii[-1]) for _, latitude, longitude in billboards]
+        pois = pois.filter(
+            latitude__gte=min(box[0] for box in boxes), latitude__lte=max(box[2] for box in boxes),
+            longitude__gte=min(box[1] for box in boxes), longitude__lte=max(box[3] for box in boxes),
+        )
+    pois = list(pois.values_list('latitude', 'longitude', 'bc_category')) if billboards and radii else []
+
+    rows = []
+    if pois:
+        poi_points = unit_vectors([poi[0] for poi in pois], [poi[1] for poi in pois])
+        category_names, category_codes = np.unique(
+            [poi[2] or POI_CATCHMENT_DEFAULT_CATEGORY for poi in pois], return_inverse=True
+        )
+        billboard_points = unit_vectors([row[1] for row in billboards], [row[2] for row in billboards])
+        hits = cKDTree(poi_points).query_ball_point(billboard_points, chord_length(radii[-1]))
+
+        # one (billboard, poi) pair per hit, grouped by billboard * categories + category
+        lengths = np.array([len(indexes) for indexes in hits])
+        billboard_index = np.repeat(np.arange(len(billboards)), lengths)
+        poi_index = np.fromiter((index for indexes in hits for index in indexes), dtype=np.int64, count=lengths.sum())
+        distances = chord_to_meters(np.linalg.norm(poi_points[poi_index] - billboard_points[billboard_index], axis=1))
+        groups = billboard_index * len(category_names) + category_codes[poi_index]
+        size = len(billboards) * len(category_names)
+        nearest = np.full(size, np.inf)
+        np.minimum.at(nearest, groups, distances)
+
+        for radius in radii:
+            counts = np.bincount(groups[distances <= radius], minlength=size)
+            for group in np.flatnonzero(counts).tolist():
+                rows.append((
+                    billboards[group // len(category_names)][0],
+                    str(category_names[group % len(category_names)]),
+                    radius,
+                    int(counts[group]),
+                    round(float(nearest[group]), 1),
+                ))
+
+    with transaction.atomic():
+        stale.delete()
+        return insert_rows(Billboard_Poi_Catchment, CATCHMENT_FIELDS, rows)
+
+
+def billboards_near(points):
+    radii = catchment_radii()
+    if not radii:
+        return set()
+    located = Billboard.objects.filter(latitude__isnull=False, longitude__isnull=False).only('id', 'latitude', 'longitude')
+    return {
+        billboard.id
+        for latitude, longitude in points if latitude is not None and longitude is not None
+        for billboard, _ in within_radius(located, latitude, longitude, radii[-1])
+    }
+
+
+def schedule_catchment_rebuild(billboard_ids):
+    billboard_ids = set(billboard_ids)
+    if billboard_ids:
+        transaction.on_commit(lambda: rebuild_billboard_catchments(billboard_ids))
+
+
+def tracked_values(instance):
+    return tuple(getattr(instance, field) for field in CATCHMENT_TRACKED_FIELDS[type(instance)])
+
+
+def stored_tracked_values(instance):
+    if instance.pk is None:
+        return None
+    return type(instance).objects.filter(pk=instance.pk).values_list(*CATCHMENT_TRACKED_FIELDS[type(instance)]).first()
+
+
+def summarize_catchments(rows):
+    """{billboard_id: {bc_category: {radius_m: {'count', 'nearest_m'}}}} of Billboard_Poi_Catchment rows"""
+    summary = defaultdict(lambda: defaultdict(dict))
+    for row in sorted(rows, key=lambda row: (row.bc_category, row.radius_m)):
+        summary[row.billboard_id][row.bc_category][row.radius_m] = {'count': row.poi_count, 'nearest_m': row.nearest_m}
+    return {billboard_id: dict(categories) for billboard_id, categories in summary.items()}
+
+
+def catchment_summary(billboard_ids):
+    return summarize_catchments(Billboard_Poi_Catchment.objects.filter(billboard_id__in=billboard_ids).only(
+        'billboard_id', 'bc_category', 'radius_m', 'poi_count', 'nearest_m'
+    ))
+
+
+def filter_near_poi(billboards, bc_category, radius_m=None):
+    """Billboards with at least one active POI of bc_category within radius_m (the largest radius when None)."""
+    radii = catchment_radii()
+    if not radii:
+        raise ValueError("No catchment radii are configured")
+    if radius_m in (None, ''):
+        radius_m = radii[-1]
+    if str(radius_m) not in map(str, radii):
+        raise ValueError(f"radius must be one of {', '.join(map(str, radii))}")
+    return billboards.filter(
+        poi_catchments__bc_category__in=bc_category.split(','),
+        poi_catchments__radius_m=int(radius_m),
+        poi_catchments__poi_count__gt=0,
+    ).distinct()
@@ -122,6 +122,18 @@ OBJECT_TYPE =(
     ('Other', 'Other'),
 )
 
+# per object_type count columns on Impression and the impression rollups
+OBJECT_TYPE_COUNT_FIELDS = {
+    'Person': 'person_count',
+    'Car': 'car_count',
+    'Bus': 'bus_count',
+    'Motorcycle': 'motorcycle_count',
+    'Truck': 'truck_count',
+    'Van': 'van_count',
+    'Animal': 'animal_count',
+    'Other': 'other_count',
+}
+
 WEEK_DAY = (
     ('Monday', 'Monday'),
     ('Tuesday', 'Tuesday'),
@@ -135,4 +147,22 @@ WEEK_DAY = (
 STATUS = (
     ('Active', 'Active'),
     ('Inactive', 'Inactive'),
-)
\ No newline at end of file
+)
+
+INGESTION_STATUS = (
+    ('PENDING', 'PENDING'),
+    ('PROCESSING', 'PROCESSING'),
+    ('COMPLETED', 'COMPLETED'),
+    ('FAILED', 'FAILED'),
+    ('SKIPPED', 'SKIPPED'),
+)
+
+EVENT_ARCHIVE_KIND = (
+    ('CV', 'CV'),
+    ('GPS', 'GPS'),
+)
+
+ZONE_KIND = (
+    ('visible', 'Visible'),
+    ('observation', 'Observation'),
+)
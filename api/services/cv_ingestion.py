@@ -0,0 +1,197 @@
+import math
+from datetime import datetime
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
+from rest_framework import status
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from api.models import Billboard, Billboard_View, Cv
+from api.services.constants import OBJECT_TYPE
+from api.services.live_counters import increment_live_counters
+from api.services.streaming import NdjsonParser, UploadFormatError, chunked, iter_records
+
+
+CV_BATCH_SIZE = 5000
+CV_MAX_REPORTED_ERRORS = 100
+OBJECT_TYPES = {value for value, _ in OBJECT_TYPE}
+
+
+def _as_id(value):
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_time(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, str):
+        parsed = parse_datetime(value)
+    else:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"Invalid datetime {value}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class CvIngestor:
+    """
+    Bulk writer for edge camera detections. Cameras and views are resolved
+    with one query per chunk (cached across chunks), rows are validated in
+    plain Python and written with one bulk insert.
+    """
+
+    def __init__(self, live=False):
+        self.live = live
+        self.cameras = {}
+        self.view_billboards = {}
+        self.billboards = set()
+        self.errors = []
+        self.created = 0
+        self.rejected = 0
+
+    def resolve(self, rows):
+        cameras = {str(row['camera_id']) for row in rows if row.get('camera_id') not in (None, '')}
+        cameras.difference_update(self.cameras)
+        if cameras:
+            for view_id, camera_id in Billboard_View.objects.filter(camera_id__in=cameras).values_list('id', 'camera_id'):
+                self.cameras[camera_id] = view_id
+            self.cameras.update(dict.fromkeys(cameras.difference(self.cameras)))
+
+        views = {_as_id(row.get('view')) or self.cameras.get(str(row.get('camera_id'))) for row in rows}
+        views.discard(None)
+        views.difference_update(self.view_billboards)
+        if views:
+            for view_id, billboard_id in Billboard_View.objects.filter(id__in=views).values_list('id', 'billboards'):
+                if billboard_id is not None or view_id not in self.view_billboards:
+                    self.view_billboards[view_id] = billboard_id
+
+        billboards = {_as_id(row.get('billboard')) for row in rows}
+        billboards.discard(None)
+        billboards.difference_update(self.billboards)
+        if billboards:
+            self.billboards.update(Billboard.objects.filter(id__in=billboards).values_list('id', flat=True))
+
+    def clean(self, row):
+        camera_id = row.get('camera_id')
+        view_id = _as_id(row.get('view')) or self.cameras.get(str(camera_id))
+        if view_id not in self.view_billboards:
+            raise ValueError(f"Unknown camera {camera_id}" if row.get('view') in (None, '') else f"Unknown view {row['view']}")
+        billboard_id = _as_id(row.get('billboard'))
+        if billboard_id is None:
+            billboard_id = self.view_billboards[view_id]
+            if billboard_id is None:
+                raise ValueError(f"View {view_id} is not attached to a billboard")
+        elif billboard_id not in self.billboards:
+            raise ValueError(f"Unknown billboard {row['billboard']}")
+
+        object_type = row.get('object_type')
+        if object_type not in OBJECT_TYPES:
+            raise ValueError(f"Invalid object_type {object_type}")
+        entry_time = _parse_time(row.get('entry_time'))
+        if entry_time is None:
+            raise ValueError("entry_time is required")
+        exit_time = _parse_time(row.get('exit_time'))
+        dwell_time = row.get('dwell_time')
+        if dwell_time in (None, ''):
+            if exit_time is not None and exit_time < entry_time:
+                raise ValueError("exit_time is before entry_time")
+            dwell_time = (exit_time - entry_time).total_seconds() if exit_time else None
+        else:
+            dwell_time = float(dwell_time)
+            if not (math.isfinite(dwell_time) and dwell_time >= 0):
+                raise ValueError(f"Invalid dwell_time {row['dwell_time']}")
+
+        return Cv(
+            camera_id=camera_id,
+            billboard_id=billboard_id,
+            view_id=view_id,
+            object_type=object_type,
+            entry_time=entry_time,
+            exit_time=exit_time,
+            dwell_time=dwell_time,
+        )
+
+    def ingest(self, rows, offset=0):
+        rows = list(rows)
+        self.resolve([row for row in rows if isinstance(row, dict)])
+        events = []
+        for index, row in enumerate(rows, start=offset):
+            try:
+                if not isinstance(row, dict):
+                    raise ValueError("Expected an object")
+                events.append(self.clean(row))
+            except (TypeError, ValueError) as e:
+                self.rejected += 1
+                if len(self.errors) < CV_MAX_REPORTED_ERRORS:
+                    self.errors.append({'index': index, 'error': str(e)})
+        if self.live:
+            increment_live_counters(events)
+        else:
+            Cv.objects.bulk_create(events, batch_size=1000)
+        self.created += len(events)
+        return len(events)
+
+
+class CvBatchApiView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, NdjsonParser, MultiPartParser]
+
+    @extend_schema(
+        summary="Batch Cv Ingest",
+        description=(
+            "Create Cv detections in bulk from a JSON array, an application/x-ndjson body or an "
+            "NDJSON/CSV `file`. Rows need camera_id (or view), object_type and entry_time; billboard "
+            "is resolved from the camera and dwell_time from exit_time when omitted. Invalid rows are "
+            "rejected individually and reported with their index."
+        ),
+        tags=["Cv"],
+        parameters=[
+            OpenApiParameter(
+                name="live",
+                description="Only count the detections in the live Redis counters, no Cv rows are stored",
+                required=False,
+                type=bool,
+            ),
+        ],
+        responses={
+            status.HTTP_201_CREATED: OpenApiResponse(description="Detections created"),
+            status.HTTP_400_BAD_REQUEST: OpenApiResponse(description="Unreadable body"),
+        }
+    )
+    def post(self, request):
+        upload = request.FILES.get('file')
+        ingestor = CvIngestor(live=request.query_params.get('live') in ('1', 'true', 'True'))
+        try:
+            if upload:
+                rows = iter_records(upload, request.query_params.get('file_format') or request.data.get('file_format'))
+            elif isinstance(request.data, dict):
+                rows = [request.data]
+            else:
+                rows = request.data
+            offset = 0
+            for chunk in chunked(rows, CV_BATCH_SIZE):
+                ingestor.ingest(chunk, offset)
+                offset += len(chunk)
+        except UploadFormatError as e:
+            return Response({"message": str(e), "created": ingestor.created}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "created": ingestor.created,
+            "rejected": ingestor.rejected,
+            "errors": ingestor.errors,
+        }, status=status.HTTP_201_CREATED)
@@ -0,0 +1,151 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import Ceil, ExtractHour, Ln, TruncDate
+
+from api.models import Cv, Rollup_Watermark
+from api.services.constants import OBJECT_TYPE_COUNT_FIELDS
+from api.services.dwell import merge_dwell, refresh_dwalltime
+from api.services.ingestion import IMPRESSION_UPSERT_FIELDS, lock_impressions, save_impressions
+from api.services.rollup import mark_rollups_pending, refresh_pending_rollups
+from api.services.sketches import QUANTILE_LOG_GAMMA, QUANTILE_MIN_VALUE, QuantileSketch
+
+
+CV_WATERMARK = 'cv_impressions'
+CV_ROLLUP_BATCH_SIZE = 50000
+# rollup_batch of the rows counted before rows were marked individually
+CV_LEGACY_ROLLUP_BATCH = 0
+# rollup_batch of the rows set aside because their dwell time cannot be counted
+CV_REJECTED_ROLLUP_BATCH = -1
+# longer dwell times (and inf / nan) are bad data, not detections
+CV_MAX_DWELL_TIME = 24 * 60 * 60
+
+
+def aggregate_cv_events(queryset):
+    return queryset.filter(entry_time__isnull=False).order_by().values(
+        'billboard_id', 'view_id', 'object_type',
+        date=TruncDate('entry_time'),
+        hour=ExtractHour('entry_time'),
+    ).annotate(
+        detections=Count('id'),
+        looked=Count('id', filter=Q(dwell_time__gt=0)),
+        dwell_sum=Sum('dwell_time'),
+        dwell_count=Count('dwell_time'),
+        dwell_sum_sq=Sum(F('dwell_time') * F('dwell_time')),
+        dwell_min=Min('dwell_time'),
+        dwell_max=Max('dwell_time'),
+    )
+
+
+def aggregate_cv_dwell_bins(queryset):
+    # quantile sketch bins are computed by the database, a null bin is the
+    # sketch's zero bucket
+    return queryset.filter(entry_time__isnull=False, dwell_time__isnull=False).order_by().annotate(
+        dwell_bin=Case(
+            When(dwell_time__lte=QUANTILE_MIN_VALUE, then=Value(None)),
+            default=Ceil(Ln('dwell_time') / QUANTILE_LOG_GAMMA),
+            output_field=FloatField(),
+        ),
+    ).values(
+        'billboard_id', 'dwell_bin',
+        date=TruncDate('entry_time'),
+        hour=ExtractHour('entry_time'),
+    ).annotate(count=Count('id'))
+
+
+def merge_cv_buckets(buckets, dwell_bins=()):
+    """
+    Merge pre-aggregated detection buckets (billboard_id, view_id, date, hour,
+    object_type, detections, looked, dwell_count, dwell_sum, dwell_sum_sq,
+    dwell_min, dwell_max) and dwell sketch bins (billboard_id, date, hour,
+    dwell_bin, count) into Impression and its vehicle count columns with a fixed
+    number of queries. Returns the touched (billboard_id, date) rollup keys,
+    which are marked pending in the same transaction.
+    """
+    per_impression = {}
+    for bucket in buckets:
+        key = (bucket['billboard_id'], bucket['date'], bucket['hour'])
+        merged = per_impression.setdefault(key, {
+            'view_id': bucket['view_id'], 'detections': 0, 'looked': 0,
+            'dwell': [], 'vehicles': defaultdict(int),
+        })
+        merged['detections'] += bucket['detections']
+        merged['looked'] += bucket['looked']
+        merged['dwell'].append((
+            bucket['dwell_count'], bucket['dwell_sum'], bucket.get('dwell_sum_sq'),
+            bucket.get('dwell_min'), bucket.get('dwell_max'),
+        ))
+        merged['vehicles'][bucket['object_type']] += bucket['detections']
+    if not per_impression:
+        return set()
+    sketch_bins = defaultdict(list)
+    for dwell_bin in dwell_bins:
+        sketch_bins[(dwell_bin['billboard_id'], dwell_bin['date'], dwell_bin['hour'])].append(
+            (dwell_bin['dwell_bin'], dwell_bin['count'])
+        )
+
+    with transaction.atomic():
+        impressions = lock_impressions(per_impression.keys())
+        for key, merged in per_impression.items():
+            impression = impressions[key]
+            impression.view_id = impression.view_id or merged['view_id']
+            impression.impressions = (impression.impressions or 0) + merged['detections']
+            impression.frequency = (impression.frequency or 0) + merged['detections']
+            impression.ots = (impression.ots or 0) + merged['detections']
+            impression.lts = (impression.lts or 0) + merged['looked']
+            for dwell in merged['dwell']:
+                merge_dwell(impression, *dwell)
+            refresh_dwalltime(impression)
+            for object_type, count in merged['vehicles'].items():
+                field = OBJECT_TYPE_COUNT_FIELDS.get(object_type, 'other_count')
+                setattr(impression, field, getattr(impression, field) + count)
+            if key in sketch_bins:
+                sketch = QuantileSketch.from_bytes(impression.dwalltime_sketch)
+                for index, count in sketch_bins[key]:
+                    if index is None:
+                        sketch.zero_count += count
+                    else:
+                        sketch.add_bin(int(index), count)
+                impression.dwalltime_sketch = sketch.to_bytes()
+
+        save_impressions(impressions.values(), IMPRESSION_UPSERT_FIELDS + ['view'])
+        rollup_keys = {(key[0], key[1]) for key in per_impression}
+        mark_rollups_pending(rollup_keys)
+
+    return rollup_keys
+
+
+def rollup_cv_events(batch_size=CV_ROLLUP_BATCH_SIZE):
+    """
+    Fold pending Cv rows (rollup_batch is null) into Impression, batch_size at
+    a time. A batch first marks its rows with its highest id, which no other
+    batch can use, and then aggregates exactly the marked rows; marks and
+    merged counts commit together. Rows that commit out of id order are
+    still pending on the next run, so none is skipped or counted twice.
+    Rows with a dwell time that cannot be binned are marked rejected instead
+    of failing every run.
+    """
+    Rollup_Watermark.objects.get_or_create(name=CV_WATERMARK)
+    processed = 0
+    rollup_keys = set()
+    while True:
+        with transaction.atomic():
+            # serializes concurrent runs, last_id is the latest batch
+            watermark = Rollup_Watermark.objects.select_for_update().get(name=CV_WATERMARK)
+            pending = Cv.objects.filter(rollup_batch__isnull=True).order_by('id').values_list('id', flat=True)
+            upper = pending[batch_size - 1:batch_size].first() or pending.last()
+            if upper is None:
+                break
+            marked = Cv.objects.filter(rollup_batch__isnull=True, id__lte=upper).update(rollup_batch=upper)
+            events = Cv.objects.filter(rollup_batch=upper)
+            events.filter(Q(dwell_time__lt=0) | Q(dwell_time__gt=CV_MAX_DWELL_TIME)).update(
+                rollup_batch=CV_REJECTED_ROLLUP_BATCH
+            )
+            rollup_keys.update(merge_cv_buckets(aggregate_cv_events(events), aggregate_cv_dwell_bins(events)))
+            processed += marked
+            watermark.last_id = upper
+            watermark.save(update_fields=['last_id', 'updated_at'])
+
+    refresh_pending_rollups(rollup_keys)
+    return processed
@@ -0,0 +1,77 @@
+import math
+
+
+# Dwell time is stored as mergeable state (count, sum, sum of squares,
+# min, max) on Impression and both rollups, so the mean and spread of any
+# set of buckets is a merge of their state rather than a mean of means.
+# Quantiles come from the mergeable dwalltime_sketch next to it.
+
+DWELL_FIELDS = ['dwalltime_count', 'dwalltime_sum', 'dwalltime_sum_sq', 'dwalltime_min', 'dwalltime_max', 'dwalltime_sketch']
+
+
+class DwellState:
+    # in-memory accumulator with the same attributes as the model fields
+
+    def __init__(self):
+        self.dwalltime_count = 0
+        self.dwalltime_sum = 0.0
+        self.dwalltime_sum_sq = 0.0
+        self.dwalltime_min = None
+        self.dwalltime_max = None
+
+    @property
+    def mean(self):
+        return dwell_mean(self.dwalltime_count, self.dwalltime_sum)
+
+    @property
+    def stddev(self):
+        return dwell_stddev(self.dwalltime_count, self.dwalltime_sum, self.dwalltime_sum_sq)
+
+
+def _pick(function, current, value):
+    if value is None:
+        return current
+    return value if current is None else function(current, value)
+
+
+def merge_dwell(target, count, total, total_sq, minimum=None, maximum=None):
+    if not count:
+        return target
+    target.dwalltime_count = (target.dwalltime_count or 0) + count
+    target.dwalltime_sum = (target.dwalltime_sum or 0) + (total or 0)
+    target.dwalltime_sum_sq = (target.dwalltime_sum_sq or 0) + (total_sq or 0)
+    target.dwalltime_min = _pick(min, target.dwalltime_min, minimum)
+    target.dwalltime_max = _pick(max, target.dwalltime_max, maximum)
+    return target
+
+
+def add_dwell(target, values):
+    values = [float(value) for value in values]
+    if values:
+        merge_dwell(target, len(values), sum(values), sum(value * value for value in values), min(values), max(values))
+    return target
+
+
+def merge_dwell_state(target, source):
+    return merge_dwell(
+        target, source.dwalltime_count, source.dwalltime_sum, source.dwalltime_sum_sq,
+        source.dwalltime_min, source.dwalltime_max,
+    )
+
+
+def refresh_dwalltime(target):
+    # legacy rows without dwell state keep their stored dwalltime
+    if target.dwalltime_count:
+        target.dwalltime = target.dwalltime_sum / target.dwalltime_count
+    return target
+
+
+def dwell_mean(count, total):
+    return total / count if count else None
+
+
+def dwell_stddev(count, total, total_sq):
+    if not count:
+        return None
+    mean = total / count
+    return math.sqrt(max(total_sq / count - mean * mean, 0.0))
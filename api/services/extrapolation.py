@@ -0,0 +1,97 @@
+import math
+
+import numpy as np
+from django.db import transaction
+
+from api.models import Gps
+from api.services.baselines import get_baseline_matrix
+from api.services.bulk import update_rows
+
+
+GPS_EXTRAPOLATION_BATCH_SIZE = 20000
+EXTRAPOLATED_FIELDS = {'ots': 'extrapolated_ots', 'lts': 'extrapolated_lts', 'reach': 'extrapolated_reach'}
+
+
+# extrapolated = panel value * location extrapolation_factor * hour weight
+#
+# The hour weight is the Cv_count baseline of that hour (summed over object
+# types) relative to the mean baseline of the day, so thin off-peak panels
+# and busy peak hours follow the counted traffic profile. Days without
+# baselines weigh every hour 1.
+
+def hour_weights(dates):
+    matrix = get_baseline_matrix()
+    weights = np.ones((len(dates), 24))
+    if not matrix.object_types:
+        return weights
+    for index, day in enumerate(dates):
+        profile = np.array([
+            [np.nan if value is None else value for value in values] for values in matrix.hourly(day).values()
+        ], dtype=float)
+        known = ~np.isnan(profile).all(axis=0)
+        if not known.any():
+            continue
+        totals = np.nansum(profile, axis=0)
+        mean = totals[known].mean()
+        if mean > 0:
+            weights[index, known] = totals[known] / mean
+    return weights
+
+
+def _extrapolate_batch(rows):
+    columns = list(zip(*rows))
+    hours = np.clip(np.array(columns[2], dtype=np.int64), 0, 23)
+    factors = np.array([
+        location_factor if location_factor is not None else (billboard_factor if billboard_factor is not None else 1.0)
+        for location_factor, billboard_factor in zip(columns[6], columns[7])
+    ], dtype=float)
+
+    unique_dates, date_index = np.unique(np.array(columns[1], dtype='datetime64[D]'), return_inverse=True)
+    scale = factors * hour_weights(unique_dates.tolist())[date_index, hours]
+
+    values = {}
+    for column, source in zip((3, 4, 5), EXTRAPOLATED_FIELDS):
+        raw = np.array([np.nan if value is None else value for value in columns[column]], dtype=float)
+        values[source] = np.rint(raw * scale)
+
+    extrapolated = np.column_stack([values[source] for source in EXTRAPOLATED_FIELDS]).tolist()
+    return [
+        [None if math.isnan(value) else int(value) for value in row] + [gps_id]
+        for row, gps_id in zip(extrapolated, columns[0])
+    ]
+
+
+def extrapolate_gps(start_date=None, end_date=None, ids=None, batch_size=GPS_EXTRAPOLATION_BATCH_SIZE):
+    """
+    Compute extrapolated_ots/lts/reach for the Gps rows of a date range (end
+    inclusive) or id list, one keyset-paginated batch at a time. Returns the
+    number of rows updated.
+    """
+    queryset = Gps.objects.filter(date__isnull=False, hour__isnull=False)
+    if start_date:
+        queryset = queryset.filter(date__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(date__lte=end_date)
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+    queryset = queryset.order_by('id').values_list(
+        'id', 'date', 'hour', 'ots', 'lts', 'reach',
+        'location__extrapolation_factor', 'billboard__location__extrapolation_factor',
+    )
+
+    updated = 0
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id)[:batch_size])
+        if not rows:
+            return updated
+        with transaction.atomic():
+            updated += update_rows(Gps, list(EXTRAPOLATED_FIELDS.values()), _extrapolate_batch(rows))
+        last_id = rows[-1][0]
+
+
+def enqueue_gps_extrapolation(ids):
+    from api import tasks
+    ids = list(ids)
+    if ids:
+        transaction.on_commit(lambda: tasks.extrapolate_gps_rows.delay(ids=ids))
@@ -0,0 +1,129 @@
+import math
+
+import numpy as np
+
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = 111320.0
+
+
+# Billboard and Poi store the geohash of their coordinates. Nearby lookups
+# pick the longest prefix whose cells are at least as large as the radius,
+# so the circle always lies inside the 3x3 block around the centre cell.
+
+def _spread_bits(value):
+    # 0b1011 -> 0b1000101, room for 30 bits
+    value = (value | value << 16) & 0x0000FFFF0000FFFF
+    value = (value | value << 8) & 0x00FF00FF00FF00FF
+    value = (value | value << 4) & 0x0F0F0F0F0F0F0F0F
+    value = (value | value << 2) & 0x3333333333333333
+    return (value | value << 1) & 0x5555555555555555
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    if latitude is None or longitude is None:
+        return None
+    bits = precision * 5
+    lat_bits, lng_bits = bits // 2, (bits + 1) // 2
+    lat_cell = min(max(int((latitude + 90.0) / 180.0 * (1 << lat_bits)), 0), (1 << lat_bits) - 1)
+    lng_cell = min(max(int((longitude + 180.0) / 360.0 * (1 << lng_bits)), 0), (1 << lng_bits) - 1)
+    # bits alternate longitude, latitude starting with longitude
+    if lng_bits > lat_bits:
+        value = (_spread_bits(lng_cell >> 1) << 1 | _spread_bits(lat_cell)) << 1 | lng_cell & 1
+    else:
+        value = _spread_bits(lng_cell) << 1 | _spread_bits(lat_cell)
+    return ''.join(GEOHASH_ALPHABET[value >> shift & 31] for shift in range(bits - 5, -1, -5))
+
+
+def decode_geohash(geohash):
+    """(min_lat, min_lng, max_lat, max_lng) of the cell."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            current = lng_range if even else lat_range
+            middle = (current[0] + current[1]) / 2
+            if value >> shift & 1:
+                current[0] = middle
+            else:
+                current[1] = middle
+            even = not even
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+
+def geohash_cell_size(precision):
+    """(height, width) of a cell in degrees."""
+    bits = precision * 5
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def geohash_neighbours(geohash):
+    """The cell and its 8 neighbours."""
+    min_lat, min_lng, max_lat, max_lng = decode_geohash(geohash)
+    height, width = max_lat - min_lat, max_lng - min_lng
+    latitude, longitude = (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+    cells = []
+    for d_lat in (-1, 0, 1):
+        cell_lat = latitude + d_lat * height
+        if not -90 < cell_lat < 90:
+            continue
+        for d_lng in (-1, 0, 1):
+            cell_lng = (longitude + d_lng * width + 180) % 360 - 180
+            cell = encode_geohash(cell_lat, cell_lng, len(geohash))
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+
+def geohash_precision_for_radius(latitude, radius_m):
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = geohash_cell_size(precision)
+        width_m = width * METERS_PER_DEGREE * math.cos(math.radians(min(abs(latitude), 89.0)))
+        if min(height * METERS_PER_DEGREE, width_m) >= radius_m:
+            return precision
+    return 0
+
+
+def geohash_cover(latitude, longitude, radius_m):
+    """Geohash prefixes whose cells cover the circle, [] when it needs the whole globe."""
+    precision = geohash_precision_for_radius(latitude, radius_m)
+    if not precision:
+        return []
+    return geohash_neighbours(encode_geohash(latitude, longitude, precision))
+
+
+def bounding_box(latitude, longitude, radius_m):
+    d_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+    d_lng = d_lat / max(math.cos(math.radians(latitude)), 1e-6)
+    return latitude - d_lat, longitude - d_lng, latitude + d_lat, longitude + d_lng
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+# Points on the unit sphere: euclidean (chord) distances between them, as
+# computed by KD-trees, convert exactly to great-circle meters.
+
+def unit_vectors(latitudes, longitudes):
+    latitudes = np.radians(np.asarray(latitudes, dtype=float))
+    longitudes = np.radians(np.asarray(longitudes, dtype=float))
+    return np.column_stack([
+        np.cos(latitudes) * np.cos(longitudes),
+        np.cos(latitudes) * np.sin(longitudes),
+        np.sin(latitudes),
+    ])
+
+
+def chord_length(meters):
+    return 2 * np.sin(np.minimum(np.asarray(meters, dtype=float) / EARTH_RADIUS_M, np.pi) / 2)
+
+
+def chord_to_meters(chord):
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(np.asarray(chord) / 2, 1.0))
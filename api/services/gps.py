@@ -8,6 +8,8 @@ from django.shortcuts import get_object_or_404
 
 from api.models import Gps
 from api.serializer import GpsSerializer
+from api.services.extrapolation import enqueue_gps_extrapolation
+from api.services.gps_devices import GPS_DEVICE_FIELDS, encode_gps_devices
 
 class GpsApiView(APIView):
     authentication_classes = [JWTAuthentication]
@@ -39,7 +41,10 @@ class GpsApiView(APIView):
         data = request.data
         serializer = GpsSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            gps = serializer.save()
+            encode_gps_devices([gps])
+            gps.save(update_fields=GPS_DEVICE_FIELDS)
+            enqueue_gps_extrapolation([gps.id])
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -53,6 +58,10 @@ class GpsApiView(APIView):
         gps = get_object_or_404(Gps, id=request.data['id'])
         serializer = GpsSerializer(gps, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            gps = serializer.save()
+            if 'device_ids' in request.data or 'ips' in request.data:
+                encode_gps_devices([gps])
+                gps.save(update_fields=GPS_DEVICE_FIELDS)
+            enqueue_gps_extrapolation([gps.id])
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,106 @@
+from django.db.models import Q
+from django.shortcuts import get_list_or_404
+from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from api.models import Billboard, Gps, Gps_Device_Id
+from api.services.id_sets import encode_id_set, union_id_sets
+from api.services.ingestion import parse_reach_ids
+from api.services.reach_dictionary import intern_values
+from api.services.sketches import HyperLogLog, merge_sketches
+
+
+# Gps device ids and ips are interned into their own Gps_Device_Id
+# dictionary (ips with a prefix so they never collide with device ids) and
+# kept as encoded id sets next to a reach sketch, which merges with the
+# impression sketches.
+
+GPS_IP_PREFIX = 'ip:'
+GPS_DEVICE_FIELDS = ['device_set', 'ip_set', 'device_sketch']
+
+
+def encode_gps_devices(gps_rows):
+    parsed = [
+        (gps, parse_reach_ids(gps.device_ids), [GPS_IP_PREFIX + ip for ip in parse_reach_ids(gps.ips)])
+        for gps in gps_rows
+    ]
+    interned = intern_values(
+        Gps_Device_Id, 'device_id', (value for _, devices, ips in parsed for value in devices + ips)
+    )
+    for gps, devices, ips in parsed:
+        gps.device_set = encode_id_set(interned[value] for value in devices) if devices else None
+        gps.ip_set = encode_id_set(interned[value] for value in ips) if ips else None
+        gps.device_sketch = HyperLogLog.from_values(devices).to_bytes() if devices else None
+    return gps_rows
+
+
+def gps_device_union(queryset, field='device_set'):
+    return union_id_sets(queryset.filter(**{f'{field}__isnull': False}).values_list(field, flat=True).iterator())
+
+
+def gps_device_intersection(querysets, field='device_set'):
+    common = None
+    for queryset in querysets:
+        ids = set(gps_device_union(queryset, field))
+        common = ids if common is None else common & ids
+        if not common:
+            break
+    return sorted(common or ())
+
+
+def gps_reach(queryset):
+    return {
+        'devices': len(gps_device_union(queryset)),
+        'ips': len(gps_device_union(queryset, 'ip_set')),
+        'estimated_devices': merge_sketches(
+            queryset.filter(device_sketch__isnull=False).values_list('device_sketch', flat=True).iterator()
+        ).count(),
+    }
+
+
+class GpsReachView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Gps Reach",
+        description=(
+            "Unique GPS devices and ips per billboard and over all given billboards for a date range, "
+            "plus the devices seen at every one of them"
+        ),
+        tags=["Gps"],
+        parameters=[
+            OpenApiParameter(name="billboard", description="Billboard uuids separated by ,", required=True, type=str),
+            OpenApiParameter(name="start_date", description="YYYY-MM-DD", required=False, type=str),
+            OpenApiParameter(name="end_date", description="YYYY-MM-DD, exclusive", required=False, type=str),
+        ],
+        responses={
+            status.HTTP_200_OK: OpenApiResponse(description="Unique reach"),
+            status.HTTP_400_BAD_REQUEST: OpenApiResponse(description="billboard is required"),
+        }
+    )
+    def get(self, request):
+        uuids = [value.strip() for value in (request.query_params.get('billboard') or '').split(',') if value.strip()]
+        if not uuids:
+            return Response({"message": "billboard is required"}, status=status.HTTP_400_BAD_REQUEST)
+        billboards = get_list_or_404(Billboard, uuid__in=uuids)
+
+        gps = Gps.objects.filter(billboard__in=billboards)
+        if request.query_params.get('start_date'):
+            gps = gps.filter(date__gte=request.query_params['start_date'])
+        if request.query_params.get('end_date'):
+            gps = gps.filter(date__lt=request.query_params['end_date'])
+        gps = gps.filter(Q(device_set__isnull=False) | Q(ip_set__isnull=False))
+
+        per_billboard = {billboard: gps.filter(billboard=billboard) for billboard in billboards}
+        return Response({
+            'total': gps_reach(gps),
+            'common_devices': len(gps_device_intersection(per_billboard.values())) if len(billboards) > 1 else None,
+            'billboards': [
+                {'uuid': billboard.uuid, **gps_reach(queryset)} for billboard, queryset in per_billboard.items()
+            ],
+        }, status=status.HTTP_200_OK)
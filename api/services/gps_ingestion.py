@@ -0,0 +1,264 @@
+import math
+import uuid
+from datetime import date as date_type
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
+from rest_framework import status
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from api.models import Billboard, Billboard_View, Gps, Location
+from api.services.bulk import update_rows
+from api.services.cv_ingestion import _as_id
+from api.services.extrapolation import enqueue_gps_extrapolation
+from api.services.gps_devices import GPS_DEVICE_FIELDS, encode_gps_devices
+from api.services.streaming import NdjsonParser, UploadFormatError, chunked, iter_records
+
+
+GPS_BATCH_SIZE = 5000
+GPS_MAX_REPORTED_ERRORS = 100
+GPS_INT_FIELDS = ['ots', 'lts', 'reach']
+GPS_VALUE_FIELDS = ['location'] + GPS_INT_FIELDS + ['dwell_time', 'device_ids', 'ips'] + GPS_DEVICE_FIELDS
+
+
+def _as_uuid(value):
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def _billboard_key(reference):
+    # billboards are referenced by id or uuid, both looked up by this key
+    if _as_id(reference) is not None:
+        return str(_as_id(reference))
+    return str(_as_uuid(reference) or reference)
+
+
+def _as_int(value, field):
+    if value in (None, ''):
+        return None
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {field} {value}")
+
+
+class GpsIngestor:
+    """
+    Bulk upsert of hourly GPS panel rows keyed on (billboard, view, date,
+    hour). Billboards (id or uuid), views (id or camera_id) and locations are
+    resolved with one query each per chunk, existing buckets are loaded with
+    one query and a re-sent bucket replaces the stored values.
+    """
+
+    def __init__(self):
+        self.billboards = {}
+        self.cameras = {}
+        self.views = {}
+        self.locations = set()
+        self.errors = []
+        self.created = 0
+        self.updated = 0
+        self.rejected = 0
+
+    def resolve(self, rows):
+        references = {_billboard_key(row['billboard']) for row in rows if row.get('billboard') not in (None, '')}
+        references.difference_update(self.billboards)
+        if references:
+            ids = {_as_id(reference) for reference in references}
+            ids.discard(None)
+            uuids = {_as_uuid(reference) for reference in references if _as_id(reference) is None}
+            uuids.discard(None)
+            for billboard_id, billboard_uuid, location_id in Billboard.objects.filter(
+                Q(id__in=ids) | Q(uuid__in=uuids)
+            ).values_list('id', 'uuid', 'location_id'):
+                self.billboards[str(billboard_id)] = (billboard_id, location_id)
+                self.billboards[str(billboard_uuid)] = (billboard_id, location_id)
+            self.billboards.update(dict.fromkeys(references.difference(self.billboards)))
+
+        cameras = {str(row['camera_id']) for row in rows if row.get('camera_id') not in (None, '')}
+        views = {_as_id(row.get('view')) for row in rows}
+        views.discard(None)
+        cameras.difference_update(self.cameras)
+        views.difference_update(self.views)
+        if cameras or views:
+            for view_id, camera_id, billboard_id in Billboard_View.objects.filter(
+                Q(id__in=views) | Q(camera_id__in=cameras)
+            ).values_list('id', 'camera_id', 'billboards'):
+                if billboard_id is not None or view_id not in self.views:
+                    self.views[view_id] = billboard_id
+                if camera_id in cameras:
+                    self.cameras[camera_id] = view_id
+            self.cameras.update(dict.fromkeys(cameras.difference(self.cameras)))
+
+        locations = {_as_id(row.get('location')) for row in rows}
+        locations.discard(None)
+        locations.difference_update(self.locations)
+        if locations:
+            self.locations.update(Location.objects.filter(id__in=locations).values_list('id', flat=True))
+
+    def clean(self, row):
+        reference = row.get('billboard')
+        view_id = _as_id(row.get('view'))
+        if view_id is None and row.get('camera_id') not in (None, ''):
+            view_id = self.cameras.get(str(row['camera_id']))
+            if view_id is None:
+                raise ValueError(f"Unknown camera {row['camera_id']}")
+        elif view_id is not None and view_id not in self.views:
+            raise ValueError(f"Unknown view {row['view']}")
+
+        if reference in (None, ''):
+            if view_id is None or self.views[view_id] is None:
+                raise ValueError("billboard is required")
+            reference = self.views[view_id]
+        billboard = self.billboards.get(_billboard_key(reference))
+        if billboard is None:
+            raise ValueError(f"Unknown billboard {reference}")
+        billboard_id, location_id = billboard
+        if view_id is not None and self.views[view_id] not in (None, billboard_id):
+            raise ValueError(f"View {view_id} belongs to another billboard")
+
+        if row.get('location') not in (None, ''):
+            location_id = _as_id(row['location'])
+            if location_id not in self.locations:
+                raise ValueError(f"Unknown location {row['location']}")
+
+        date = row.get('date')
+        date = parse_date(date) if isinstance(date, str) else date
+        if not isinstance(date, date_type):
+            raise ValueError(f"Invalid date {row.get('date')}")
+        hour = _as_int(row.get('hour'), 'hour')
+        if hour is None or not 0 <= hour <= 23:
+            raise ValueError(f"Invalid hour {row.get('hour')}")
+        dwell_time = row.get('dwell_time')
+        dwell_time = None if dwell_time in (None, '') else float(dwell_time)
+        if dwell_time is not None and not (math.isfinite(dwell_time) and dwell_time >= 0):
+            raise ValueError(f"Invalid dwell_time {row['dwell_time']}")
+        for field in ('device_ids', 'ips'):
+            if not isinstance(row.get(field) or '', (str, list, tuple)):
+                raise ValueError(f"Invalid {field} {row[field]}")
+
+        return Gps(
+            billboard_id=billboard_id,
+            view_id=view_id,
+            location_id=location_id,
+            date=date,
+            hour=hour,
+            dwell_time=dwell_time,
+            device_ids=row.get('device_ids') or None,
+            ips=row.get('ips') or None,
+            **{field: _as_int(row.get(field), field) for field in GPS_INT_FIELDS},
+        )
+
+    def existing_buckets(self, rows, lock=False):
+        queryset = Gps.objects.filter(
+            billboard_id__in={gps.billboard_id for gps in rows}, date__in={gps.date for gps in rows}
+        )
+        if lock:
+            queryset = queryset.select_for_update()
+        return {
+            (billboard_id, view_id, date, hour): gps_id
+            for gps_id, billboard_id, view_id, date, hour in queryset.order_by('id').values_list(
+                'id', 'billboard_id', 'view_id', 'date', 'hour'
+            )
+        }
+
+    def write(self, rows):
+        # the last row of a bucket wins within a chunk as well as across requests
+        rows = list({(gps.billboard_id, gps.view_id, gps.date, gps.hour): gps for gps in rows}.values())
+        if not rows:
+            return
+        encode_gps_devices(rows)
+        fields = [Gps._meta.get_field(field).attname for field in GPS_VALUE_FIELDS]
+        with transaction.atomic():
+            existing = self.existing_buckets(rows)
+            # missing buckets are inserted empty and every bucket is locked, so a
+            # concurrent upload of the same bucket waits instead of failing on
+            # the unique constraint
+            Gps.objects.bulk_create(
+                [Gps(billboard_id=gps.billboard_id, view_id=gps.view_id, date=gps.date, hour=gps.hour) for gps in rows],
+                ignore_conflicts=True,
+                batch_size=1000,
+            )
+            buckets = self.existing_buckets(rows, lock=True)
+            for gps in rows:
+                gps.id = buckets[(gps.billboard_id, gps.view_id, gps.date, gps.hour)]
+            update_rows(Gps, fields, ([getattr(gps, field) for field in fields] + [gps.id] for gps in rows))
+            enqueue_gps_extrapolation(gps.id for gps in rows)
+        created = sum(1 for gps in rows if (gps.billboard_id, gps.view_id, gps.date, gps.hour) not in existing)
+        self.created += created
+        self.updated += len(rows) - created
+
+    def ingest(self, rows, offset=0):
+        rows = list(rows)
+        self.resolve([row for row in rows if isinstance(row, dict)])
+        cleaned = []
+        for index, row in enumerate(rows, start=offset):
+            try:
+                if not isinstance(row, dict):
+                    raise ValueError("Expected an object")
+                cleaned.append(self.clean(row))
+            except (TypeError, ValueError) as e:
+                self.rejected += 1
+                if len(self.errors) < GPS_MAX_REPORTED_ERRORS:
+                    self.errors.append({'index': index, 'error': str(e)})
+        self.write(cleaned)
+        return len(cleaned)
+
+
+class GpsBulkApiView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, NdjsonParser, MultiPartParser]
+
+    @extend_schema(
+        summary="Bulk Gps Ingest",
+        description=(
+            "Upsert hourly Gps rows from a JSON array, an application/x-ndjson body or an NDJSON/CSV "
+            "`file`. Rows need billboard (id or uuid, or a view / camera_id attached to one), date and "
+            "hour; a row for an existing (billboard, view, date, hour) replaces its values. Extrapolation "
+            "is queued for every written row. Invalid rows are rejected individually and reported with "
+            "their index."
+        ),
+        tags=["Gps"],
+        parameters=[
+            OpenApiParameter(name="file_format", description="csv or ndjson, detected when omitted", required=False, type=str),
+        ],
+        responses={
+            status.HTTP_201_CREATED: OpenApiResponse(description="Rows upserted"),
+            status.HTTP_400_BAD_REQUEST: OpenApiResponse(description="Unreadable body"),
+        }
+    )
+    def post(self, request):
+        upload = request.FILES.get('file')
+        ingestor = GpsIngestor()
+        try:
+            if upload:
+                rows = iter_records(upload, request.query_params.get('file_format') or request.data.get('file_format'))
+            elif isinstance(request.data, dict):
+                rows = [request.data]
+            else:
+                rows = request.data
+            offset = 0
+            for chunk in chunked(rows, GPS_BATCH_SIZE):
+                ingestor.ingest(chunk, offset)
+                offset += len(chunk)
+        except UploadFormatError as e:
+            return Response(
+                {"message": str(e), "created": ingestor.created, "updated": ingestor.updated},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response({
+            "created": ingestor.created,
+            "updated": ingestor.updated,
+            "rejected": ingestor.rejected,
+            "errors": ingestor.errors,
+        }, status=status.HTTP_201_CREATED)
@@ -0,0 +1,47 @@
+import heapq
+
+
+# Sets of interned integer ids stored as sorted deltas in unsigned LEB128
+# varints: ids of one dictionary are dense, so most deltas take one or two
+# bytes. Sets are combined by merging the sorted streams, never by parsing
+# text.
+
+def encode_id_set(ids):
+    out = bytearray()
+    previous = 0
+    for value in sorted(set(ids)):
+        delta = value - previous
+        previous = value
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def iter_id_set(data):
+    value = 0
+    delta = 0
+    shift = 0
+    for byte in bytes(data or b''):
+        delta |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        value += delta
+        yield value
+        delta = 0
+        shift = 0
+
+
+def decode_id_set(data):
+    return list(iter_id_set(data))
+
+
+def union_id_sets(blobs):
+    union = []
+    for value in heapq.merge(*(iter_id_set(blob) for blob in blobs if blob)):
+        if not union or union[-1] != value:
+            union.append(value)
+    return union
+
@@ -0,0 +1,224 @@
+import math
+import re
+from datetime import date as date_type
+
+from django.db import transaction
+
+from api.models import Billboard, Impression
+from api.services.bulk import update_rows
+from api.services.constants import OBJECT_TYPE_COUNT_FIELDS
+from api.services.dwell import DWELL_FIELDS, add_dwell, refresh_dwalltime
+from api.services.reach_dictionary import intern_reach_ids
+from api.services.rollup import mark_rollups_pending
+from api.services.sketches import HyperLogLog, QuantileSketch
+
+
+REACH_ID_SEPARATORS = re.compile(r'[\n,;|]')
+IMPRESSION_MAX_REPORTED_ERRORS = 100
+IMPRESSION_UPSERT_FIELDS = (
+    ['impressions', 'ots', 'lts', 'dwalltime', 'frequency', 'reach_sketch'] + DWELL_FIELDS
+    + list(OBJECT_TYPE_COUNT_FIELDS.values())
+)
+
+
+def parse_reach_ids(value):
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(reach_id).strip() for reach_id in value if str(reach_id).strip()]
+    # vendor format: "['id1'\n'id2']", CSV exports may use , ; or | instead
+    reach_ids = (reach_id.strip().strip("'\"") for reach_id in REACH_ID_SEPARATORS.split(value.strip('[]')))
+    return [reach_id for reach_id in reach_ids if reach_id]
+
+
+def _as_date(value):
+    if isinstance(value, str):
+        return date_type.fromisoformat(value.strip())
+    return value
+
+
+def load_impressions(keys, lock=False):
+    # one query for a set of (billboard_id, date, hour) keys
+    existing = {}
+    queryset = Impression.objects.filter(
+        billboard_id__in={key[0] for key in keys},
+        date__in={key[1] for key in keys},
+        hour__in={key[2] for key in keys},
+    )
+    if lock:
+        queryset = queryset.select_for_update().order_by('id')
+    for impression in queryset:
+        key = (impression.billboard_id, impression.date, impression.hour)
+        if key in keys:
+            existing[key] = impression
+    return existing
+
+
+def lock_impressions(keys):
+    """
+    The Impression rows of (billboard_id, date, hour) keys, locked until the
+    surrounding transaction ends. Missing buckets are inserted empty first,
+    so concurrent writers of a new bucket wait on the same row instead of
+    overwriting each other's totals.
+    """
+    keys = set(keys)
+    Impression.objects.bulk_create(
+        [
+            Impression(billboard_id=key[0], date=key[1], hour=key[2], impressions=0, ots=0, lts=0, frequency=0)
+            for key in keys
+        ],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+    return load_impressions(keys, lock=True)
+
+
+def save_impressions(impressions, fields=IMPRESSION_UPSERT_FIELDS):
+    attnames = [Impression._meta.get_field(field).attname for field in fields]
+    return update_rows(Impression, attnames, (
+        [getattr(impression, attname) for attname in attnames] + [impression.pk] for impression in impressions
+    ))
+
+
+class ImpressionIngestor:
+    """
+    Set-based writer for uploaded impression rows. Each chunk costs a fixed
+    number of queries: billboards are resolved with one uuid__in lookup
+    (cached across chunks), the buckets are created when missing and locked
+    with one lookup, and the merged totals are written back in one batch.
+    """
+
+    def __init__(self):
+        self.billboards = {}
+        self.missing_billboards = set()
+        self.rollup_keys = set()
+        self.rows = 0
+        self.skipped = 0
+        self.rejected = 0
+        self.errors = []
+
+    def resolve_billboards(self, uuids):
+        unknown = {uuid for uuid in uuids if uuid not in self.billboards and uuid not in self.missing_billboards}
+        if unknown:
+            for billboard_id, billboard_uuid in Billboard.objects.filter(uuid__in=unknown).values_list('id', 'uuid'):
+                self.billboards[str(billboard_uuid)] = billboard_id
+            self.missing_billboards.update(unknown.difference(self.billboards))
+
+    def clean(self, item):
+        if not isinstance(item, dict):
+            raise ValueError("Expected an object")
+        if not item.get('billboard'):
+            raise ValueError("billboard is required")
+        try:
+            date = _as_date(item.get('date'))
+        except (TypeError, ValueError):
+            date = None
+        if not isinstance(date, date_type):
+            raise ValueError(f"Invalid date {item.get('date')}")
+        try:
+            hour = int(item.get('hour'))
+        except (TypeError, ValueError):
+            hour = None
+        if hour is None or not 0 <= hour <= 23:
+            raise ValueError(f"Invalid hour {item.get('hour')}")
+        try:
+            impressions = int(item.get('impressions') or 0)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid impressions {item.get('impressions')}")
+        dwalltime = item.get('dwalltime')
+        try:
+            dwalltime = None if dwalltime in (None, '') else float(dwalltime)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid dwalltime {dwalltime}")
+        if dwalltime is not None and not (math.isfinite(dwalltime) and dwalltime >= 0):
+            raise ValueError(f"Invalid dwalltime {dwalltime}")
+        return {
+            'billboard': str(item['billboard']),
+            'date': date,
+            'hour': hour,
+            'impressions': impressions,
+            'dwalltime': dwalltime,
+            'reach_ids': parse_reach_ids(item.get('reach')),
+        }
+
+    def clean_rows(self, rows, offset=0):
+        cleaned = []
+        for index, item in enumerate(rows, start=offset):
+            try:
+                cleaned.append(self.clean(item))
+            except ValueError as e:
+                self.rejected += 1
+                if len(self.errors) < IMPRESSION_MAX_REPORTED_ERRORS:
+                    self.errors.append({'index': index, 'error': str(e)})
+        return cleaned
+
+    def merge_rows(self, rows):
+        buckets = {}
+        for item in rows:
+            billboard_id = self.billboards.get(item['billboard'])
+            if billboard_id is None:
+                self.skipped += 1
+                continue
+            key = (billboard_id, item['date'], item['hour'])
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = {'impressions': 0, 'rows': 0, 'dwalltime': [], 'reach_ids': []}
+            bucket['impressions'] += item['impressions']
+            bucket['rows'] += 1
+            if item['dwalltime'] is not None:
+                bucket['dwalltime'].append(item['dwalltime'])
+            bucket['reach_ids'].append(item['reach_ids'])
+            self.rows += 1
+        return buckets
+
+    def ingest(self, rows, offset=0):
+        """Merge rows into their buckets, invalid rows are rejected individually and reported by index."""
+        rows = self.clean_rows(rows, offset)
+        self.resolve_billboards({item['billboard'] for item in rows})
+        buckets = self.merge_rows(rows)
+        if not buckets:
+            return 0
+
+        with transaction.atomic():
+            impressions = lock_impressions(buckets.keys())
+            for key, bucket in buckets.items():
+                impression = impressions[key]
+                impression.impressions = (impression.impressions or 0) + bucket['impressions']
+                impression.ots = (impression.ots or 0) + bucket['rows']
+                impression.lts = (impression.lts or 0) + bucket['rows']
+                add_dwell(impression, bucket['dwalltime'])
+                refresh_dwalltime(impression)
+                if bucket['dwalltime']:
+                    impression.dwalltime_sketch = QuantileSketch.from_bytes(
+                        impression.dwalltime_sketch
+                    ).update(bucket['dwalltime']).to_bytes()
+                sketch = HyperLogLog.from_bytes(impression.reach_sketch)
+                for reach_ids in bucket['reach_ids']:
+                    sketch.update(reach_ids)
+                impression.reach_sketch = sketch.to_bytes()
+
+            save_impressions(impressions.values())
+            self.write_reach(buckets, {key: impression.id for key, impression in impressions.items()})
+            mark_rollups_pending((key[0], key[1]) for key in buckets)
+
+        self.rollup_keys.update((key[0], key[1]) for key in buckets)
+        return len(buckets)
+
+    def write_reach(self, buckets, impression_ids):
+        reach_ids = intern_reach_ids(
+            reach_id for bucket in buckets.values() for ids in bucket['reach_ids'] for reach_id in ids
+        )
+        if not reach_ids:
+            return
+        through = Impression.reach.through
+        links = {
+            (impression_ids[key], reach_ids[reach_id])
+            for key, bucket in buckets.items()
+            for ids in bucket['reach_ids']
+            for reach_id in ids
+        }
+        through.objects.bulk_create(
+            [through(impression_id=impression_id, impression_reach_id_id=reach_id) for impression_id, reach_id in links],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
@@ -0,0 +1,291 @@
+import csv
+import hashlib
+import json
+import uuid
+
+from django.core.files.base import ContentFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.shortcuts import get_object_or_404
+from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from api.models import Ingestion_Batch, Ingestion_Job
+from api.services.ingestion import ImpressionIngestor
+from api.services.rollup import refresh_pending_rollups
+from api.services.streaming import chunked, content_checksum, detect_format, iter_records
+
+
+INGESTION_BATCH_SIZE = 1000
+# a job with the same content in one of these states makes an upload a duplicate
+INGESTION_ACTIVE_STATUSES = ('PENDING', 'PROCESSING', 'COMPLETED')
+
+
+# Uploads are stored as a file, split into batches and every batch is
+# written in its own transaction. A batch claims its content checksum in
+# that transaction through a unique column, so a batch whose content was
+# already ingested (or is being ingested) is skipped, and re-submitted files
+# and retried batches never count impressions twice.
+
+def _enqueue(task_name, *args):
+    from api import tasks
+    transaction.on_commit(lambda: getattr(tasks, task_name).delay(*args))
+
+
+def _canonical_payload(rows):
+    return '\n'.join(json.dumps(row, sort_keys=True, cls=DjangoJSONEncoder) for row in rows)
+
+
+def create_ingestion_job(user=None, upload=None, rows=None, file_format=None):
+    if upload is not None:
+        file_format = detect_format(upload, file_format)
+        name = upload.name
+        content = upload
+    else:
+        file_format = 'ndjson'
+        name = 'upload.ndjson'
+        content = ContentFile(_canonical_payload(rows).encode())
+    checksum = content_checksum(content)
+
+    job = Ingestion_Job(
+        user=user if user is not None and user.is_authenticated else None,
+        file_format=file_format,
+        checksum=checksum,
+    )
+    if Ingestion_Job.objects.filter(checksum=checksum, status__in=INGESTION_ACTIVE_STATUSES).exists():
+        job.status = 'SKIPPED'
+        job.save()
+        return job
+
+    job.file.save(name, content, save=False)
+    job.save()
+    _enqueue('split_ingestion_job', job.id)
+    return job
+
+
+def split_ingestion_job(job_id):
+    job = Ingestion_Job.objects.get(id=job_id)
+    if job.batches.exists():
+        # a worker that died after storing the batches left the job PENDING
+        return _start_job(job.id)
+
+    try:
+        with job.file.open('rb') as upload:
+            with transaction.atomic():
+                batches = []
+                for index, rows in enumerate(chunked(iter_records(upload, job.file_format), INGESTION_BATCH_SIZE)):
+                    payload = _canonical_payload(rows)
+                    batches.append(Ingestion_Batch(
+                        job=job,
+                        index=index,
+                        checksum=hashlib.sha256(payload.encode()).hexdigest(),
+                        payload=payload,
+                        row_count=len(rows),
+                    ))
+                    if len(batches) >= 100:
+                        Ingestion_Batch.objects.bulk_create(batches)
+                        batches = []
+                Ingestion_Batch.objects.bulk_create(batches)
+    except (ValueError, OSError, EOFError, csv.Error) as e:
+        # unreadable uploads (bad gzip data, invalid text or CSV) fail the job
+        job.status = 'FAILED'
+        job.error = str(e)
+        job.save(update_fields=['status', 'error', 'updated_at'])
+        return job
+
+    return _start_job(job.id)
+
+
+def _start_job(job_id):
+    # moves a split job to PROCESSING and queues its batches, once
+    with transaction.atomic():
+        job = Ingestion_Job.objects.select_for_update().get(id=job_id)
+        if job.status != 'PENDING':
+            return job
+        job.total_rows = job.batches.aggregate(rows=Sum('row_count'))['rows'] or 0
+        job.total_batches = job.batches.count()
+        job.status = 'PROCESSING'
+        job.save(update_fields=['total_rows', 'total_batches', 'status', 'updated_at'])
+        for batch_id in job.batches.filter(status='PENDING').values_list('id', flat=True):
+            _enqueue('process_ingestion_batch', batch_id)
+    _finish_job(job.id)
+    job.refresh_from_db()
+    return job
+
+
+def _advance_job(job_id, **counters):
+    Ingestion_Job.objects.filter(id=job_id).update(
+        **{name: F(name) + value for name, value in counters.items()}
+    )
+    _finish_job(job_id)
+
+
+def _finish_job(job_id):
+    job = Ingestion_Job.objects.get(id=job_id)
+    if job.status != 'PROCESSING':
+        return
+    if job.processed_batches + job.skipped_batches + job.failed_batches >= job.total_batches:
+        Ingestion_Job.objects.filter(id=job_id, status='PROCESSING').update(
+            status='FAILED' if job.failed_batches else 'COMPLETED'
+        )
+
+
+def batch_notes(ingestor):
+    notes = []
+    if ingestor.skipped:
+        notes.append(
+            f"Skipped {ingestor.skipped} rows of unknown billboards: {', '.join(sorted(ingestor.missing_billboards))}"
+        )
+    if ingestor.rejected:
+        notes.append(f"Rejected {ingestor.rejected} invalid rows: " + '; '.join(
+            f"row {error['index']}: {error['error']}" for error in ingestor.errors
+        ))
+    return '\n'.join(notes) or None
+
+
+def process_ingestion_batch(batch_id):
+    ingestor = ImpressionIngestor()
+    try:
+        with transaction.atomic():
+            batch = Ingestion_Batch.objects.select_for_update().get(id=batch_id)
+            if batch.status in ('COMPLETED', 'SKIPPED'):
+                return batch.status
+            claimed = Ingestion_Batch.objects.filter(claimed_checksum=batch.checksum).exclude(id=batch.id).exists()
+            if not claimed:
+                try:
+                    # waits for a concurrent batch holding the same checksum
+                    # and fails once that one commits
+                    with transaction.atomic():
+                        Ingestion_Batch.objects.filter(id=batch.id).update(claimed_checksum=batch.checksum)
+                except IntegrityError:
+                    claimed = True
+            if claimed:
+                batch.status = 'SKIPPED'
+                batch.payload = ''
+                batch.save(update_fields=['status', 'payload', 'updated_at'])
+                _advance_job(batch.job_id, skipped_batches=1)
+                return batch.status
+
+            ingestor.ingest(
+                (json.loads(line) for line in batch.payload.splitlines() if line),
+                batch.index * INGESTION_BATCH_SIZE,
+            )
+            batch.status = 'COMPLETED'
+            batch.attempts += 1
+            batch.error = batch_notes(ingestor)
+            # the rows live in Impression now, only failed batches keep theirs for a retry
+            batch.payload = ''
+            batch.save(update_fields=['status', 'attempts', 'error', 'payload', 'updated_at'])
+            _advance_job(batch.job_id, processed_batches=1)
+    except Exception as e:
+        # the transaction above rolled back, nothing of this batch was written
+        batch = Ingestion_Batch.objects.get(id=batch_id)
+        batch.status = 'FAILED'
+        batch.attempts += 1
+        batch.error = str(e)
+        batch.save(update_fields=['status', 'attempts', 'error', 'updated_at'])
+        _advance_job(batch.job_id, failed_batches=1)
+        return batch.status
+
+    refresh_pending_rollups(ingestor.rollup_keys)
+    return 'COMPLETED'
+
+
+def retry_failed_batches(job):
+    with transaction.atomic():
+        failed = list(job.batches.filter(status='FAILED').values_list('id', flat=True))
+        if not failed:
+            return 0
+        Ingestion_Batch.objects.filter(id__in=failed).update(status='PENDING')
+        Ingestion_Job.objects.filter(id=job.id).update(
+            status='PROCESSING', failed_batches=F('failed_batches') - len(failed)
+        )
+        for batch_id in failed:
+            _enqueue('process_ingestion_batch', batch_id)
+    return len(failed)
+
+
+def job_payload(job):
+    return {
+        'job_id': job.uuid,
+        'status': job.status,
+        'total_rows': job.total_rows,
+        'total_batches': job.total_batches,
+        'processed_batches': job.processed_batches,
+        'skipped_batches': job.skipped_batches,
+        'failed_batches': job.failed_batches,
+        'error': job.error,
+        'failed': list(job.batches.filter(status='FAILED').values('index', 'attempts', 'error').order_by('index')),
+        'created_at': job.created_at,
+        'updated_at': job.updated_at,
+    }
+
+
+def get_user_job(user, job_id):
+    # admins see every upload job, everyone else only their own
+    jobs = Ingestion_Job.objects.all()
+    if not user.groups.filter(name='admin').exists():
+        jobs = jobs.filter(user=user)
+    try:
+        return get_object_or_404(jobs, uuid=uuid.UUID(str(job_id)))
+    except ValueError:
+        return None
+
+
+class IngestionJobStatusView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Upload Job Status",
+        description="Progress of a report/upload/ job",
+        parameters=[
+            OpenApiParameter(name="job_id", description="Job id returned by report/upload/", required=True, type=str),
+        ],
+        responses={
+            status.HTTP_200_OK: OpenApiResponse(description="Job progress"),
+            status.HTTP_400_BAD_REQUEST: OpenApiResponse(description="job_id is missing or invalid"),
+            status.HTTP_404_NOT_FOUND: OpenApiResponse(description="No such job of this user"),
+        }
+    )
+    def get(self, request):
+        job_id = request.query_params.get('job_id')
+        if not job_id:
+            return Response({"message": "job_id is required"}, status=status.HTTP_400_BAD_REQUEST)
+        job = get_user_job(request.user, job_id)
+        if job is None:
+            return Response({"message": "Invalid job_id"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(job_payload(job), status=status.HTTP_200_OK)
+
+
+class IngestionJobRetryView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Retry Upload Job",
+        description="Re-queue the failed batches of a report/upload/ job",
+        responses={
+            status.HTTP_202_ACCEPTED: OpenApiResponse(description="Failed batches queued"),
+            status.HTTP_400_BAD_REQUEST: OpenApiResponse(description="job_id is missing or invalid"),
+            status.HTTP_404_NOT_FOUND: OpenApiResponse(description="No such job of this user"),
+        }
+    )
+    def post(self, request):
+        job_id = request.data.get('job_id')
+        if not job_id:
+            return Response({"message": "job_id is required"}, status=status.HTTP_400_BAD_REQUEST)
+        job = get_user_job(request.user, job_id)
+        if job is None:
+            return Response({"message": "Invalid job_id"}, status=status.HTTP_400_BAD_REQUEST)
+        retried = retry_failed_batches(job)
+        job.refresh_from_db()
+        return Response({
+            "message": f"{retried} batches queued",
+            **job_payload(job),
+        }, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,170 @@
+import math
+from collections import defaultdict
+from datetime import date as date_type, timedelta
+from uuid import uuid4
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from redis.exceptions import LockError
+
+from api.models import Live_Counter_Flush
+from api.services.cv_rollup import merge_cv_buckets
+from api.services.rollup import refresh_pending_rollups
+from api.services.sketches import QUANTILE_MIN_VALUE, quantile_index
+
+
+LIVE_KEY_PREFIX = 'live:cv:'
+LIVE_KEYS = LIVE_KEY_PREFIX + 'keys'
+LIVE_FLUSH_PREFIX = LIVE_KEY_PREFIX + 'flush:'
+LIVE_FLUSH_LOCK = LIVE_KEY_PREFIX + 'lock'
+# a slow flush must not lose the lock to the next scheduled one
+LIVE_FLUSH_LOCK_TIMEOUT = 60 * 60
+DWELL_BIN_FIELD = '#bin:'
+
+_client = None
+
+
+# Detections posted with live=true only touch one Redis hash per
+# (billboard, view, date, hour) with <object_type>:<counter> fields and
+# #bin:<index> dwell quantile sketch bins. The
+# flush task moves each hash aside atomically under a flush token before
+# merging it into Impression, so increments racing the flush land in a
+# fresh hash. The merge records its token in Live_Counter_Flush in the same
+# transaction, so hashes a crashed flush left behind are only deleted, never
+# merged twice.
+
+def live_client():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.LIVE_COUNTERS_REDIS_URL)
+    return _client
+
+
+def _bucket_key(billboard_id, view_id, entry_time):
+    local = timezone.localtime(entry_time)
+    return f"{LIVE_KEY_PREFIX}{billboard_id}:{view_id or ''}:{local.date().isoformat()}:{local.hour}"
+
+
+def increment_live_counters(events):
+    """Count cleaned Cv events, a dwell time that cannot be binned raises ValueError before Redis is touched."""
+    events = list(events)
+    for event in events:
+        if event.dwell_time is not None and not (math.isfinite(event.dwell_time) and event.dwell_time >= 0):
+            raise ValueError(f"Invalid dwell_time {event.dwell_time}")
+    counters = defaultdict(lambda: defaultdict(float))
+    for event in events:
+        fields = counters[_bucket_key(event.billboard_id, event.view_id, event.entry_time)]
+        fields[f'{event.object_type}:detections'] += 1
+        if event.dwell_time is not None:
+            fields[f'{event.object_type}:dwell_sum'] += event.dwell_time
+            fields[f'{event.object_type}:dwell_sum_sq'] += event.dwell_time * event.dwell_time
+            fields[f'{event.object_type}:dwell_count'] += 1
+            if event.dwell_time > 0:
+                fields[f'{event.object_type}:looked'] += 1
+            dwell_bin = '' if event.dwell_time <= QUANTILE_MIN_VALUE else quantile_index(event.dwell_time)
+            fields[f'{DWELL_BIN_FIELD}{dwell_bin}'] += 1
+    if not counters:
+        return 0
+
+    pipe = live_client().pipeline(transaction=True)
+    for key, fields in counters.items():
+        for field, value in fields.items():
+            if field.endswith((':dwell_sum', ':dwell_sum_sq')):
+                pipe.hincrbyfloat(key, field, value)
+            else:
+                pipe.hincrby(key, field, int(value))
+        pipe.sadd(LIVE_KEYS, key)
+    pipe.execute()
+    return len(counters)
+
+
+def _parse_bucket(key, values):
+    billboard_id, view_id, date, hour = key[len(LIVE_KEY_PREFIX):].split(':')
+    billboard_id, view_id, date, hour = (
+        int(billboard_id), int(view_id) if view_id else None, date_type.fromisoformat(date), int(hour),
+    )
+    by_type = defaultdict(dict)
+    dwell_bins = []
+    for field, value in values.items():
+        field = field.decode()
+        if field.startswith(DWELL_BIN_FIELD):
+            index = field[len(DWELL_BIN_FIELD):]
+            dwell_bins.append({
+                'billboard_id': billboard_id, 'date': date, 'hour': hour,
+                'dwell_bin': int(index) if index else None, 'count': int(value),
+            })
+            continue
+        object_type, counter = field.rsplit(':', 1)
+        by_type[object_type][counter] = float(value)
+    buckets = [{
+        'billboard_id': billboard_id,
+        'view_id': view_id,
+        'date': date,
+        'hour': hour,
+        'object_type': object_type,
+        'detections': int(counters.get('detections', 0)),
+        'looked': int(counters.get('looked', 0)),
+        'dwell_sum': counters.get('dwell_sum', 0.0),
+        'dwell_count': int(counters.get('dwell_count', 0)),
+        'dwell_sum_sq': counters.get('dwell_sum_sq', 0.0),
+    } for object_type, counters in by_type.items()]
+    return buckets, dwell_bins
+
+
+def flush_live_counters():
+    client = live_client()
+    lock = client.lock(LIVE_FLUSH_LOCK, timeout=LIVE_FLUSH_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        return 0
+    try:
+        return _flush(client)
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            # the lock expired during a very slow flush, nothing left to release
+            pass
+
+
+def _flush(client):
+    token = uuid4().hex
+    for key in client.smembers(LIVE_KEYS):
+        key = key.decode()
+        pipe = client.pipeline(transaction=True)
+        pipe.renamenx(key, f'{LIVE_FLUSH_PREFIX}{token}:{key}')
+        pipe.srem(LIVE_KEYS, key)
+        pipe.execute(raise_on_error=False)
+
+    # hashes left behind by an interrupted flush are handled by their own token
+    by_token = defaultdict(list)
+    for flush_key in client.scan_iter(match=f'{LIVE_FLUSH_PREFIX}*'):
+        flush_key = flush_key.decode()
+        by_token[flush_key[len(LIVE_FLUSH_PREFIX):].split(':', 1)[0]].append(flush_key)
+    merged = set(Live_Counter_Flush.objects.filter(token__in=by_token).values_list('token', flat=True))
+
+    detections = 0
+    rollup_keys = set()
+    for flush_token, flush_keys in by_token.items():
+        if flush_token not in merged:
+            buckets = []
+            dwell_bins = []
+            for flush_key in flush_keys:
+                key = flush_key[len(LIVE_FLUSH_PREFIX):].split(':', 1)[1]
+                key_buckets, key_bins = _parse_bucket(key, client.hgetall(flush_key))
+                buckets.extend(key_buckets)
+                dwell_bins.extend(key_bins)
+            with transaction.atomic():
+                rollup_keys.update(merge_cv_buckets(buckets, dwell_bins))
+                Live_Counter_Flush.objects.create(token=flush_token)
+            detections += sum(bucket['detections'] for bucket in buckets)
+        client.delete(*flush_keys)
+    # markers are only needed while their hashes exist
+    Live_Counter_Flush.objects.filter(
+        Q(token__in=by_token) | Q(created_at__lt=timezone.now() - timedelta(days=1))
+    ).delete()
+
+    refresh_pending_rollups(rollup_keys)
+    return detections
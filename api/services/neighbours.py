@@ -0,0 +1,65 @@
+import numpy as np
+from django.db import transaction
+from scipy.spatial import cKDTree
+
+from api.models import Billboard, Billboard_info
+from api.services.bulk import update_rows
+from api.services.geo import chord_length, chord_to_meters, unit_vectors
+
+
+# Neighbours are other billboards; several faces at one site count with
+# distance 0.
+
+def compute_billboard_neighbours():
+    """
+    Set distance_of_closest_neighbour_m of every Billboard_info attached to a
+    located billboard, and total_neighbours within its radius (meters) where
+    one is set. Returns the number of Billboard_info rows updated.
+    """
+    billboards = list(Billboard.objects.filter(
+        latitude__isnull=False, longitude__isnull=False
+    ).order_by('id').values_list('id', 'latitude', 'longitude'))
+    if not billboards:
+        return 0
+    ids = np.array([row[0] for row in billboards])
+    points = unit_vectors(
+        np.array([row[1] for row in billboards], dtype=float),
+        np.array([row[2] for row in billboards], dtype=float),
+    )
+    positions = {billboard_id: index for index, billboard_id in enumerate(ids.tolist())}
+
+    infos = {}
+    for info_id, billboard_id, radius, total in Billboard_info.objects.filter(
+        billboards__billboards__in=ids.tolist()
+    ).order_by('id', 'billboards__billboards').values_list(
+        'id', 'billboards__billboards', 'radius', 'total_neighbours'
+    ):
+        infos.setdefault(info_id, (positions[billboard_id], radius, total))
+    if not infos:
+        return 0
+    info_ids = list(infos)
+    rows = np.array([infos[info_id][0] for info_id in info_ids])
+
+    tree = cKDTree(points)
+    closest = np.full(len(rows), np.nan)
+    if len(ids) > 1:
+        # the nearest hit is the billboard itself unless another one shares its point
+        distances, indexes = tree.query(points[rows], k=2)
+        closest = np.where(indexes[:, 0] == rows, distances[:, 1], distances[:, 0])
+        closest = chord_to_meters(closest)
+
+    radii = np.array([np.nan if infos[info_id][1] is None else infos[info_id][1] for info_id in info_ids], dtype=float)
+    totals = [infos[info_id][2] for info_id in info_ids]
+    with_radius = ~np.isnan(radii)
+    if with_radius.any():
+        counts = tree.query_ball_point(
+            points[rows[with_radius]], chord_length(np.maximum(radii[with_radius], 0)), return_length=True
+        )
+        for position, count in zip(np.flatnonzero(with_radius).tolist(), np.atleast_1d(counts).tolist()):
+            totals[position] = int(count) - 1
+
+    with transaction.atomic():
+        return update_rows(Billboard_info, ['distance_of_closest_neighbour_m', 'total_neighbours'], (
+            [None if np.isnan(distance) else round(float(distance), 2), total, info_id]
+            for distance, total, info_id in zip(closest.tolist(), totals, info_ids)
+        ))
@@ -0,0 +1,268 @@
+import re
+from difflib import SequenceMatcher
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
+from rest_framework import status
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from api.models import Poi
+from api.services.bulk import update_rows
+from api.services.catchment import billboards_near, rebuild_billboard_catchments
+from api.services.constants import BC_CATEGORY, POI_STATUS, POI_TYPE
+from api.services.geo import encode_geohash, geohash_neighbours, haversine_m
+from api.services.streaming import NdjsonParser, UploadFormatError, chunked, iter_records
+
+
+POI_IMPORT_BATCH_SIZE = 5000
+POI_MAX_REPORTED_ERRORS = 100
+POI_DUPLICATE_RADIUS_M = 50
+POI_NAME_SIMILARITY = 0.85
+# cells of this precision are larger than POI_DUPLICATE_RADIUS_M
+POI_DUPLICATE_CELL_PRECISION = 7
+# existing POIs are loaded by geohash prefixes of this length
+POI_CANDIDATE_PREFIX = 5
+# above this many touched points the whole catchment table is rebuilt
+POI_CATCHMENT_FULL_REBUILD = 500
+POI_MERGE_FIELDS = ['address', 'primary_type', 'types', 'google_mal_url', 'bc_category', 'bc_sub_category', 'status']
+POI_TYPES = {value for value, _ in POI_TYPE}
+BC_CATEGORIES = {value for value, _ in BC_CATEGORY}
+POI_STATUSES = {value for value, _ in POI_STATUS}
+
+
+def normalize_name(name):
+    return ' '.join(re.sub(r'[^\w\s]', ' ', (name or '').lower()).split())
+
+
+def similar_names(first, second):
+    if first == second:
+        return True
+    matcher = SequenceMatcher(None, first, second)
+    return matcher.quick_ratio() >= POI_NAME_SIMILARITY and matcher.ratio() >= POI_NAME_SIMILARITY
+
+
+def _text(row, field):
+    value = row.get(field)
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        raise ValueError(f"{field} must be text")
+    return str(value).strip()
+
+
+def _choice(row, field, choices):
+    value = row.get(field) or None
+    if value is not None and value not in choices:
+        raise ValueError(f"Invalid {field} {value}")
+    return value
+
+
+def _types(value):
+    if value in (None, ''):
+        return []
+    values = value if isinstance(value, list) else [part.strip() for part in str(value).split(',') if part.strip()]
+    invalid = [part for part in values if part not in POI_TYPES]
+    if invalid:
+        raise ValueError(f"Invalid types {', '.join(invalid)}")
+    return values
+
+
+class PoiImporter:
+    """
+    Bulk POI import with spatial de-duplication. An incoming POI within
+    POI_DUPLICATE_RADIUS_M of an existing (or earlier imported) one with a
+    similar normalized name is merged into it: empty fields are filled and
+    the sources combined. Everything else is bulk inserted. Existing POIs
+    are found through their geohash, run backfill_geohashes first.
+    """
+
+    def __init__(self, user=None):
+        self.user = user
+        self.errors = []
+        self.created = 0
+        self.merged = 0
+        self.rejected = 0
+        self.touched_points = []
+        # duplicate cell -> POIs, existing ones are loaded once per import
+        self.index = {}
+        self.loaded_prefixes = set()
+
+    def clean(self, row):
+        name = _text(row, 'name')
+        if not name:
+            raise ValueError("name is required")
+        if len(name) > 255:
+            raise ValueError("name is longer than 255 characters")
+        try:
+            latitude = float(row.get('latitude'))
+            longitude = float(row.get('longitude'))
+        except (TypeError, ValueError):
+            raise ValueError("latitude and longitude must be numbers")
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError(f"Invalid coordinates {latitude}, {longitude}")
+
+        return Poi(
+            name=name,
+            latitude=latitude,
+            longitude=longitude,
+            geohash=encode_geohash(latitude, longitude),
+            address=_text(row, 'address') or None,
+            primary_type=_choice(row, 'primary_type', POI_TYPES),
+            types=_types(row.get('types')),
+            google_mal_url=_text(row, 'google_mal_url') or None,
+            bc_category=_choice(row, 'bc_category', BC_CATEGORIES),
+            bc_sub_category=_choice(row, 'bc_sub_category', POI_TYPES),
+            source=_text(row, 'source')[:200] or None,
+            status=_choice(row, 'status', POI_STATUSES),
+            created_by=self.user,
+            updated_by=self.user,
+        )
+
+    def load_candidates(self, cells):
+        """Load the existing POIs of the not yet loaded prefixes covering cells into the index."""
+        prefixes = sorted({cell[:POI_CANDIDATE_PREFIX] for cell in cells} - self.loaded_prefixes)
+        for start in range(0, len(prefixes), 100):
+            group = prefixes[start:start + 100]
+            existing = Poi.objects.filter(reduce(or_, (Q(geohash__startswith=prefix) for prefix in group))).only(
+                'id', 'name', 'latitude', 'longitude', 'source', 'updated_by', *POI_MERGE_FIELDS
+            )
+            for poi in existing.iterator(chunk_size=5000):
+                self.add_to_index(poi)
+            self.loaded_prefixes.update(group)
+
+    def add_to_index(self, poi):
+        poi._normalized_name = normalize_name(poi.name)
+        self.index.setdefault(encode_geohash(poi.latitude, poi.longitude, POI_DUPLICATE_CELL_PRECISION), []).append(poi)
+
+    def find_duplicate(self, poi, cells):
+        name = normalize_name(poi.name)
+        best = None
+        for cell in cells:
+            for other in self.index.get(cell, ()):
+                distance = haversine_m(poi.latitude, poi.longitude, other.latitude, other.longitude)
+                if distance <= POI_DUPLICATE_RADIUS_M and (best is None or distance < best[1]) \
+                        and similar_names(name, other._normalized_name):
+                    best = (other, distance)
+        return best[0] if best else None
+
+    def merge(self, target, poi):
+        changed = False
+        for field in POI_MERGE_FIELDS:
+            if not getattr(target, field) and getattr(poi, field):
+                setattr(target, field, getattr(poi, field))
+                changed = True
+        sources = [source for source in (target.source or '').split(',') if source]
+        if poi.source and poi.source not in sources and len(','.join(sources + [poi.source])) <= 200:
+            target.source = ','.join(sources + [poi.source])
+            changed = True
+        return changed
+
+    def write(self, pois):
+        if not pois:
+            return
+        neighbours = [geohash_neighbours(poi.geohash[:POI_DUPLICATE_CELL_PRECISION]) for poi in pois]
+        self.load_candidates(cell for cells in neighbours for cell in cells)
+        creates = []
+        updates = {}
+        for poi, cells in zip(pois, neighbours):
+            target = self.find_duplicate(poi, cells)
+            if target is None:
+                creates.append(poi)
+                self.add_to_index(poi)
+                continue
+            self.merged += 1
+            if self.merge(target, poi) and target.pk:
+                updates[target.pk] = target
+
+        now = timezone.now()
+        fields = POI_MERGE_FIELDS + ['source', 'updated_by', 'updated_at']
+        with transaction.atomic():
+            Poi.objects.bulk_create(creates, batch_size=1000)
+            update_rows(Poi, [Poi._meta.get_field(field).attname for field in fields], (
+                [getattr(target, field) for field in POI_MERGE_FIELDS]
+                + [target.source, getattr(self.user, 'id', None) or target.updated_by_id, now, pk]
+                for pk, target in updates.items()
+            ))
+        self.created += len(creates)
+        self.touched_points.extend((poi.latitude, poi.longitude) for poi in creates + list(updates.values()))
+
+    def ingest(self, rows, offset=0):
+        pois = []
+        for index, row in enumerate(rows, start=offset):
+            try:
+                if not isinstance(row, dict):
+                    raise ValueError("Expected an object")
+                pois.append(self.clean(row))
+            except (TypeError, ValueError) as e:
+                self.rejected += 1
+                if len(self.errors) < POI_MAX_REPORTED_ERRORS:
+                    self.errors.append({'index': index, 'error': str(e)})
+        self.write(pois)
+        return len(pois)
+
+    def refresh_catchments(self):
+        # bulk writes skip the Poi signals
+        if len(self.touched_points) > POI_CATCHMENT_FULL_REBUILD:
+            rebuild_billboard_catchments()
+        elif self.touched_points:
+            rebuild_billboard_catchments(billboards_near(self.touched_points))
+
+
+class PoiImportApiView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, NdjsonParser, MultiPartParser]
+
+    @extend_schema(
+        summary="Bulk Poi Import",
+        description=(
+            "Import POIs from a JSON array, an application/x-ndjson body or an NDJSON/CSV `file`. "
+            f"A POI within {POI_DUPLICATE_RADIUS_M} m of an existing or earlier imported one with a "
+            "similar name is merged into it (empty fields filled, sources combined) instead of being "
+            "created. Invalid rows are rejected individually and reported with their index."
+        ),
+        tags=["Poi"],
+        parameters=[
+            OpenApiParameter(name="file_format", description="csv or ndjson, detected when omitted", required=False, type=str),
+        ],
+        responses={
+            status.HTTP_201_CREATED: OpenApiResponse(description="POIs imported"),
+            status.HTTP_400_BAD_REQUEST: OpenApiResponse(description="Unreadable body"),
+        }
+    )
+    def post(self, request):
+        upload = request.FILES.get('file')
+        importer = PoiImporter(user=request.user)
+        try:
+            if upload:
+                rows = iter_records(upload, request.query_params.get('file_format') or request.data.get('file_format'))
+            elif isinstance(request.data, dict):
+                rows = [request.data]
+            else:
+                rows = request.data
+            offset = 0
+            for chunk in chunked(rows, POI_IMPORT_BATCH_SIZE):
+                importer.ingest(chunk, offset)
+                offset += len(chunk)
+        except UploadFormatError as e:
+            return Response(
+                {"message": str(e), "created": importer.created, "merged": importer.merged},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        finally:
+            importer.refresh_catchments()
+
+        return Response({
+            "created": importer.created,
+            "merged": importer.merged,
+            "rejected": importer.rejected,
+            "errors": importer.errors,
+        }, status=status.HTTP_201_CREATED)
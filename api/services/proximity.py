@@ -0,0 +1,132 @@
+import math
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from api.models import Billboard
+from api.services.geo import bounding_box, geohash_cover, haversine_m
+
+
+NEARBY_DEFAULT_RADIUS_M = 1000
+NEARBY_MAX_RADIUS_M = 50000
+NEARBY_DEFAULT_LIMIT = 100
+NEARBY_MAX_LIMIT = 1000
+
+
+def within_radius(queryset, latitude, longitude, radius_m):
+    """[(obj, distance_m)] of the rows within radius_m, nearest first."""
+    cells = geohash_cover(latitude, longitude, radius_m)
+    if cells:
+        queryset = queryset.filter(reduce(or_, (Q(geohash__startswith=cell) for cell in cells)))
+    min_lat, min_lng, max_lat, max_lng = bounding_box(latitude, longitude, radius_m)
+    queryset = queryset.filter(latitude__gte=min_lat, latitude__lte=max_lat)
+    if -180 <= min_lng and max_lng <= 180:
+        queryset = queryset.filter(longitude__gte=min_lng, longitude__lte=max_lng)
+
+    matches = []
+    for obj in queryset:
+        distance = haversine_m(latitude, longitude, obj.latitude, obj.longitude)
+        if distance <= radius_m:
+            matches.append((obj, distance))
+    matches.sort(key=lambda match: match[1])
+    return matches
+
+
+def within_bounding_box(queryset, min_lat, min_lng, max_lat, max_lng):
+    queryset = queryset.filter(latitude__gte=min_lat, latitude__lte=max_lat)
+    if min_lng <= max_lng:
+        return queryset.filter(longitude__gte=min_lng, longitude__lte=max_lng)
+    # boxes crossing the antimeridian
+    return queryset.filter(Q(longitude__gte=min_lng) | Q(longitude__lte=max_lng))
+
+
+def _as_float(value, name):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number")
+    if not math.isfinite(value):
+        raise ValueError(f"{name} must be a finite number")
+    return value
+
+
+def _as_coordinate(value, name, bound):
+    value = _as_float(value, name)
+    if not -bound <= value <= bound:
+        raise ValueError(f"{name} must be between -{bound} and {bound}")
+    return value
+
+
+class BillboardNearbyView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        summary="Nearby Billboards",
+        description=(
+            "Billboards within `radius` meters of latitude/longitude, or inside `bbox` "
+            "(min_lat,min_lng,max_lat,max_lng), sorted by haversine distance from the given point "
+            "(the box centre for bbox queries)"
+        ),
+        tags=["Billboard"],
+        parameters=[
+            OpenApiParameter(name="latitude", required=False, type=float),
+            OpenApiParameter(name="longitude", required=False, type=float),
+            OpenApiParameter(name="radius", description=f"Meters, default {NEARBY_DEFAULT_RADIUS_M}", required=False, type=float),
+            OpenApiParameter(name="bbox", description="min_lat,min_lng,max_lat,max_lng", required=False, type=str),
+            OpenApiParameter(
+                name="limit", description=f"Default {NEARBY_DEFAULT_LIMIT}, at most {NEARBY_MAX_LIMIT}", required=False, type=int,
+            ),
+        ],
+        responses={
+            status.HTTP_200_OK: OpenApiResponse(description="Billboards with distance_m"),
+            status.HTTP_400_BAD_REQUEST: OpenApiResponse(description="Invalid coordinates"),
+        }
+    )
+    def get(self, request):
+        params = request.query_params
+        billboards = Billboard.objects.filter(latitude__isnull=False, longitude__isnull=False)
+        try:
+            limit = _as_float(params.get('limit') or NEARBY_DEFAULT_LIMIT, 'limit')
+            if not 1 <= limit <= NEARBY_MAX_LIMIT or limit != int(limit):
+                raise ValueError(f"limit must be an integer between 1 and {NEARBY_MAX_LIMIT}")
+            limit = int(limit)
+            if params.get('bbox'):
+                box = params['bbox'].split(',')
+                if len(box) != 4:
+                    raise ValueError("bbox needs min_lat,min_lng,max_lat,max_lng")
+                box = [_as_coordinate(value, 'bbox', 90 if n % 2 == 0 else 180) for n, value in enumerate(box)]
+                latitude = _as_coordinate(params['latitude'], 'latitude', 90) if params.get('latitude') else (box[0] + box[2]) / 2
+                longitude = _as_coordinate(params['longitude'], 'longitude', 180) if params.get('longitude') else (box[1] + box[3]) / 2
+                matches = sorted(
+                    ((billboard, haversine_m(latitude, longitude, billboard.latitude, billboard.longitude))
+                     for billboard in within_bounding_box(billboards, *box)),
+                    key=lambda match: match[1],
+                )
+            else:
+                latitude = _as_coordinate(params.get('latitude'), 'latitude', 90)
+                longitude = _as_coordinate(params.get('longitude'), 'longitude', 180)
+                radius = _as_float(params.get('radius') or NEARBY_DEFAULT_RADIUS_M, 'radius')
+                if not 0 < radius <= NEARBY_MAX_RADIUS_M:
+                    raise ValueError(f"radius must be between 0 and {NEARBY_MAX_RADIUS_M}")
+                matches = within_radius(billboards, latitude, longitude, radius)
+        except ValueError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response([
+            {
+                'uuid': billboard.uuid,
+                'title': billboard.title,
+                'latitude': billboard.latitude,
+                'longitude': billboard.longitude,
+                'distance_m': round(distance, 1),
+            }
+            for billboard, distance in matches[:limit]
+        ], status=status.HTTP_200_OK)
@@ -0,0 +1,46 @@
+from api.models import Impression_Reach_Id
+
+
+# Device ids are stored once in a dictionary table (Impression_Reach_Id for
+# impressions) and referenced by their integer primary key everywhere else.
+
+LOOKUP_BATCH_SIZE = 900
+
+
+def _batches(values, size=LOOKUP_BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def lookup_values(model, field, values):
+    ids = {}
+    for batch in _batches(values):
+        ids.update(model.objects.filter(**{f'{field}__in': batch}).values_list(field, 'id'))
+    return ids
+
+
+def intern_values(model, field, values):
+    values = {str(value) for value in values if value}
+    if not values:
+        return {}
+    ids = lookup_values(model, field, values)
+    missing = values.difference(ids)
+    if missing:
+        # concurrent uploads may insert the same ids, the unique index makes
+        # that a no-op and the second lookup picks up whichever row won
+        model.objects.bulk_create(
+            [model(**{field: value}) for value in missing],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+        ids.update(lookup_values(model, field, missing))
+    return ids
+
+
+def lookup_reach_ids(values):
+    return lookup_values(Impression_Reach_Id, 'reach_id', values)
+
+
+def intern_reach_ids(values):
+    return intern_values(Impression_Reach_Id, 'reach_id', values)
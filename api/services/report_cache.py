@@ -0,0 +1,77 @@
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from api.models import Campaign
+from api.services.report_engine import REPORT_FILTER_PARAMS
+
+
+# Every campaign has a generation token that is part of all of its report
+# keys. Invalidating a campaign only replaces the token; the stale entries
+# are never read again and age out through the TTL / Redis LRU eviction.
+
+LIST_FILTER_SEPARATORS = {
+    'time_slots': ',',
+    'billboard_type': ',',
+    'location': ';',
+}
+
+
+def normalize_report_filters(filters):
+    normalized = {}
+    for name in REPORT_FILTER_PARAMS:
+        value = filters.get(name)
+        if value is None:
+            continue
+        value = str(value).strip()
+        separator = LIST_FILTER_SEPARATORS.get(name)
+        if separator:
+            value = separator.join(sorted({part.strip() for part in value.split(separator) if part.strip()}))
+        if value:
+            normalized[name] = value
+    return normalized
+
+
+def _generation_key(campaign_uuid):
+    return f"report:generation:{campaign_uuid}"
+
+
+def _generation(campaign_uuid):
+    generation = cache.get(_generation_key(campaign_uuid))
+    if generation is None:
+        generation = uuid.uuid4().hex
+        cache.add(_generation_key(campaign_uuid), generation, None)
+        generation = cache.get(_generation_key(campaign_uuid), generation)
+    return generation
+
+
+def report_cache_key(campaign_uuid, filters):
+    digest = hashlib.sha1(
+        json.dumps(normalize_report_filters(filters), sort_keys=True).encode()
+    ).hexdigest()
+    return f"report:{campaign_uuid}:{_generation(campaign_uuid)}:{digest}"
+
+
+def get_cached_report(campaign_uuid, filters):
+    return cache.get(report_cache_key(campaign_uuid, filters))
+
+
+def set_cached_report(campaign_uuid, filters, report):
+    cache.set(report_cache_key(campaign_uuid, filters), report, settings.REPORT_CACHE_TIMEOUT)
+
+
+def invalidate_campaign_reports(campaign_uuids):
+    cache.set_many({_generation_key(campaign_uuid): uuid.uuid4().hex for campaign_uuid in campaign_uuids}, None)
+
+
+def invalidate_reports_for_billboards(billboard_ids):
+    billboard_ids = {billboard_id for billboard_id in billboard_ids if billboard_id}
+    if not billboard_ids:
+        return
+    campaign_uuids = Campaign.objects.filter(
+        campaigns_time__billboard_id__in=billboard_ids
+    ).values_list('uuid', flat=True).distinct()
+    invalidate_campaign_reports(campaign_uuids)
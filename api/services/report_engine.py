@@ -0,0 +1,210 @@
+from collections import defaultdict
+
+from django.db.models import Sum
+
+from api.models import Billboard, Impression_Daily, Impression_Hourly
+from api.services.catchment import catchment_summary
+from api.services.constants import OBJECT_TYPE_COUNT_FIELDS
+from api.services.dwell import DwellState, merge_dwell
+from api.services.sketches import HyperLogLog, QuantileSketch
+
+
+TIME_SLOTS = {
+    'early_morning': [0, 1, 2, 3, 4, 5, 6],
+    'morning': [7, 8, 9, 10, 11, 12],
+    'afternoon': [13, 14, 15, 16, 17, 18],
+    'evening': [19, 20, 21, 22, 23],
+}
+
+REPORT_FILTER_PARAMS = ('start_date', 'end_date', 'start_time', 'end_time', 'time_slots', 'location', 'billboard_type')
+HOUR_FILTER_PARAMS = ('start_time', 'end_time', 'time_slots')
+
+
+def _round(value, digits=2):
+    return None if value is None else round(value, digits)
+
+
+def report_filters_from_params(params):
+    return {name: params.get(name) or None for name in REPORT_FILTER_PARAMS}
+
+
+def apply_report_filters(queryset, filters):
+    # shared by the raw Impression and the rollup querysets, both expose
+    # billboard/date/hour
+    if filters.get('start_date'):
+        queryset = queryset.filter(date__gte=filters['start_date'])
+    if filters.get('end_date'):
+        queryset = queryset.filter(date__lt=filters['end_date'])
+    if filters.get('start_time'):
+        queryset = queryset.filter(hour__gte=filters['start_time'])
+    if filters.get('end_time'):
+        queryset = queryset.filter(hour__lte=filters['end_time'])
+    if filters.get('time_slots'):
+        time_slot_list = [hour for slot in filters['time_slots'].split(',') for hour in TIME_SLOTS.get(slot, [])]
+        queryset = queryset.filter(hour__in=time_slot_list)
+    if filters.get('location'):
+        queryset = queryset.filter(billboard__location__division__in=filters['location'].split(';'))
+    if filters.get('billboard_type'):
+        queryset = queryset.filter(billboard__views__billboard_type__in=filters['billboard_type'].split(','))
+    return queryset
+
+
+class CampaignReportEngine:
+    """
+    Builds the campaign report with a fixed number of queries: one fetch of
+    the filtered hourly rollup rows grouped in memory, plus one query each for
+    the reach sketches, vehicle breakdown and billboard types.
+    """
+
+    STEPS = 4
+
+    def __init__(self, campaign, filters, progress=None):
+        self.campaign = campaign
+        self.filters = filters
+        self.progress = progress
+
+    def report_progress(self, step):
+        if self.progress:
+            self.progress(step, self.STEPS)
+
+    def billboards(self):
+        # campaign times may list a billboard more than once, keep first-seen order
+        billboards = {}
+        for billboard_id, billboard_uuid in self.campaign.campaigns_time.filter(
+            billboard__isnull=False
+        ).order_by('id').values_list('billboard_id', 'billboard__uuid'):
+            billboards.setdefault(billboard_id, billboard_uuid)
+        return billboards
+
+    def compute(self):
+        billboards = self.billboards()
+        rollups = apply_report_filters(
+            Impression_Hourly.objects.filter(billboard_id__in=billboards.keys()), self.filters
+        ).order_by().values_list(
+            'billboard_id', 'date', 'hour', 'impressions', 'ots', 'lts', 'dwalltime_sum', 'dwalltime_count',
+            'dwalltime_sum_sq', 'dwalltime_min', 'dwalltime_max', 'dwalltime_sketch',
+            'billboard__location__division', 'billboard__location__town_class', 'billboard__location__thana',
+        )
+
+        per_billboard = {}
+        per_date = defaultdict(int)
+        per_hour = defaultdict(int)
+        per_division = defaultdict(int)
+        per_area = {}
+        dwell = DwellState()
+        dwell_sketches = defaultdict(QuantileSketch)
+        for (billboard_id, date, hour, impressions, ots, lts, dwell_sum, dwell_count, dwell_sum_sq, dwell_min, dwell_max,
+             dwell_sketch, division, town_class, thana) in rollups:
+            totals = per_billboard.setdefault(billboard_id, {'impressions': 0, 'ots': 0, 'lts': 0})
+            totals['impressions'] += impressions
+            totals['ots'] += ots
+            totals['lts'] += lts
+            per_date[date] += impressions
+            per_hour[hour] += impressions
+            per_division[division] += impressions
+            area = per_area.setdefault(town_class, defaultdict(int))
+            area[thana] += impressions
+            merge_dwell(dwell, dwell_count, dwell_sum, dwell_sum_sq, dwell_min, dwell_max)
+            if dwell_sketch:
+                dwell_sketches[billboard_id].merge_bytes(dwell_sketch)
+
+        if not per_billboard:
+            return None
+        self.report_progress(1)
+
+        reach = self.reach(per_billboard.keys())
+        self.report_progress(2)
+        vehicle_data = self.vehicle_data(per_billboard.keys())
+        self.report_progress(3)
+        billboard_types = self.billboard_types(per_billboard.keys())
+        poi_catchment = catchment_summary(per_billboard.keys())
+        self.report_progress(4)
+        total_impressions = sum(totals['impressions'] for totals in per_billboard.values())
+        all_dwell = QuantileSketch()
+        for sketch in dwell_sketches.values():
+            all_dwell.merge(sketch)
+        billboard_count = len(per_billboard)
+
+        return {
+            'vehicale_data': vehicle_data,
+            'date_wise_data': [{'date': date, 'impressions': per_date[date]} for date in sorted(per_date)],
+            'card_data': {
+                'ots': round(sum(totals['ots'] for totals in per_billboard.values()) / billboard_count, 0),
+                'lts': round(sum(totals['lts'] for totals in per_billboard.values()) / billboard_count, 0),
+                'avg_dwalltime': round(dwell.mean or 0, 2),
+                'stddev_dwalltime': round(dwell.stddev or 0, 2),
+                'min_dwalltime': dwell.dwalltime_min,
+                'max_dwalltime': dwell.dwalltime_max,
+                'median_dwalltime': _round(all_dwell.quantile(0.5)),
+                'p90_dwalltime': _round(all_dwell.quantile(0.9)),
+                'total_frequency': reach['total'],
+                'total_impressions': total_impressions,
+                'total_billboards': len(billboards),
+                'total_date': len(per_date),
+            },
+            'hour_wise_impressions': [{'hour': hour, 'impressions': per_hour[hour]} for hour in sorted(per_hour)],
+            'billboard_wise_data': [
+                {
+                    'uuid': billboards[billboard_id],
+                    'impressions': per_billboard[billboard_id]['impressions'],
+                    'reach': reach['billboards'].get(billboard_id, 0),
+                    'median_dwalltime': _round(dwell_sketches[billboard_id].quantile(0.5)),
+                    'p90_dwalltime': _round(dwell_sketches[billboard_id].quantile(0.9)),
+                    'poi_catchment': poi_catchment.get(billboard_id, {}),
+                }
+                for billboard_id in billboards if billboard_id in per_billboard
+            ],
+            'location_wise_data': [
+                {'location': division, 'impressions': total} for division, total in per_division.items()
+            ],
+            'area_wise_data': [
+                {
+                    'area': area,
+                    'data': [{'location': thana, 'impressions': total} for thana, total in thanas.items()],
+                }
+                for area, thanas in per_area.items()
+            ],
+            'divisions': list(per_division),
+            'billboard_types': billboard_types,
+        }
+
+    def reach(self, billboard_ids):
+        # unique reach is a union of the bucket sketches, daily buckets are
+        # enough unless the report is restricted to some hours
+        if any(self.filters.get(name) for name in HOUR_FILTER_PARAMS):
+            buckets = Impression_Hourly.objects.all()
+        else:
+            buckets = Impression_Daily.objects.all()
+        buckets = apply_report_filters(
+            buckets.filter(billboard_id__in=billboard_ids, reach_sketch__isnull=False), self.filters
+        ).order_by().values_list('billboard_id', 'reach_sketch')
+
+        per_billboard = defaultdict(HyperLogLog)
+        for billboard_id, reach_sketch in buckets.iterator():
+            per_billboard[billboard_id].merge_bytes(reach_sketch)
+        everyone = HyperLogLog()
+        for sketch in per_billboard.values():
+            everyone.merge(sketch)
+        return {
+            'total': everyone.count(),
+            'billboards': {billboard_id: sketch.count() for billboard_id, sketch in per_billboard.items()},
+        }
+
+    def vehicle_data(self, billboard_ids):
+        per_date = apply_report_filters(
+            Impression_Hourly.objects.filter(billboard_id__in=billboard_ids), self.filters
+        ).order_by().values('date').annotate(
+            **{field: Sum(field) for field in OBJECT_TYPE_COUNT_FIELDS.values()}
+        ).order_by('date')
+        return [
+            {'date': row['date'], 'vehicle_type': vehicle_type, 'vehicle_count': row[field]}
+            for row in per_date
+            for vehicle_type, field in sorted(OBJECT_TYPE_COUNT_FIELDS.items())
+            if row[field]
+        ]
+
+    def billboard_types(self, billboard_ids):
+        queryset = Billboard.objects.filter(id__in=billboard_ids, views__isnull=False)
+        if self.filters.get('billboard_type'):
+            queryset = queryset.filter(views__billboard_type__in=self.filters['billboard_type'].split(','))
+        return list(set(queryset.values_list('views__billboard_type', flat=True)))
@@ -0,0 +1,85 @@
+import gzip
+import json
+import tempfile
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Max, Min
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from api.models import Cv, Event_Archive, Gps
+
+
+# Raw events older than the retention window are compacted into one gzipped
+# NDJSON file per kind and day under EVENT_ARCHIVE_ROOT/event_archives/ and
+# removed from the hot table. Cv rows are only archived once a rollup batch has
+# counted them, so nothing is dropped before it is counted.
+
+def _write_archive(kind, day, rows):
+    with tempfile.TemporaryFile() as tmp:
+        count = 0
+        with gzip.GzipFile(fileobj=tmp, mode='wb') as archive:
+            for row in rows:
+                archive.write(json.dumps(row, cls=DjangoJSONEncoder).encode() + b'\n')
+                count += 1
+        tmp.seek(0)
+        event_archive = Event_Archive(kind=kind, date=day, row_count=count)
+        event_archive.file.save(f'{kind.lower()}-{day.isoformat()}.ndjson.gz', File(tmp), save=False)
+    return event_archive
+
+
+def _archive_day(kind, day, queryset):
+    bounds = queryset.aggregate(first_id=Min('id'), last_id=Max('id'))
+    if bounds['last_id'] is None:
+        return None
+    # the id bound pins the archived set, rows arriving meanwhile stay hot
+    queryset = queryset.filter(id__lte=bounds['last_id'])
+    event_archive = _write_archive(kind, day, queryset.order_by('id').values().iterator(chunk_size=5000))
+    event_archive.first_id = bounds['first_id']
+    event_archive.last_id = bounds['last_id']
+    with transaction.atomic():
+        event_archive.save()
+        queryset.delete()
+    return event_archive
+
+
+def _cutoff(days):
+    return timezone.localdate() - timedelta(days=days)
+
+
+def archive_cv_events(retention_days=None):
+    cutoff = _cutoff(settings.CV_RETENTION_DAYS if retention_days is None else retention_days)
+    expired = Cv.objects.filter(
+        entry_time__lt=timezone.make_aware(datetime.combine(cutoff, time.min)),
+        rollup_batch__isnull=False,
+    )
+    archives = []
+    days = expired.annotate(day=TruncDate('entry_time')).values_list('day', flat=True).distinct().order_by('day')
+    for day in list(days):
+        start = timezone.make_aware(datetime.combine(day, time.min))
+        archive = _archive_day('CV', day, expired.filter(entry_time__gte=start, entry_time__lt=start + timedelta(days=1)))
+        if archive is not None:
+            archives.append(archive)
+    return archives
+
+
+def archive_gps_events(retention_days=None):
+    cutoff = _cutoff(settings.GPS_RETENTION_DAYS if retention_days is None else retention_days)
+    expired = Gps.objects.filter(date__lt=cutoff)
+    archives = []
+    for day in list(expired.values_list('date', flat=True).distinct().order_by('date')):
+        archive = _archive_day('GPS', day, expired.filter(date=day))
+        if archive is not None:
+            archives.append(archive)
+    return archives
+
+
+def read_event_archive(event_archive):
+    with event_archive.file.open('rb') as raw:
+        with gzip.GzipFile(fileobj=raw) as archive:
+            for line in archive:
+                yield json.loads(line)
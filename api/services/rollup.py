@@ -0,0 +1,210 @@
+import threading
+from collections import defaultdict
+from datetime import date as date_type
+
+from django.db import transaction
+from django.db.models import Max, Min, Q, Sum
+
+from api.models import Impression, Impression_Hourly, Impression_Daily, Rollup_Refresh
+from api.services.constants import OBJECT_TYPE_COUNT_FIELDS
+from api.services.dwell import merge_dwell_state
+from api.services.report_cache import invalidate_reports_for_billboards
+from api.services.sketches import HyperLogLog, QuantileSketch
+
+
+# Rollup buckets are rebuilt per (billboard, date) from the Impression rows,
+# so every ingestion path only has to report which keys it touched.
+
+def _as_date(value):
+    if isinstance(value, str):
+        return date_type.fromisoformat(value)
+    return value
+
+
+def normalize_rollup_keys(keys):
+    return {(billboard_id, _as_date(date)) for billboard_id, date in keys if billboard_id and date}
+
+
+def refresh_impression_rollups(keys):
+    keys = normalize_rollup_keys(keys)
+    if not keys:
+        return 0
+
+    billboard_ids = {billboard_id for billboard_id, _ in keys}
+    dates = {date for _, date in keys}
+
+    rows = Impression.objects.filter(
+        billboard_id__in=billboard_ids,
+        date__in=dates,
+        hour__isnull=False,
+    ).order_by().values('billboard_id', 'date', 'hour').annotate(
+        impressions_sum=Sum('impressions'),
+        ots_sum=Sum('ots'),
+        lts_sum=Sum('lts'),
+        dwell_sum=Sum('dwalltime_sum'),
+        dwell_count=Sum('dwalltime_count'),
+        dwell_sum_sq=Sum('dwalltime_sum_sq'),
+        dwell_min=Min('dwalltime_min'),
+        dwell_max=Max('dwalltime_max'),
+        **{field: Sum(field) for field in OBJECT_TYPE_COUNT_FIELDS.values()},
+    )
+
+    hourly_sketches = defaultdict(HyperLogLog)
+    daily_sketches = defaultdict(HyperLogLog)
+    hourly_dwell_sketches = defaultdict(QuantileSketch)
+    daily_dwell_sketches = defaultdict(QuantileSketch)
+    sketches = Impression.objects.filter(
+        Q(reach_sketch__isnull=False) | Q(dwalltime_sketch__isnull=False),
+        billboard_id__in=billboard_ids,
+        date__in=dates,
+        hour__isnull=False,
+    ).order_by().values_list('billboard_id', 'date', 'hour', 'reach_sketch', 'dwalltime_sketch')
+    for billboard_id, date, hour, reach_sketch, dwalltime_sketch in sketches.iterator():
+        if (billboard_id, date) in keys:
+            if reach_sketch:
+                hourly_sketches[(billboard_id, date, hour)].merge_bytes(reach_sketch)
+            if dwalltime_sketch:
+                hourly_dwell_sketches[(billboard_id, date, hour)].merge_bytes(dwalltime_sketch)
+
+    hourly = []
+    daily = {}
+    for row in rows:
+        key = (row['billboard_id'], row['date'])
+        if key not in keys:
+            continue
+        bucket = Impression_Hourly(
+            billboard_id=row['billboard_id'],
+            date=row['date'],
+            hour=row['hour'],
+            impressions=row['impressions_sum'] or 0,
+            ots=row['ots_sum'] or 0,
+            lts=row['lts_sum'] or 0,
+            dwalltime_sum=row['dwell_sum'] or 0,
+            dwalltime_count=row['dwell_count'] or 0,
+            dwalltime_sum_sq=row['dwell_sum_sq'] or 0,
+            dwalltime_min=row['dwell_min'],
+            dwalltime_max=row['dwell_max'],
+            **{field: row[field] or 0 for field in OBJECT_TYPE_COUNT_FIELDS.values()},
+        )
+        sketch = hourly_sketches.get((row['billboard_id'], row['date'], row['hour']))
+        if sketch is not None:
+            bucket.reach_sketch = sketch.to_bytes()
+            daily_sketches[key].merge(sketch)
+        dwell_sketch = hourly_dwell_sketches.get((row['billboard_id'], row['date'], row['hour']))
+        if dwell_sketch is not None:
+            bucket.dwalltime_sketch = dwell_sketch.to_bytes()
+            daily_dwell_sketches[key].merge(dwell_sketch)
+        hourly.append(bucket)
+        day = daily.get(key)
+        if day is None:
+            day = daily[key] = Impression_Daily(billboard_id=key[0], date=key[1])
+        day.impressions += bucket.impressions
+        day.ots += bucket.ots
+        day.lts += bucket.lts
+        merge_dwell_state(day, bucket)
+        for field in OBJECT_TYPE_COUNT_FIELDS.values():
+            setattr(day, field, getattr(day, field) + getattr(bucket, field))
+
+    for key, sketch in daily_sketches.items():
+        daily[key].reach_sketch = sketch.to_bytes()
+    for key, sketch in daily_dwell_sketches.items():
+        daily[key].dwalltime_sketch = sketch.to_bytes()
+
+    billboards_by_date = defaultdict(set)
+    for billboard_id, date in keys:
+        billboards_by_date[date].add(billboard_id)
+
+    with transaction.atomic():
+        # Drop the touched buckets first so hours that no longer have
+        # impressions do not linger in the rollup.
+        for date, ids in billboards_by_date.items():
+            Impression_Hourly.objects.filter(date=date, billboard_id__in=ids).delete()
+            Impression_Daily.objects.filter(date=date, billboard_id__in=ids).delete()
+        Impression_Hourly.objects.bulk_create(hourly, batch_size=1000)
+        Impression_Daily.objects.bulk_create(daily.values(), batch_size=1000)
+
+    invalidate_reports_for_billboards(billboard_ids)
+    return len(hourly)
+
+
+def mark_rollups_pending(keys):
+    """
+    Record keys whose impressions change in the current transaction. The
+    markers commit with the change, so a refresh that is lost after the
+    commit (a crash, a dead worker) is redone by refresh_pending_rollups.
+    """
+    Rollup_Refresh.objects.bulk_create(
+        [Rollup_Refresh(billboard_id=billboard_id, date=date) for billboard_id, date in normalize_rollup_keys(keys)],
+        batch_size=1000,
+    )
+
+
+def refresh_pending_rollups(keys=None, batch_size=5000):
+    """
+    Refresh the rollups of the pending markers of keys (all markers when
+    None) and clear the markers. Only markers read before the refresh are
+    cleared, changes committed meanwhile keep theirs for the next run.
+    """
+    markers = Rollup_Refresh.objects.order_by('id')
+    if keys is not None:
+        keys = normalize_rollup_keys(keys)
+        if not keys:
+            return 0
+        markers = markers.filter(billboard_id__in={key[0] for key in keys}, date__in={key[1] for key in keys})
+    total = 0
+    last_id = 0
+    while True:
+        rows = list(markers.filter(id__gt=last_id).values_list('id', 'billboard_id', 'date')[:batch_size])
+        if not rows:
+            return total
+        last_id = rows[-1][0]
+        if keys is not None:
+            rows = [row for row in rows if (row[1], row[2]) in keys]
+        total += refresh_impression_rollups((billboard_id, date) for _, billboard_id, date in rows)
+        Rollup_Refresh.objects.filter(id__in=[row[0] for row in rows]).delete()
+
+
+_pending = threading.local()
+
+
+def schedule_rollup_refresh(keys):
+    """
+    Mark the keys pending and refresh them once the current transaction
+    commits, all keys of one transaction are refreshed together. Outside a
+    transaction they are refreshed right away.
+    """
+    keys = normalize_rollup_keys(keys)
+    if not keys:
+        return
+    mark_rollups_pending(keys)
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        refresh_pending_rollups(keys)
+        return
+    refresh = getattr(_pending, 'refresh', None)
+    # a rolled back transaction drops its callback together with its keys
+    if refresh is not None and any(entry[1] is refresh for entry in connection.run_on_commit):
+        refresh.keys.update(keys)
+        return
+
+    def refresh():
+        if _pending.refresh is refresh:
+            _pending.refresh = None
+        refresh_pending_rollups(refresh.keys)
+
+    refresh.keys = set(keys)
+    _pending.refresh = refresh
+    transaction.on_commit(refresh)
+
+
+def rebuild_all_impression_rollups(batch_size=5000):
+    keys = set()
+    total = 0
+    pairs = Impression.objects.filter(date__isnull=False).order_by().values_list('billboard_id', 'date').distinct()
+    for key in pairs.iterator(chunk_size=batch_size):
+        keys.add(key)
+        if len(keys) >= batch_size:
+            total += refresh_impression_rollups(keys)
+            keys = set()
+    total += refresh_impression_rollups(keys)
+    return total
@@ -0,0 +1,120 @@
+import codecs
+import csv
+import gzip
+import hashlib
+import io
+import json
+from itertools import islice
+
+from rest_framework.parsers import BaseParser
+
+
+GZIP_MAGIC = b'\x1f\x8b'
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+CSV_EXTENSIONS = ('.csv',)
+
+
+class UploadFormatError(ValueError):
+    pass
+
+
+# errors of a corrupt upload: bad gzip data, truncated streams, invalid text
+UNREADABLE_UPLOAD_ERRORS = (OSError, EOFError, UnicodeDecodeError, csv.Error)
+
+
+def _readable(records):
+    try:
+        yield from records
+    except UNREADABLE_UPLOAD_ERRORS as e:
+        raise UploadFormatError(f"Unreadable upload: {e}")
+
+
+def open_binary(uploaded_file):
+    # read through gzip transparently, uploads are not required to say so
+    raw = uploaded_file.file if hasattr(uploaded_file, 'file') else uploaded_file
+    raw.seek(0)
+    magic = raw.read(2)
+    raw.seek(0)
+    if magic == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=raw)
+    return raw
+
+
+def open_text(uploaded_file):
+    return io.TextIOWrapper(open_binary(uploaded_file), encoding='utf-8-sig', newline='')
+
+
+def content_checksum(uploaded_file, block_size=1024 * 1024):
+    # hashes the decompressed content, so re-compressing a file keeps its checksum
+    digest = hashlib.sha256()
+    stream = open_binary(uploaded_file)
+    try:
+        for block in iter(lambda: stream.read(block_size), b''):
+            digest.update(block)
+    except UNREADABLE_UPLOAD_ERRORS as e:
+        raise UploadFormatError(f"Unreadable upload: {e}")
+    return digest.hexdigest()
+
+
+def detect_format(uploaded_file, fmt=None):
+    if fmt:
+        fmt = fmt.lower()
+        if fmt in ('ndjson', 'jsonl', 'csv'):
+            return 'csv' if fmt == 'csv' else 'ndjson'
+        raise UploadFormatError(f"Unsupported format {fmt}")
+    name = (getattr(uploaded_file, 'name', '') or '').lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    if name.endswith(NDJSON_EXTENSIONS):
+        return 'ndjson'
+    if name.endswith(CSV_EXTENSIONS):
+        return 'csv'
+    content_type = (getattr(uploaded_file, 'content_type', '') or '').lower()
+    if 'csv' in content_type:
+        return 'csv'
+    if 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'ndjson'
+    raise UploadFormatError("Could not detect file format, pass file_format=ndjson or file_format=csv")
+
+
+def iter_ndjson(text):
+    for line_number, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise UploadFormatError(f"Invalid JSON on line {line_number}: {e}")
+
+
+def iter_csv(text):
+    for row in csv.DictReader(text):
+        yield {key.strip(): value for key, value in row.items() if key}
+
+
+def iter_records(uploaded_file, fmt=None):
+    fmt = detect_format(uploaded_file, fmt)
+    text = open_text(uploaded_file)
+    if fmt == 'csv':
+        return _readable(iter_csv(text))
+    return _readable(iter_ndjson(text))
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class NdjsonParser(BaseParser):
+    # rows are parsed lazily while the view consumes them
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return iter(())
+        return _readable(iter_ndjson(codecs.getreader('utf-8-sig')(stream)))
@@ -0,0 +1,294 @@
+import json
+import re
+import uuid
+
+import numpy as np
+from django.core.cache import cache
+from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
+from rest_framework import status
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from scipy.spatial import cKDTree
+
+from api.models import Billboard, Billboard_Zone
+from api.services.constants import ZONE_KIND
+from api.services.streaming import NdjsonParser, UploadFormatError, chunked, iter_records
+
+
+ZONE_FIELDS = {'visible': 'visible_zone', 'observation': 'observation_zone'}
+ZONE_KINDS = [value for value, _ in ZONE_KIND]
+ZONE_VERSION_KEY = 'zones:version'
+ZONE_CACHE_TIMEOUT = 24 * 60 * 60
+ZONE_LOCATE_BATCH_SIZE = 100000
+NUMBER = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+
+
+# Zones are accepted as GeoJSON (Polygon, MultiPolygon, Feature or
+# FeatureCollection), WKT POLYGON / MULTIPOLYGON, or a plain list of
+# "latitude longitude" pairs, and stored as Billboard_Zone rows with their
+# bounding box. Coordinates are kept as [longitude, latitude].
+
+def _ring(points):
+    ring = [[float(point[0]), float(point[1])] for point in points]
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring.pop()
+    if len(ring) < 3:
+        raise ValueError("A ring needs at least 3 points")
+    for longitude, latitude in ring:
+        if not (-180 <= longitude <= 180 and -90 <= latitude <= 90):
+            raise ValueError(f"Invalid coordinate {latitude}, {longitude}")
+    return ring
+
+
+def _geojson_polygons(data):
+    kind = data.get('type')
+    if kind == 'FeatureCollection':
+        return [polygon for feature in data.get('features') or [] for polygon in _geojson_polygons(feature)]
+    if kind == 'Feature':
+        return _geojson_polygons(data.get('geometry') or {})
+    if kind == 'Polygon':
+        return [data['coordinates']]
+    if kind == 'MultiPolygon':
+        return list(data['coordinates'])
+    raise ValueError(f"Unsupported geometry {kind}")
+
+
+def parse_zone(text):
+    """[polygon [ring [[longitude, latitude], ...]]] of a zone text, [] when empty."""
+    text = (text or '').strip()
+    if not text:
+        return []
+    if text.upper().startswith(('POLYGON', 'MULTIPOLYGON')):
+        body = re.sub(rf'({NUMBER})\s+({NUMBER})', r'[\1, \2]', text[text.index('('):])
+        data = json.loads(body.replace('(', '[').replace(')', ']'))
+        polygons = [data] if text.upper().startswith('POLYGON') else data
+    elif text.startswith('{'):
+        polygons = _geojson_polygons(json.loads(text))
+    else:
+        numbers = [float(value) for value in re.findall(NUMBER, text)]
+        if len(numbers) % 2:
+            raise ValueError("Expected latitude longitude pairs")
+        polygons = [[[[longitude, latitude] for latitude, longitude in zip(numbers[::2], numbers[1::2])]]]
+    polygons = [[_ring(ring) for ring in polygon] for polygon in polygons if polygon]
+    if not polygons:
+        raise ValueError("No polygon found")
+    return polygons
+
+
+def sync_billboard_zones(infos):
+    """
+    Parse the zone texts of the given Billboard_info rows into Billboard_Zone
+    rows, returns {info_id: [error]}. A zone whose text cannot be parsed keeps
+    its last stored polygons.
+    """
+    errors = {}
+    for info in infos:
+        for kind, field in ZONE_FIELDS.items():
+            try:
+                polygons = parse_zone(getattr(info, field))
+            except (ValueError, TypeError, KeyError, IndexError) as e:
+                errors.setdefault(info.id, []).append(f"{field}: {e}")
+                continue
+            if not polygons:
+                Billboard_Zone.objects.filter(info=info, kind=kind).delete()
+                continue
+            points = np.array([point for polygon in polygons for point in polygon[0]])
+            Billboard_Zone.objects.update_or_create(info=info, kind=kind, defaults={
+                'polygons': polygons,
+                'min_longitude': float(points[:, 0].min()),
+                'min_latitude': float(points[:, 1].min()),
+                'max_longitude': float(points[:, 0].max()),
+                'max_latitude': float(points[:, 1].max()),
+            })
+    invalidate_zones()
+    return errors
+
+
+def polygon_edges(polygon):
+    """(ax, ay, bx, by) arrays of the non-horizontal edges of every ring of a polygon."""
+    edges = []
+    for ring in polygon:
+        ring = np.asarray(ring, dtype=float)
+        following = np.roll(ring, -1, axis=0)
+        edges.append(np.column_stack([ring, following]))
+    edges = np.concatenate(edges)
+    return edges[edges[:, 1] != edges[:, 3]].T.copy()
+
+
+def points_in_polygon(longitudes, latitudes, edges, chunk_size=4096):
+    """
+    Even-odd ray casting against polygon_edges, so holes are excluded. Points
+    are tested against all edges at once, chunk_size points at a time.
+    """
+    ax, ay, bx, by = edges
+    inside = np.zeros(len(longitudes), dtype=bool)
+    for start in range(0, len(longitudes), chunk_size):
+        lat = latitudes[start:start + chunk_size, None]
+        lng = longitudes[start:start + chunk_size, None]
+        crosses = (ay > lat) != (by > lat)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            left = lng < ax + (lat - ay) * (bx - ax) / (by - ay)
+        inside[start:start + chunk_size] = np.count_nonzero(crosses & left, axis=1) % 2 == 1
+    return inside
+
+
+class ZoneIndex:
+    """
+    Zones with their bounding boxes and billboards. The points of a lookup go
+    into a KD-tree, so every zone only ray-casts the points inside its box.
+    """
+
+    def __init__(self, rows, version=None):
+        self.version = version
+        self.rows = rows
+        self.kinds = {kind: [row for row in rows if row[0] == kind] for kind in ZONE_KINDS}
+        self.edges = {kind: [[polygon_edges(polygon) for polygon in row[2]] for row in zones] for kind, zones in self.kinds.items()}
+        self.boxes = {kind: np.array([row[3] for row in zones], dtype=float).reshape(-1, 4) for kind, zones in self.kinds.items()}
+
+    @classmethod
+    def build(cls, version=None):
+        billboards = {}
+        for info_id, billboard_id in Billboard.objects.filter(views__details__isnull=False).values_list(
+            'views__details', 'id'
+        ):
+            billboards.setdefault(info_id, set()).add(billboard_id)
+        rows = [
+            (kind, sorted(billboards[info_id]), polygons, (min_lat, min_lng, max_lat, max_lng))
+            for kind, info_id, polygons, min_lat, min_lng, max_lat, max_lng in Billboard_Zone.objects.order_by(
+                'id'
+            ).values_list('kind', 'info_id', 'polygons', 'min_latitude', 'min_longitude', 'max_latitude', 'max_longitude')
+            if info_id in billboards
+        ]
+        return cls(rows, version)
+
+    def locate(self, latitudes, longitudes, kind='visible'):
+        """(point indexes, billboard ids) of every point inside a zone of kind."""
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        zones = self.kinds.get(kind, [])
+        if not zones or not len(latitudes):
+            return np.array([], dtype=int), np.array([], dtype=int)
+        # a max-norm ball around the box centre covers the box
+        boxes = self.boxes[kind]
+        centres = np.column_stack([(boxes[:, 1] + boxes[:, 3]) / 2, (boxes[:, 0] + boxes[:, 2]) / 2])
+        radii = np.maximum(boxes[:, 3] - boxes[:, 1], boxes[:, 2] - boxes[:, 0]) / 2
+        hits = cKDTree(np.column_stack([longitudes, latitudes])).query_ball_point(centres, radii, p=np.inf)
+
+        points = []
+        billboards = []
+        for (_, billboard_ids, _, (min_lat, min_lng, max_lat, max_lng)), polygons, candidates in zip(
+            zones, self.edges[kind], hits
+        ):
+            if not candidates:
+                continue
+            candidates = np.array(candidates)
+            candidates = candidates[
+                (latitudes[candidates] >= min_lat) & (latitudes[candidates] <= max_lat)
+                & (longitudes[candidates] >= min_lng) & (longitudes[candidates] <= max_lng)
+            ]
+            inside = np.zeros(len(candidates), dtype=bool)
+            for polygon in polygons:
+                inside |= points_in_polygon(longitudes[candidates], latitudes[candidates], polygon)
+            for billboard_id in billboard_ids:
+                points.append(candidates[inside])
+                billboards.append(np.full(inside.sum(), billboard_id))
+        if not points:
+            return np.array([], dtype=int), np.array([], dtype=int)
+        return np.concatenate(points), np.concatenate(billboards)
+
+
+_index = None
+
+
+def _payload_key(version):
+    return f'zones:index:{version}'
+
+
+def get_zone_index():
+    global _index
+    version = cache.get(ZONE_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.add(ZONE_VERSION_KEY, version, None)
+        version = cache.get(ZONE_VERSION_KEY, version)
+    if _index is not None and _index.version == version:
+        return _index
+
+    rows = cache.get(_payload_key(version))
+    if rows is None:
+        index = ZoneIndex.build(version)
+        cache.set(_payload_key(version), index.rows, ZONE_CACHE_TIMEOUT)
+    else:
+        index = ZoneIndex(rows, version)
+    _index = index
+    return index
+
+
+def invalidate_zones():
+    global _index
+    _index = None
+    cache.set(ZONE_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+class BillboardZoneLocateView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, NdjsonParser, MultiPartParser]
+
+    @extend_schema(
+        summary="Locate Points in Billboard Zones",
+        description=(
+            "Billboards whose zone contains each point. Points come as a JSON array, an "
+            "application/x-ndjson body or an NDJSON/CSV `file` of objects with latitude, longitude and "
+            "an optional id, and are answered in the same order."
+        ),
+        tags=["Billboard"],
+        parameters=[
+            OpenApiParameter(name="kind", description="visible (default) or observation", required=False, type=str),
+            OpenApiParameter(name="file_format", description="csv or ndjson, detected when omitted", required=False, type=str),
+        ],
+        responses={
+            status.HTTP_200_OK: OpenApiResponse(description="Billboard uuids per point"),
+            status.HTTP_400_BAD_REQUEST: OpenApiResponse(description="Invalid points"),
+        }
+    )
+    def post(self, request):
+        kind = request.query_params.get('kind') or 'visible'
+        if kind not in ZONE_KINDS:
+            return Response({"message": f"kind must be one of {', '.join(ZONE_KINDS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        upload = request.FILES.get('file')
+        index = get_zone_index()
+        uuids = {}
+        results = []
+        try:
+            if upload:
+                rows = iter_records(upload, request.query_params.get('file_format') or request.data.get('file_format'))
+            elif isinstance(request.data, dict):
+                rows = [request.data]
+            else:
+                rows = request.data
+            for chunk in chunked(rows, ZONE_LOCATE_BATCH_SIZE):
+                try:
+                    latitudes = [float(row['latitude']) for row in chunk]
+                    longitudes = [float(row['longitude']) for row in chunk]
+                except (TypeError, ValueError, KeyError):
+                    raise UploadFormatError(f"Every point needs a numeric latitude and longitude (rows {len(results)}+)")
+                points, billboard_ids = index.locate(latitudes, longitudes, kind)
+                missing = set(billboard_ids.tolist()) - set(uuids)
+                if missing:
+                    uuids.update(Billboard.objects.filter(id__in=missing).values_list('id', 'uuid'))
+                matches = [[] for _ in chunk]
+                for point, billboard_id in zip(points.tolist(), billboard_ids.tolist()):
+                    # the index may still hold a billboard deleted since it was built
+                    if billboard_id in uuids:
+                        matches[point].append(uuids[billboard_id])
+                results.extend(
+                    {**({'id': row['id']} if row.get('id') is not None else {}), 'billboards': billboards}
+                    for row, billboards in zip(chunk, matches)
+                )
+        except UploadFormatError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(results, status=status.HTTP_200_OK)
@@ -0,0 +1,101 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from api.models import (
+    Billboard, Billboard_info, Billboard_View, Billboard_Zone, Campaign, Campaign_Time, Cv_count, Impression, Poi,
+)
+from api.services.baselines import invalidate_baselines
+from api.services.catchment import billboards_near, schedule_catchment_rebuild, stored_tracked_values, tracked_values
+from api.services.report_cache import invalidate_campaign_reports
+from api.services.rollup import schedule_rollup_refresh
+from api.services.zones import ZONE_FIELDS, invalidate_zones, sync_billboard_zones
+
+
+# Bulk ingestion paths refresh the rollups (and with them the report cache)
+# themselves, these receivers cover single-row edits (admin, API patches).
+
+@receiver(pre_save, sender=Impression)
+def remember_impression_bucket(sender, instance, **kwargs):
+    instance._rollup_previous = None
+    if instance.pk is not None:
+        instance._rollup_previous = Impression.objects.filter(pk=instance.pk).values_list('billboard_id', 'date').first()
+
+
+@receiver(post_save, sender=Impression)
+@receiver(post_delete, sender=Impression)
+def refresh_impression_reports(sender, instance, **kwargs):
+    # a moved impression also refreshes the bucket it left
+    previous = getattr(instance, '_rollup_previous', None)
+    schedule_rollup_refresh([(instance.billboard_id, instance.date)] + ([previous] if previous else []))
+
+
+@receiver(m2m_changed, sender=Campaign.campaigns_time.through)
+def invalidate_campaign_time_reports(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        invalidate_campaign_reports([instance.uuid])
+    elif pk_set:
+        invalidate_campaign_reports(Campaign.objects.filter(pk__in=pk_set).values_list('uuid', flat=True))
+
+
+@receiver(post_save, sender=Campaign_Time)
+@receiver(pre_delete, sender=Campaign_Time)
+def invalidate_changed_campaign_time_reports(sender, instance, **kwargs):
+    if instance.pk is not None:
+        invalidate_campaign_reports(instance.campaigns.values_list('uuid', flat=True))
+
+
+@receiver(post_save, sender=Cv_count)
+@receiver(post_delete, sender=Cv_count)
+def invalidate_cv_count_baselines(sender, instance, **kwargs):
+    invalidate_baselines()
+
+
+@receiver(pre_save, sender=Billboard)
+@receiver(pre_save, sender=Poi)
+def remember_catchment_position(sender, instance, **kwargs):
+    instance._catchment_previous = stored_tracked_values(instance)
+
+
+@receiver(post_save, sender=Billboard)
+def rebuild_billboard_catchment(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_catchment_previous', None)
+    if created or previous != tracked_values(instance):
+        schedule_catchment_rebuild([instance.id])
+
+
+@receiver(post_save, sender=Poi)
+def rebuild_poi_catchment(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_catchment_previous', None)
+    current = tracked_values(instance)
+    if previous == current:
+        return
+    points = [current[:2]] + ([previous[:2]] if previous else [])
+    schedule_catchment_rebuild(billboards_near(points))
+
+
+@receiver(post_delete, sender=Poi)
+def rebuild_deleted_poi_catchment(sender, instance, **kwargs):
+    schedule_catchment_rebuild(billboards_near([tracked_values(instance)[:2]]))
+
+
+@receiver(post_save, sender=Billboard_info)
+def sync_info_zones(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or set(ZONE_FIELDS.values()) & set(update_fields):
+        sync_billboard_zones([instance])
+
+
+# deleting a billboard or view cascades to the views m2m rows without m2m_changed
+@receiver(post_delete, sender=Billboard_Zone)
+@receiver(post_delete, sender=Billboard)
+@receiver(post_save, sender=Billboard_View)
+@receiver(post_delete, sender=Billboard_View)
+def invalidate_zone_index(sender, instance, **kwargs):
+    invalidate_zones()
+
+
+@receiver(m2m_changed, sender=Billboard.views.through)
+def invalidate_zone_billboards(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_zones()
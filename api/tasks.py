@@ -1,13 +1,78 @@
+import json
+
 from celery import shared_task
+from django.core.serializers.json import DjangoJSONEncoder
 
-from api.services.cv import UpdateImpressionModelAfterEvery1Hr
+from api.models import Campaign
+from api.services import ingestion_jobs
+from api.services.cv_rollup import rollup_cv_events
+from api.services.extrapolation import extrapolate_gps
+from api.services.live_counters import flush_live_counters
+from api.services.neighbours import compute_billboard_neighbours
+from api.services.report_cache import get_cached_report, set_cached_report
+from api.services.report_engine import CampaignReportEngine
+from api.services.retention import archive_cv_events, archive_gps_events
+from api.services.rollup import refresh_pending_rollups
 
 
 @shared_task
 def update_impressions_hourly():
-    try:
-        updater = UpdateImpressionModelAfterEvery1Hr()
-        updater.get()
-        return "Successfully updated impressions"
-    except Exception as e:
-        return f"Error updating impressions: {str(e)}" 
\ No newline at end of file
+    processed = rollup_cv_events()
+    return f"Successfully updated impressions from {processed} cv events"
+
+
+@shared_task
+def flush_live_cv_counters():
+    flushed = flush_live_counters()
+    return f"Flushed {flushed} live cv detections"
+
+
+@shared_task
+def refresh_pending_impression_rollups():
+    # rollups whose refresh was lost after their impressions committed
+    refreshed = refresh_pending_rollups()
+    return f"Refreshed {refreshed} hourly rollup buckets"
+
+
+@shared_task
+def archive_expired_events():
+    archives = archive_cv_events() + archive_gps_events()
+    return f"Archived {sum(archive.row_count for archive in archives)} events into {len(archives)} files"
+
+
+@shared_task(bind=True)
+def calculate_campaign_report(self, campaign_uuid, filters):
+    def progress(step, total):
+        self.update_state(state='PROGRESS', meta={'current': step, 'total': total})
+
+    report = get_cached_report(campaign_uuid, filters)
+    if report is None:
+        campaign = Campaign.objects.get(uuid=campaign_uuid)
+        report = CampaignReportEngine(campaign, filters, progress=progress).compute()
+        if report is not None:
+            set_cached_report(campaign.uuid, filters, report)
+    # results go through the JSON result backend
+    return json.loads(json.dumps(report, cls=DjangoJSONEncoder))
+
+
+@shared_task
+def split_ingestion_job(job_id):
+    job = ingestion_jobs.split_ingestion_job(job_id)
+    return job.status
+
+
+@shared_task
+def process_ingestion_batch(batch_id):
+    return ingestion_jobs.process_ingestion_batch(batch_id)
+
+
+@shared_task
+def extrapolate_gps_rows(start_date=None, end_date=None, ids=None):
+    updated = extrapolate_gps(start_date=start_date, end_date=end_date, ids=ids)
+    return f"Extrapolated {updated} gps rows"
+
+
+@shared_task
+def update_billboard_neighbours():
+    updated = compute_billboard_neighbours()
+    return f"Updated neighbours of {updated} billboard infos"
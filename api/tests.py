@@ -1,3 +1,904 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import random
+import tempfile
+from datetime import date, datetime, timezone as dt_timezone
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import Group, User
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+from api.models import (
+    Billboard, Billboard_info, Billboard_View, Billboard_Zone, Campaign, Campaign_Time, Cv, Cv_count, Event_Archive, Gps,
+    Gps_Device_Id, Impression, Impression_Daily, Impression_Detail, Impression_Hourly, Impression_Reach_Id,
+    Ingestion_Batch, Ingestion_Job, Live_Counter_Flush, Location, Poi, Rollup_Refresh,
+)
+from api.serializer import CustomBillboardSerializer
+from api.services import baselines
+from api.services.catchment import filter_near_poi, rebuild_billboard_catchments
+from api.services.cv_ingestion import CvIngestor
+from api.services.cv_rollup import CV_REJECTED_ROLLUP_BATCH, rollup_cv_events
+from api.services.extrapolation import extrapolate_gps
+from api.services.gps_ingestion import GpsIngestor
+from api.services.id_sets import decode_id_set, encode_id_set, union_id_sets
+from api.services.geo import decode_geohash, encode_geohash, geohash_cover, haversine_m
+from api.services.ingestion import ImpressionIngestor
+from api.services.ingestion_jobs import process_ingestion_batch, split_ingestion_job
+from api.services import live_counters
+from api.services.neighbours import compute_billboard_neighbours
+from api.services.poi_import import PoiImporter
+from api.services.report_engine import CampaignReportEngine
+from api.services.retention import archive_cv_events, archive_gps_events, read_event_archive
+from api.services.rollup import refresh_pending_rollups
+from api.services import zones
+from api.services.sketches import (
+    QUANTILE_ACCURACY, HyperLogLog, QuantileSketch, merge_quantile_sketches, merge_sketches, quantile_index,
+)
+from api.tasks import update_impressions_hourly
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class HyperLogLogTests(SimpleTestCase):
+    def test_estimate_within_error(self):
+        for distinct in (10, 1000, 50000):
+            sketch = HyperLogLog.from_values(f'device-{n}' for n in range(distinct))
+            self.assertAlmostEqual(sketch.count(), distinct, delta=max(1, distinct * 0.05))
+
+    def test_duplicates_are_counted_once(self):
+        sketch = HyperLogLog.from_values(['a', 'b', 'c'] * 100)
+        self.assertEqual(sketch.count(), 3)
+
+    def test_empty_sketch(self):
+        self.assertEqual(HyperLogLog().count(), 0)
+        self.assertEqual(HyperLogLog.from_bytes(None).count(), 0)
+
+    def test_merge_counts_the_union(self):
+        left = HyperLogLog.from_values(range(0, 6000))
+        right = HyperLogLog.from_values(range(4000, 10000))
+        union = HyperLogLog.from_values(range(0, 10000))
+        self.assertEqual(left.merge(right).registers, union.registers)
+
+    def test_sparse_and_dense_round_trip(self):
+        for distinct in (5, 20000):
+            sketch = HyperLogLog.from_values(range(distinct))
+            restored = HyperLogLog.from_bytes(sketch.to_bytes())
+            self.assertEqual(restored.registers, sketch.registers)
+        self.assertLess(len(HyperLogLog.from_values(range(5)).to_bytes()), 20)
+
+    def test_merge_sketches_of_blobs(self):
+        blobs = [HyperLogLog.from_values(range(start, start + 100)).to_bytes() for start in (0, 50, 100)]
+        merged = merge_sketches(blobs + [None, b''])
+        self.assertEqual(merged.registers, HyperLogLog.from_values(range(200)).registers)
+
+
+class QuantileSketchTests(SimpleTestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        self.values = [rng.lognormvariate(1, 1) for _ in range(20000)]
+
+    def assert_quantiles(self, sketch, values):
+        values = sorted(values)
+        for q in (0.1, 0.5, 0.9, 0.99):
+            exact = values[int(q * (len(values) - 1))]
+            self.assertAlmostEqual(sketch.quantile(q), exact, delta=exact * QUANTILE_ACCURACY * 1.01)
+
+    def test_quantiles_within_relative_error(self):
+        self.assert_quantiles(QuantileSketch.from_values(self.values), self.values)
+
+    def test_zero_and_empty(self):
+        self.assertIsNone(QuantileSketch().quantile(0.5))
+        sketch = QuantileSketch.from_values([0, 0, 0, 5])
+        self.assertEqual(sketch.count, 4)
+        self.assertEqual(sketch.quantile(0.5), 0.0)
+
+    def test_invalid_values_are_rejected(self):
+        sketch = QuantileSketch.from_values([1.0])
+        for value in (float('inf'), float('-inf'), float('nan'), -1.0):
+            with self.assertRaises(ValueError):
+                sketch.add(value)
+            with self.assertRaises(ValueError):
+                quantile_index(value)
+        self.assertEqual(sketch.count, 1)
+
+    def test_merge_matches_single_sketch(self):
+        left = QuantileSketch.from_values(self.values[:7000])
+        right = QuantileSketch.from_values(self.values[7000:])
+        merged = left.merge(right)
+        self.assertEqual(merged.bins, QuantileSketch.from_values(self.values).bins)
+        self.assert_quantiles(merged, self.values)
+
+    def test_bytes_round_trip(self):
+        sketch = QuantileSketch.from_values(self.values + [0])
+        restored = QuantileSketch.from_bytes(sketch.to_bytes())
+        self.assertEqual(restored.bins, sketch.bins)
+        self.assertEqual(restored.zero_count, 1)
+
+    def test_merge_quantile_sketches_of_blobs(self):
+        blobs = [QuantileSketch.from_values(self.values[start:start + 5000]).to_bytes() for start in range(0, 20000, 5000)]
+        merged = merge_quantile_sketches(blobs + [None])
+        self.assertEqual(merged.count, len(self.values))
+        self.assert_quantiles(merged, self.values)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ImpressionIngestionTests(TestCase):
+    def setUp(self):
+        self.billboard = Billboard.objects.create(title='b1')
+        self.other = Billboard.objects.create(title='b2')
+
+    def row(self, billboard=None, hour=8, impressions=10, dwalltime=2.0, reach="['a'\n'b']"):
+        return {
+            'billboard': str((billboard or self.billboard).uuid), 'date': '2025-01-01', 'hour': hour,
+            'impressions': impressions, 'dwalltime': dwalltime, 'reach': reach,
+        }
+
+    def test_rows_of_one_bucket_are_merged(self):
+        ingestor = ImpressionIngestor()
+        ingestor.ingest([self.row(), self.row(impressions=5, dwalltime=4.0, reach="['b'\n'c']")])
+        impression = Impression.objects.get(billboard=self.billboard, date=date(2025, 1, 1), hour=8)
+        self.assertEqual(impression.impressions, 15)
+        self.assertEqual(impression.ots, 2)
+        self.assertEqual(impression.dwalltime_count, 2)
+        self.assertAlmostEqual(impression.dwalltime, 3.0)
+        self.assertEqual(HyperLogLog.from_bytes(impression.reach_sketch).count(), 3)
+        self.assertEqual(QuantileSketch.from_bytes(impression.dwalltime_sketch).count, 2)
+        self.assertEqual(set(impression.reach.values_list('reach_id', flat=True)), {'a', 'b', 'c'})
+        self.assertEqual(ingestor.rollup_keys, {(self.billboard.id, date(2025, 1, 1))})
+
+    def test_later_uploads_add_to_existing_buckets(self):
+        ImpressionIngestor().ingest([self.row()])
+        ImpressionIngestor().ingest([self.row(impressions=7, reach="['a'\n'z']"), self.row(hour=9)])
+        impressions = Impression.objects.filter(billboard=self.billboard).order_by('hour')
+        self.assertEqual([impression.impressions for impression in impressions], [17, 10])
+        self.assertEqual(HyperLogLog.from_bytes(impressions[0].reach_sketch).count(), 3)
+        self.assertEqual(Impression_Reach_Id.objects.filter(reach_id='a').count(), 1)
+
+    def test_invalid_rows_are_rejected_individually(self):
+        ingestor = ImpressionIngestor()
+        ingestor.ingest([
+            self.row(), self.row(hour=24), {'billboard': str(self.billboard.uuid), 'date': 'soon', 'hour': 1},
+            self.row(billboard=Billboard(title='unsaved')), 'not a row',
+            self.row(dwalltime='nan'), self.row(dwalltime='inf'), self.row(dwalltime=-1),
+        ], offset=100)
+        self.assertEqual(ingestor.rows, 1)
+        self.assertEqual(ingestor.rejected, 6)
+        self.assertEqual(ingestor.skipped, 1)
+        self.assertEqual([error['index'] for error in ingestor.errors], [101, 102, 104, 105, 106, 107])
+        self.assertEqual(Impression.objects.count(), 1)
+
+    def make_batches(self, *payloads):
+        job = Ingestion_Job.objects.create(
+            file_format='ndjson', checksum='job', status='PROCESSING', total_batches=len(payloads)
+        )
+        batches = []
+        for index, rows in enumerate(payloads):
+            payload = '\n'.join(json.dumps(row) for row in rows)
+            batches.append(Ingestion_Batch.objects.create(
+                job=job, index=index, payload=payload, row_count=len(rows),
+                checksum=hashlib.sha256(payload.encode()).hexdigest(),
+            ))
+        return job, batches
+
+    def test_split_job_left_pending_is_started(self):
+        job, batches = self.make_batches([self.row()], [self.row(hour=9), self.row(hour=10)])
+        Ingestion_Job.objects.filter(id=job.id).update(status='PENDING', total_batches=0)
+        with self.captureOnCommitCallbacks() as callbacks:
+            job = split_ingestion_job(job.id)
+        self.assertEqual((job.status, job.total_batches, job.total_rows), ('PROCESSING', 2, 3))
+        self.assertEqual(len(callbacks), 2)
+        with self.captureOnCommitCallbacks() as callbacks:
+            split_ingestion_job(job.id)
+        self.assertEqual(callbacks, [])
+
+    def test_batch_ingests_and_refreshes_rollups(self):
+        job, (batch,) = self.make_batches([self.row(), self.row(billboard=self.other, hour=9)])
+        self.assertEqual(process_ingestion_batch(batch.id), 'COMPLETED')
+        batch.refresh_from_db()
+        job.refresh_from_db()
+        self.assertEqual(batch.claimed_checksum, batch.checksum)
+        self.assertEqual(batch.payload, '')
+        self.assertEqual((job.status, job.processed_batches), ('COMPLETED', 1))
+        self.assertEqual(Impression_Daily.objects.get(billboard=self.other).impressions, 10)
+        self.assertFalse(Rollup_Refresh.objects.exists())
+
+    def test_lost_rollup_refresh_is_retried(self):
+        job, (batch,) = self.make_batches([self.row()])
+        with mock.patch('api.services.rollup.refresh_impression_rollups', side_effect=RuntimeError('worker died')):
+            with self.assertRaises(RuntimeError):
+                process_ingestion_batch(batch.id)
+        self.assertFalse(Impression_Daily.objects.exists())
+        self.assertEqual(Rollup_Refresh.objects.count(), 1)
+        refresh_pending_rollups()
+        self.assertEqual(Impression_Daily.objects.get(billboard=self.billboard).impressions, 10)
+        self.assertFalse(Rollup_Refresh.objects.exists())
+
+    def test_batch_is_not_ingested_twice(self):
+        job, (batch,) = self.make_batches([self.row()])
+        process_ingestion_batch(batch.id)
+        self.assertEqual(process_ingestion_batch(batch.id), 'COMPLETED')
+        self.assertEqual(Impression.objects.get(billboard=self.billboard).impressions, 10)
+
+    def test_duplicate_content_is_skipped(self):
+        job, (first, second) = self.make_batches([self.row()], [self.row()])
+        self.assertEqual(process_ingestion_batch(first.id), 'COMPLETED')
+        self.assertEqual(process_ingestion_batch(second.id), 'SKIPPED')
+        second.refresh_from_db()
+        job.refresh_from_db()
+        self.assertIsNone(second.claimed_checksum)
+        self.assertEqual((job.status, job.processed_batches, job.skipped_batches), ('COMPLETED', 1, 1))
+        self.assertEqual(Impression.objects.get(billboard=self.billboard).impressions, 10)
+
+    def test_failed_batch_keeps_its_payload(self):
+        job, (batch,) = self.make_batches([self.row()])
+        Ingestion_Batch.objects.filter(id=batch.id).update(payload='{broken')
+        self.assertEqual(process_ingestion_batch(batch.id), 'FAILED')
+        batch.refresh_from_db()
+        self.assertEqual((batch.payload, batch.claimed_checksum, batch.attempts), ('{broken', None, 1))
+        self.assertFalse(Impression.objects.exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CvIngestionTests(TestCase):
+    def setUp(self):
+        self.billboard = Billboard.objects.create(title='b1')
+        self.view = Billboard_View.objects.create(camera_id='cam-1')
+        self.billboard.views.add(self.view)
+
+    def row(self, **values):
+        return {'camera_id': 'cam-1', 'object_type': 'Car', 'entry_time': '2025-01-01T08:15:00', **values}
+
+    def test_rows_resolve_their_billboard(self):
+        ingestor = CvIngestor()
+        ingestor.ingest([self.row(dwell_time='2.5'), self.row(exit_time='2025-01-01T08:15:04')])
+        self.assertEqual(ingestor.created, 2)
+        self.assertEqual(
+            sorted(Cv.objects.values_list('billboard_id', 'view_id', 'dwell_time')),
+            [(self.billboard.id, self.view.id, 2.5), (self.billboard.id, self.view.id, 4.0)],
+        )
+
+    def test_invalid_rows_are_rejected_individually(self):
+        ingestor = CvIngestor()
+        ingestor.ingest([
+            self.row(), self.row(dwell_time='inf'), self.row(dwell_time='nan'), self.row(dwell_time=-1),
+            self.row(exit_time='2025-01-01T08:00:00'), self.row(entry_time=20250101), self.row(camera_id='unknown'),
+            self.row(object_type='spaceship'),
+        ])
+        self.assertEqual((ingestor.created, ingestor.rejected), (1, 7))
+        self.assertEqual([error['index'] for error in ingestor.errors], list(range(1, 8)))
+        self.assertEqual(Cv.objects.count(), 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CvRollupTests(TestCase):
+    def setUp(self):
+        self.billboard = Billboard.objects.create(title='b1')
+
+    def detections(self, *dwell_times, hour=8):
+        entry_time = datetime(2025, 1, 1, hour, 15, tzinfo=dt_timezone.utc)
+        return Cv.objects.bulk_create([
+            Cv(billboard=self.billboard, object_type='Car', entry_time=entry_time, dwell_time=dwell_time)
+            for dwell_time in dwell_times
+        ])
+
+    def impression(self):
+        return Impression.objects.get(billboard=self.billboard)
+
+    def test_rows_are_counted_once(self):
+        self.detections(2.0, 0, None)
+        self.assertEqual(rollup_cv_events(batch_size=2), 3)
+        self.assertEqual(rollup_cv_events(), 0)
+        impression = self.impression()
+        self.assertEqual((impression.impressions, impression.lts, impression.car_count), (3, 1, 3))
+        self.assertEqual(impression.dwalltime_count, 2)
+        self.assertEqual(QuantileSketch.from_bytes(impression.dwalltime_sketch).count, 2)
+        self.assertEqual(Impression_Hourly.objects.get(billboard=self.billboard).impressions, 3)
+        self.assertFalse(Cv.objects.filter(rollup_batch__isnull=True).exists())
+
+    def test_late_rows_are_picked_up_by_the_next_run(self):
+        self.detections(1.0)
+        rollup_cv_events()
+        self.detections(1.0)
+        self.assertEqual(rollup_cv_events(), 1)
+        self.assertEqual(self.impression().impressions, 2)
+
+    def test_unbinnable_dwell_times_are_set_aside(self):
+        rejected = self.detections(float('inf'), -5.0)
+        self.detections(3.0)
+        rollup_cv_events()
+        impression = self.impression()
+        self.assertEqual((impression.impressions, impression.dwalltime_count, impression.dwalltime), (1, 1, 3.0))
+        self.assertEqual(
+            set(Cv.objects.filter(rollup_batch=CV_REJECTED_ROLLUP_BATCH).values_list('id', flat=True)),
+            {row.id for row in rejected},
+        )
+        self.assertEqual(rollup_cv_events(), 0)
+
+    def test_task_failures_are_raised(self):
+        with mock.patch('api.tasks.rollup_cv_events', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                update_impressions_hourly()
+
+
+@skipUnless(fakeredis, "fakeredis is not installed")
+@override_settings(CACHES=LOCMEM_CACHES)
+class LiveCounterTests(TestCase):
+    def setUp(self):
+        self.billboard = Billboard.objects.create(title='b1')
+        self.view = Billboard_View.objects.create(camera_id='cam-1')
+        self.billboard.views.add(self.view)
+        patcher = mock.patch.object(live_counters, '_client', fakeredis.FakeRedis())
+        self.client = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def row(self, dwell_time):
+        return {'camera_id': 'cam-1', 'object_type': 'Car', 'entry_time': '2025-01-01T08:15:00', 'dwell_time': dwell_time}
+
+    def test_flush_merges_counters_once(self):
+        ingestor = CvIngestor(live=True)
+        ingestor.ingest([self.row(2.0), self.row(4.0), self.row('inf')])
+        self.assertEqual((ingestor.created, ingestor.rejected), (2, 1))
+        self.assertFalse(Cv.objects.exists())
+        self.assertEqual(live_counters.flush_live_counters(), 2)
+        self.assertEqual(live_counters.flush_live_counters(), 0)
+        impression = Impression.objects.get(billboard=self.billboard)
+        self.assertEqual((impression.impressions, impression.car_count, impression.dwalltime), (2, 2, 3.0))
+        self.assertEqual(QuantileSketch.from_bytes(impression.dwalltime_sketch).count, 2)
+        self.assertFalse(Live_Counter_Flush.objects.exists())
+
+    def test_invalid_dwell_does_not_touch_redis(self):
+        entry_time = datetime(2025, 1, 1, 8, tzinfo=dt_timezone.utc)
+        events = [
+            Cv(billboard=self.billboard, object_type='Car', entry_time=entry_time, dwell_time=dwell_time)
+            for dwell_time in (1.0, float('nan'))
+        ]
+        with self.assertRaises(ValueError):
+            live_counters.increment_live_counters(events)
+        self.assertEqual(self.client.keys(), [])
+
+    def test_hashes_of_a_merged_flush_are_not_merged_again(self):
+        CvIngestor(live=True).ingest([self.row(2.0)])
+        key = self.client.smembers(live_counters.LIVE_KEYS).pop().decode()
+        # a flush that merged and crashed before deleting its hash
+        self.client.rename(key, f'{live_counters.LIVE_FLUSH_PREFIX}crashed:{key}')
+        self.client.srem(live_counters.LIVE_KEYS, key)
+        Live_Counter_Flush.objects.create(token='crashed')
+        self.assertEqual(live_counters.flush_live_counters(), 0)
+        self.assertFalse(Impression.objects.exists())
+        self.assertEqual(self.client.keys(f'{live_counters.LIVE_FLUSH_PREFIX}*'), [])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GpsIngestionTests(TestCase):
+    def setUp(self):
+        self.billboard = Billboard.objects.create(title='b1')
+        self.view = Billboard_View.objects.create(camera_id='cam-1')
+        self.billboard.views.add(self.view)
+
+    def row(self, **values):
+        return {'billboard': self.billboard.id, 'date': '2025-01-01', 'hour': 8, 'ots': 5, 'device_ids': 'a,b', **values}
+
+    def test_buckets_are_upserted(self):
+        ingestor = GpsIngestor()
+        ingestor.ingest([self.row(), self.row(ots=6), self.row(view=self.view.id, ots=7)])
+        ingestor.ingest([self.row(ots=9, device_ids=['c'])])
+        self.assertEqual((ingestor.created, ingestor.updated), (2, 1))
+        self.assertEqual(
+            sorted(Gps.objects.values_list('view_id', 'ots', 'device_ids'), key=str),
+            sorted([(None, 9, "['c']"), (self.view.id, 7, 'a,b')], key=str),
+        )
+
+    def test_invalid_rows_are_rejected_individually(self):
+        ingestor = GpsIngestor()
+        ingestor.ingest([
+            self.row(), self.row(date=20250101), self.row(date=[1]), self.row(date='2025-02-30'),
+            self.row(dwell_time='inf'), self.row(dwell_time='nan'), self.row(dwell_time=-1), self.row(hour=24),
+            self.row(device_ids=12), self.row(billboard=0),
+        ])
+        self.assertEqual((ingestor.created, ingestor.rejected), (1, 9))
+        self.assertEqual([error['index'] for error in ingestor.errors], list(range(1, 10)))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RetentionTests(TestCase):
+    def setUp(self):
+        self.billboard = Billboard.objects.create(title='b1')
+        archive_root = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_root.cleanup)
+        patcher = mock.patch.object(
+            Event_Archive._meta.get_field('file'), 'storage', FileSystemStorage(location=archive_root.name),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_counted_cv_rows_are_archived(self):
+        entry_time = datetime(2025, 1, 1, 8, tzinfo=dt_timezone.utc)
+        counted = Cv.objects.create(billboard=self.billboard, object_type='Car', entry_time=entry_time, dwell_time=2.0, rollup_batch=1)
+        pending = Cv.objects.create(billboard=self.billboard, object_type='Car', entry_time=entry_time, dwell_time=3.0)
+        archives = archive_cv_events(retention_days=30)
+        self.assertEqual([(archive.kind, archive.row_count) for archive in archives], [('CV', 1)])
+        self.assertEqual([row['id'] for row in read_event_archive(archives[0])], [counted.id])
+        self.assertEqual(list(Cv.objects.values_list('id', flat=True)), [pending.id])
+
+    def test_gps_rows_are_archived_per_day(self):
+        for day in (date(2020, 1, 1), date(2020, 1, 2)):
+            Gps.objects.create(billboard=self.billboard, date=day, hour=8, ots=5)
+        Gps.objects.create(billboard=self.billboard, date=date.today(), hour=8, ots=5)
+        archives = archive_gps_events(retention_days=365)
+        self.assertEqual([(archive.date, archive.row_count) for archive in archives], [(date(2020, 1, 1), 1), (date(2020, 1, 2), 1)])
+        self.assertEqual(Gps.objects.count(), 1)
+        self.assertEqual(archive_gps_events(retention_days=365), [])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class IngestionJobViewTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner')
+        self.other = User.objects.create_user('other')
+        self.job = Ingestion_Job.objects.create(user=self.owner, file_format='ndjson', checksum='job', status='FAILED')
+        self.client = APIClient()
+
+    def status_of(self, user, job_id=None):
+        if user is not None:
+            self.client.force_authenticate(user)
+        return self.client.get('/api/report/upload/status/', {'job_id': job_id or str(self.job.uuid)})
+
+    def test_jobs_are_scoped_to_their_user(self):
+        self.assertEqual(self.status_of(self.owner).status_code, 200)
+        self.assertEqual(self.status_of(self.other).status_code, 404)
+        self.other.groups.add(Group.objects.create(name='admin'))
+        self.assertEqual(self.status_of(self.other).status_code, 200)
+
+    def test_authentication_is_required(self):
+        self.assertEqual(self.status_of(None).status_code, 401)
+        self.assertEqual(self.client.post('/api/report/upload/retry/', {'job_id': str(self.job.uuid)}).status_code, 401)
+
+    def test_invalid_job_id(self):
+        self.assertEqual(self.status_of(self.owner, 'not-a-uuid').status_code, 400)
+
+    def test_retry_of_another_users_job(self):
+        self.client.force_authenticate(self.other)
+        response = self.client.post('/api/report/upload/retry/', {'job_id': str(self.job.uuid)}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BillboardNearbyTests(TestCase):
+    def setUp(self):
+        self.near = Billboard.objects.create(title='near', latitude=23.7808, longitude=90.4067)
+        self.far = Billboard.objects.create(title='far', latitude=23.8103, longitude=90.4125)
+        Billboard.objects.create(title='antimeridian', latitude=0.0, longitude=179.999)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('viewer'))
+
+    def nearby(self, **params):
+        return self.client.get('/api/billboard/nearby/', params)
+
+    def test_radius_query_is_sorted_by_distance(self):
+        response = self.nearby(latitude=23.7806, longitude=90.4066, radius=5000)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['title'] for row in response.data], ['near', 'far'])
+        self.assertLess(response.data[0]['distance_m'], 50)
+        self.assertEqual(len(self.nearby(latitude=23.7806, longitude=90.4066, radius=100).data), 1)
+
+    def test_bbox_crossing_the_antimeridian(self):
+        response = self.nearby(bbox='-1,179,1,-179')
+        self.assertEqual([row['title'] for row in response.data], ['antimeridian'])
+
+    def test_invalid_coordinates_are_rejected(self):
+        for params in (
+            {'latitude': 'inf', 'longitude': 90},
+            {'latitude': 'nan', 'longitude': 90},
+            {'latitude': 91, 'longitude': 90},
+            {'latitude': 23, 'longitude': -181},
+            {'latitude': 23, 'longitude': 90, 'radius': 'inf'},
+            {'latitude': 23, 'longitude': 90, 'limit': 'inf'},
+            {'bbox': '0,0,95,1'},
+            {'bbox': '0,0,1'},
+            {'latitude': 23},
+        ):
+            self.assertEqual(self.nearby(**params).status_code, 400, params)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PoiImportTests(TestCase):
+    def row(self, **values):
+        return {'name': 'Bashundhara City', 'latitude': 23.7509, 'longitude': 90.3904, 'source': 'osm', **values}
+
+    def test_nearby_similar_names_are_merged(self):
+        Poi.objects.create(name='Bashundhara City Mall', latitude=23.7509, longitude=90.3904, source='google')
+        importer = PoiImporter()
+        importer.ingest([
+            self.row(name='Bashundhara City Mall.', address='Panthapath'),
+            self.row(name='Bashundhara City Mall', latitude=23.7520),
+            self.row(name='Karwan Bazar', source='osm'),
+            self.row(name='Karwan Bazar ', source='survey'),
+        ])
+        self.assertEqual((importer.created, importer.merged, importer.rejected), (2, 2, 0))
+        mall = Poi.objects.get(name='Bashundhara City Mall', latitude=23.7509)
+        self.assertEqual((mall.address, mall.source), ('Panthapath', 'google,osm'))
+        self.assertEqual(Poi.objects.get(name='Karwan Bazar').source, 'osm,survey')
+        self.assertEqual(Poi.objects.count(), 3)
+
+    def test_invalid_rows_are_rejected_individually(self):
+        importer = PoiImporter()
+        importer.ingest([
+            self.row(name=12, source=7), self.row(name=['a']), self.row(name=''), self.row(name='x' * 256),
+            self.row(source={'a': 1}), self.row(latitude='nan'), self.row(latitude=91), self.row(types='nope'), 'row',
+        ])
+        self.assertEqual((importer.created, importer.rejected), (1, 8))
+        self.assertEqual([error['index'] for error in importer.errors], list(range(1, 9)))
+        self.assertEqual(Poi.objects.values_list('name', 'source').get(), ('12', '7'))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CampaignReportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('client')
+        self.billboards = [Billboard.objects.create(title=f'b{n}') for n in range(4)]
+
+    def campaign(self, billboards):
+        campaign = Campaign.objects.create(user=self.user, title='c1')
+        for billboard in billboards:
+            campaign.campaigns_time.add(Campaign_Time.objects.create(billboard=billboard))
+        return campaign
+
+    def ingest(self, billboards):
+        ImpressionIngestor().ingest([
+            {
+                'billboard': str(billboard.uuid), 'date': f'2025-01-0{day}', 'hour': hour, 'impressions': 10,
+                'dwalltime': 2.0, 'reach': f"['{billboard.id}-{day}'\n'shared']",
+            }
+            for billboard in billboards for day in (1, 2) for hour in (8, 20)
+        ])
+        refresh_pending_rollups()
+
+    def test_report_totals(self):
+        self.ingest(self.billboards[:2])
+        # a billboard listed twice is counted once
+        report = CampaignReportEngine(self.campaign(self.billboards[:2] + self.billboards[:1]), {}).compute()
+        self.assertEqual(report['card_data']['total_impressions'], 80)
+        self.assertEqual(report['card_data']['total_billboards'], 2)
+        self.assertEqual(report['card_data']['total_frequency'], 5)
+        self.assertEqual(report['card_data']['avg_dwalltime'], 2.0)
+        self.assertEqual(
+            [(row['uuid'], row['impressions'], row['reach']) for row in report['billboard_wise_data']],
+            [(billboard.uuid, 40, 3) for billboard in self.billboards[:2]],
+        )
+        self.assertEqual(report['hour_wise_impressions'], [{'hour': 8, 'impressions': 40}, {'hour': 20, 'impressions': 40}])
+
+        report = CampaignReportEngine(self.campaign(self.billboards[:2]), {'time_slots': 'morning'}).compute()
+        self.assertEqual(report['card_data']['total_impressions'], 40)
+        self.assertIsNone(CampaignReportEngine(self.campaign(self.billboards[2:]), {}).compute())
+
+    def test_query_count_does_not_grow_with_billboards(self):
+        self.ingest(self.billboards)
+        small, large = self.campaign(self.billboards[:1]), self.campaign(self.billboards)
+        with self.assertNumQueries(6):
+            CampaignReportEngine(small, {}).compute()
+        with self.assertNumQueries(6):
+            CampaignReportEngine(large, {}).compute()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class VehicleBreakdownTests(TestCase):
+    def setUp(self):
+        self.billboard = Billboard.objects.create(title='b1')
+
+    def test_rollup_counts_each_object_type(self):
+        entry_time = datetime(2025, 1, 1, 8, 15, tzinfo=dt_timezone.utc)
+        Cv.objects.bulk_create([
+            Cv(billboard=self.billboard, object_type=object_type, entry_time=entry_time, dwell_time=1.0)
+            for object_type in ('Car', 'Car', 'Bus', 'Person', None)
+        ])
+        rollup_cv_events()
+        daily = Impression_Daily.objects.get(billboard=self.billboard)
+        self.assertEqual(
+            (daily.impressions, daily.car_count, daily.bus_count, daily.person_count, daily.other_count), (5, 2, 1, 1, 1),
+        )
+        report = CampaignReportEngine(None, {}).vehicle_data([self.billboard.id])
+        self.assertEqual(
+            [(row['vehicle_type'], row['vehicle_count']) for row in report],
+            [('Bus', 1), ('Car', 2), ('Other', 1), ('Person', 1)],
+        )
+
+    def test_details_are_migrated_into_the_columns(self):
+        impression = Impression.objects.create(billboard=self.billboard, date=date(2025, 1, 1), hour=8, impressions=4, car_count=1)
+        impression.impression_detail.add(
+            Impression_Detail.objects.create(vehicle_type='Car', vehicle_count=2),
+            Impression_Detail.objects.create(vehicle_type='Truck', vehicle_count=1),
+        )
+        call_command('migrate_impression_details', stdout=io.StringIO())
+        impression.refresh_from_db()
+        self.assertEqual((impression.car_count, impression.truck_count), (3, 1))
+        self.assertFalse(Impression_Detail.objects.exists())
+        self.assertEqual(Impression_Hourly.objects.get(billboard=self.billboard).car_count, 3)
+        call_command('migrate_impression_details', stdout=io.StringIO())
+        impression.refresh_from_db()
+        self.assertEqual(impression.car_count, 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BaselineMatrixTests(TestCase):
+    def setUp(self):
+        baselines.invalidate_baselines()
+
+    def baseline(self, passenger, **values):
+        return Cv_count.objects.create(object_type='Car', week_day='Monday', hour=8, passenger=passenger, **values)
+
+    def test_lookup_honours_validity_windows(self):
+        self.baseline(10)
+        self.baseline(20, valid_from=date(2025, 1, 1), valid_to=date(2025, 1, 31))
+        self.baseline(99, status='Inactive')
+        matrix = baselines.get_baseline_matrix()
+        # 2025-01-06 and 2025-02-03 are Mondays
+        self.assertEqual(matrix.for_date('Car', date(2025, 1, 6), 8), 20)
+        self.assertEqual(matrix.for_date('Car', '2025-02-03', 8), 10)
+        self.assertIsNone(matrix.for_date('Car', date(2025, 1, 7), 8))
+        self.assertEqual(matrix.hourly(date(2025, 1, 6))['Car'][7:9], [None, 20])
+
+    def test_matrix_is_shared_and_rebuilt_after_writes(self):
+        baseline = self.baseline(10)
+        matrix = baselines.get_baseline_matrix()
+        with self.assertNumQueries(0):
+            self.assertIs(baselines.get_baseline_matrix(), matrix)
+        # another process finds the built matrix in the cache
+        with mock.patch.object(baselines, '_matrix', None), self.assertNumQueries(0):
+            self.assertEqual(baselines.get_baseline_matrix().lookup('Car', 0, 8), 10)
+        baseline.passenger = 12
+        baseline.save()
+        self.assertEqual(baselines.get_baseline_matrix().lookup('Car', 0, 8), 12)
+        baseline.delete()
+        self.assertIsNone(baselines.get_baseline_matrix().lookup('Car', 0, 8))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GpsExtrapolationTests(TestCase):
+    def setUp(self):
+        baselines.invalidate_baselines()
+        location = Location.objects.create(location='Dhaka', extrapolation_factor=2.0)
+        self.billboard = Billboard.objects.create(title='b1', location=location)
+
+    def gps(self, day, hour, ots=10, lts=None, **values):
+        return Gps.objects.create(billboard=self.billboard, date=day, hour=hour, ots=ots, lts=lts, reach=4, **values)
+
+    def extrapolated(self, gps):
+        gps.refresh_from_db()
+        return gps.extrapolated_ots, gps.extrapolated_lts, gps.extrapolated_reach
+
+    def test_hours_follow_the_baseline_profile(self):
+        for hour, passenger in ((8, 30), (9, 10)):
+            Cv_count.objects.create(object_type='Car', week_day='Monday', hour=hour, passenger=passenger)
+        monday, tuesday = date(2025, 1, 6), date(2025, 1, 7)
+        rows = [self.gps(monday, 8), self.gps(monday, 9, lts=3), self.gps(monday, 10), self.gps(tuesday, 8)]
+        self.assertEqual(extrapolate_gps(batch_size=3), 4)
+        self.assertEqual([self.extrapolated(gps) for gps in rows], [(30, None, 12), (10, 3, 4), (20, None, 8), (20, None, 8)])
+
+    def test_rows_without_a_location_fall_back_to_the_billboard(self):
+        other = self.gps(date(2025, 1, 6), 8, location=Location.objects.create(location='Rural', extrapolation_factor=0.5))
+        plain = self.gps(date(2025, 1, 6), 9)
+        extrapolate_gps(ids=[other.id, plain.id])
+        self.assertEqual([self.extrapolated(gps) for gps in (other, plain)], [(5, None, 2), (20, None, 8)])
+
+
+class IdSetTests(SimpleTestCase):
+    def test_round_trip(self):
+        ids = [1, 2, 3, 127, 128, 300, 2 ** 40]
+        self.assertEqual(decode_id_set(encode_id_set(reversed(ids + [3]))), ids)
+        self.assertEqual(encode_id_set([1, 2, 3]), bytes([1, 1, 1]))
+        self.assertEqual(decode_id_set(None), [])
+
+    def test_union_merges_sorted_streams(self):
+        self.assertEqual(union_id_sets([encode_id_set([1, 5, 9]), None, encode_id_set([2, 5, 400])]), [1, 2, 5, 9, 400])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GpsReachTests(TestCase):
+    def setUp(self):
+        self.billboards = [Billboard.objects.create(title=f'b{n}') for n in range(2)]
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('viewer'))
+
+    def ingest(self, billboard, hour, device_ids, ips=''):
+        GpsIngestor().ingest([{
+            'billboard': billboard.id, 'date': '2025-01-01', 'hour': hour, 'ots': 1, 'device_ids': device_ids, 'ips': ips,
+        }])
+
+    def test_reach_counts_unique_devices(self):
+        first, second = self.billboards
+        self.ingest(first, 8, 'a,b', '10.0.0.1')
+        self.ingest(first, 9, 'b,c', '10.0.0.1')
+        self.ingest(second, 8, 'c,d')
+        # ips are interned apart from device ids with the same text
+        self.ingest(second, 9, '', 'a')
+        self.assertEqual(Gps_Device_Id.objects.count(), 6)
+
+        response = self.client.get('/api/gps/reach/', {'billboard': f'{first.uuid},{second.uuid}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], {'devices': 4, 'ips': 2, 'estimated_devices': 4})
+        self.assertEqual(response.data['common_devices'], 1)
+        self.assertEqual(
+            {row['uuid']: (row['devices'], row['ips']) for row in response.data['billboards']},
+            {first.uuid: (3, 1), second.uuid: (2, 1)},
+        )
+        self.assertEqual(self.client.get('/api/gps/reach/').status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BillboardNeighbourTests(TestCase):
+    def billboard(self, latitude, longitude, **info):
+        billboard = Billboard.objects.create(title='b', latitude=latitude, longitude=longitude)
+        view = Billboard_View.objects.create(details=Billboard_info.objects.create(**info) if info is not None else None)
+        billboard.views.add(view)
+        return view.details
+
+    def test_closest_neighbour_and_radius_counts(self):
+        first = self.billboard(23.78, 90.40, radius=200)
+        # another face at the same site
+        same_site = self.billboard(23.78, 90.40)
+        self.billboard(23.781, 90.40)
+        far = self.billboard(23.79, 90.40, radius=50, total_neighbours=7)
+        self.assertEqual(compute_billboard_neighbours(), 4)
+        first.refresh_from_db()
+        same_site.refresh_from_db()
+        far.refresh_from_db()
+        self.assertEqual((first.distance_of_closest_neighbour_m, first.total_neighbours), (0, 2))
+        self.assertEqual((same_site.distance_of_closest_neighbour_m, same_site.total_neighbours), (0, None))
+        self.assertAlmostEqual(far.distance_of_closest_neighbour_m, haversine_m(23.781, 90.40, 23.79, 90.40), delta=0.5)
+        self.assertEqual(far.total_neighbours, 0)
+
+    def test_single_billboard_has_no_neighbour(self):
+        info = self.billboard(23.78, 90.40, radius=100)
+        compute_billboard_neighbours()
+        info.refresh_from_db()
+        self.assertEqual((info.distance_of_closest_neighbour_m, info.total_neighbours), (None, 0))
+
+
+class GeohashTests(SimpleTestCase):
+    def test_encode_matches_reference_values(self):
+        self.assertEqual(encode_geohash(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertIsNone(encode_geohash(None, 10.0))
+        for precision in (5, 8, 9):
+            min_lat, min_lng, max_lat, max_lng = decode_geohash(encode_geohash(23.7808, 90.4067, precision))
+            self.assertTrue(min_lat <= 23.7808 < max_lat and min_lng <= 90.4067 < max_lng)
+
+    def test_cover_contains_every_point_within_the_radius(self):
+        rng = random.Random(7)
+        for latitude, longitude, radius in ((23.78, 90.40, 1000), (0.0, 179.999, 500), (-33.86, 151.2, 5000)):
+            cells = geohash_cover(latitude, longitude, radius)
+            for _ in range(200):
+                point = (latitude + rng.uniform(-0.05, 0.05), longitude + rng.uniform(-0.05, 0.05))
+                point = (point[0], (point[1] + 180) % 360 - 180)
+                if haversine_m(latitude, longitude, *point) <= radius:
+                    self.assertTrue(any(encode_geohash(*point).startswith(cell) for cell in cells), point)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, POI_CATCHMENT_RADII_M=[250, 500, 1000])
+class PoiCatchmentTests(TestCase):
+    def setUp(self):
+        self.billboard = Billboard.objects.create(title='b1', latitude=23.78, longitude=90.40)
+        self.far = Billboard.objects.create(title='b2', latitude=24.5, longitude=90.40)
+
+    def poi(self, offset, bc_category, **values):
+        return Poi.objects.create(name='p', latitude=23.78 + offset, longitude=90.40, bc_category=bc_category, **values)
+
+    def summary(self, billboard):
+        return CustomBillboardSerializer(billboard, context={'poi_catchment': True}).data['poi_catchment']
+
+    def test_counts_are_cumulative_per_category(self):
+        self.poi(0.002, 'Retail')
+        self.poi(0.004, 'Retail')
+        self.poi(0.008, 'Food Store')
+        self.poi(0.0005, None)
+        self.poi(0.001, 'Retail', status='Inactive')
+        rebuild_billboard_catchments()
+        summary = self.summary(self.billboard)
+        self.assertEqual({radius: row['count'] for radius, row in summary['Retail'].items()}, {250: 1, 500: 2, 1000: 2})
+        self.assertAlmostEqual(summary['Retail'][250]['nearest_m'], haversine_m(23.78, 90.40, 23.782, 90.40), delta=0.1)
+        self.assertEqual(list(summary['Food Store']), [1000])
+        self.assertEqual(list(summary['Other']), [250, 500, 1000])
+        self.assertEqual(self.summary(self.far), {})
+        self.assertNotIn('poi_catchment', CustomBillboardSerializer(self.billboard).data)
+
+        billboards = Billboard.objects.all()
+        self.assertEqual(list(filter_near_poi(billboards, 'Retail', 500)), [self.billboard])
+        self.assertEqual(list(filter_near_poi(billboards, 'Food Store', '250')), [])
+        with self.assertRaises(ValueError):
+            filter_near_poi(billboards, 'Retail', 300)
+
+    def test_moved_pois_and_billboards_are_rebuilt(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            poi = self.poi(0.002, 'Retail')
+        self.assertEqual(self.summary(self.billboard)['Retail'][250]['count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            poi.latitude = 24.501
+            poi.save()
+        self.assertEqual(self.summary(self.billboard), {})
+        self.assertEqual(self.summary(self.far)['Retail'][250]['count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.billboard.latitude = 24.502
+            self.billboard.save()
+        self.assertEqual(self.summary(self.billboard)['Retail'][250]['count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            poi.delete()
+        self.assertEqual(self.summary(self.billboard), {})
+
+
+SQUARE_WITH_HOLE = (
+    'POLYGON ((90 23, 90.1 23, 90.1 23.1, 90 23.1, 90 23), '
+    '(90.04 23.04, 90.06 23.04, 90.06 23.06, 90.04 23.06, 90.04 23.04))'
+)
+
+
+class ZoneParsingTests(SimpleTestCase):
+    def test_formats(self):
+        outer = [[90.0, 23.0], [90.1, 23.0], [90.1, 23.1], [90.0, 23.1]]
+        self.assertEqual(zones.parse_zone(SQUARE_WITH_HOLE)[0][0], outer)
+        geojson = {'type': 'Feature', 'geometry': {'type': 'Polygon', 'coordinates': [outer + [outer[0]]]}}
+        self.assertEqual(zones.parse_zone(json.dumps(geojson)), [[outer]])
+        self.assertEqual(zones.parse_zone('23 90, 23 90.1, 23.1 90.1, 23.1 90'), [[outer]])
+        self.assertEqual(zones.parse_zone('  '), [])
+        for text in ('23 90, 23 90.1', '23 90, 23', '{"type": "Point", "coordinates": [90, 23]}', '91 0, 92 0, 93 1'):
+            with self.assertRaises(ValueError):
+                zones.parse_zone(text)
+
+    def test_holes_are_excluded(self):
+        edges = zones.polygon_edges(zones.parse_zone(SQUARE_WITH_HOLE)[0])
+        inside = zones.points_in_polygon(np.array([90.02, 90.05, 90.05]), np.array([23.02, 23.05, 23.2]), edges)
+        self.assertEqual(inside.tolist(), [True, False, False])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ZoneLocateTests(TestCase):
+    def setUp(self):
+        zones.invalidate_zones()
+        self.info = Billboard_info.objects.create(visible_zone=SQUARE_WITH_HOLE)
+        self.view = Billboard_View.objects.create(details=self.info)
+        self.billboard = Billboard.objects.create(title='b1')
+        self.billboard.views.add(self.view)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('viewer'))
+
+    def locate(self, kind=None):
+        points = [
+            {'id': 'in', 'latitude': 23.02, 'longitude': 90.02},
+            {'id': 'hole', 'latitude': 23.05, 'longitude': 90.05},
+            {'latitude': 23.2, 'longitude': 90.05},
+        ]
+        url = '/api/billboard/zones/locate/' + (f'?kind={kind}' if kind else '')
+        return self.client.post(url, points, format='json')
+
+    def test_points_are_matched_to_their_billboards(self):
+        response = self.locate()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [
+            {'id': 'in', 'billboards': [self.billboard.uuid]}, {'id': 'hole', 'billboards': []}, {'billboards': []},
+        ])
+        self.assertEqual(self.locate('observation').data[0]['billboards'], [])
+        self.assertEqual(self.locate('nope').status_code, 400)
+
+    def test_index_follows_zone_and_billboard_changes(self):
+        self.assertEqual(self.locate().data[0]['billboards'], [self.billboard.uuid])
+        # unparseable text keeps the stored polygons
+        self.info.visible_zone = 'POLYGON ((90 23'
+        self.info.save()
+        self.assertEqual(Billboard_Zone.objects.filter(info=self.info).count(), 1)
+        self.info.visible_zone = '23.2 90, 23.2 90.1, 23.3 90.1'
+        self.info.save()
+        self.assertEqual(self.locate().data[0]['billboards'], [])
+        self.info.visible_zone = SQUARE_WITH_HOLE
+        self.info.save()
+        self.assertEqual(self.locate().data[0]['billboards'], [self.billboard.uuid])
+        self.billboard.delete()
+        self.assertEqual(zones.get_zone_index().rows, [])
@@ -23,19 +23,28 @@ urlpatterns = [
   # campaign
   path('campaign/', CampaignApiView.as_view(), name='campaign'),
   path('billboard/', BillboardApiView.as_view(), name='billboard'),
+  path('billboard/nearby/', BillboardNearbyView.as_view(), name='billboard-nearby'),
+  path('billboard/zones/locate/', BillboardZoneLocateView.as_view(), name='billboard-zones-locate'),
   path('location/', LocationApiView.as_view(), name='location'),
   path('billboard_info/', BillboardInfoApiView.as_view(), name='billboard-info'),
   
   path('poi/', PoiApiView.as_view(), name='poi'),
+  path('poi/import/', PoiImportApiView.as_view(), name='poi-import'),
   path('cv_count/', CvCountApiView.as_view(), name='cv-count'),
   path('gps/', GpsApiView.as_view(), name='gps'),
+  path('gps/reach/', GpsReachView.as_view(), name='gps-reach'),
+  path('gps/bulk/', GpsBulkApiView.as_view(), name='gps-bulk'),
   path('cv/', CvApiView.as_view(), name='cv'),
+  path('cv/batch/', CvBatchApiView.as_view(), name='cv-batch'),
   path('billboard_view/', BillboardViewApiView.as_view(), name='billboard-view'),
   path('monitoring_request/', MonitoringRequestApiView.as_view(), name='monitoring-request'),
   path('monitoring_request/status', MonitoringRequestStatus.as_view(), name='monitoring-request-status'),
   path('withdraw/', WithdrawalApiView.as_view(), name='withdraw'),
   path('report/', CalculateReportView.as_view(), name='report'),
+  path('report/status/', ReportJobStatusView.as_view(), name='report-status'),
   path('report/upload/', UploadReportView.as_view(), name='report-upload'),
+  path('report/upload/status/', IngestionJobStatusView.as_view(), name='report-upload-status'),
+  path('report/upload/retry/', IngestionJobRetryView.as_view(), name='report-upload-retry'),
   path('report/delete/', ImpreessionDetailView.as_view(), name='impression-detail'),
     
 ]+ apidoc_urlpatterns 
@@ -10,11 +10,18 @@ from api.services.billboard_info import BillboardInfoApiView
 from api.services.poi import PoiApiView
 from api.services.cv_count import CvCountApiView
 from api.services.gps import GpsApiView
+from api.services.gps_devices import GpsReachView
+from api.services.gps_ingestion import GpsBulkApiView
+from api.services.proximity import BillboardNearbyView
+from api.services.poi_import import PoiImportApiView
+from api.services.zones import BillboardZoneLocateView
 from api.services.cv import CvApiView
+from api.services.cv_ingestion import CvBatchApiView
 from api.services.billboard_view import BillboardViewApiView
 from api.services.withdraw import WithdrawalApiView
 from api.services.notification import NotificationApiView
-from api.services.report import CalculateReportView, UploadReportView, ImpreessionDetailView
+from api.services.report import CalculateReportView, ReportJobStatusView, UploadReportView, ImpreessionDetailView
+from api.services.ingestion_jobs import IngestionJobStatusView, IngestionJobRetryView
 
 
 
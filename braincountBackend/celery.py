@@ -20,6 +20,22 @@ app.conf.beat_schedule = {
         'task': 'api.tasks.update_impressions_hourly',
         'schedule': crontab(minute=0),  # Run at the start of every hour
     },
+    'flush-live-cv-counters': {
+        'task': 'api.tasks.flush_live_cv_counters',
+        'schedule': crontab(minute='*/5'),
+    },
+    'refresh-pending-impression-rollups': {
+        'task': 'api.tasks.refresh_pending_impression_rollups',
+        'schedule': crontab(minute='*/10'),
+    },
+    'archive-expired-events': {
+        'task': 'api.tasks.archive_expired_events',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    'update-billboard-neighbours': {
+        'task': 'api.tasks.update_billboard_neighbours',
+        'schedule': crontab(hour=4, minute=0),
+    },
 }
 
 # Set max interval to 1 hour (3600 seconds)
@@ -62,6 +62,23 @@ CHANNEL_LAYERS = {
         },
     },
 }
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://127.0.0.1:6379/1",
+        "TIMEOUT": 60 * 60,
+    },
+}
+# Campaign reports are invalidated on write, the TTL only bounds memory use
+REPORT_CACHE_TIMEOUT = 6 * 60 * 60
+# Live CV counters (cv/batch/?live=true), flushed into Impression by celery beat
+LIVE_COUNTERS_REDIS_URL = 'redis://127.0.0.1:6379/2'
+# Raw Cv/Gps rows older than this many days are archived to EVENT_ARCHIVE_ROOT/event_archives/
+CV_RETENTION_DAYS = 30
+GPS_RETENTION_DAYS = 365
+# Billboard POI catchment radii, run rebuild_poi_catchments after changing them
+POI_CATCHMENT_RADII_M = [250, 500, 1000]
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -196,6 +213,19 @@ if DEBUG:
 else:
     MEDIA_ROOT = '/projects/braincount/media/'
 
+# Uploaded ingestion files hold device ids and IPs, keep them out of MEDIA_ROOT
+# so they are never served
+if DEBUG:
+    INGESTION_UPLOAD_ROOT = BASE_DIR / 'uploads'
+else:
+    INGESTION_UPLOAD_ROOT = '/projects/braincount/uploads/'
+
+# Event archives are raw Cv/Gps rows, kept private like the uploads
+if DEBUG:
+    EVENT_ARCHIVE_ROOT = BASE_DIR / 'archives'
+else:
+    EVENT_ARCHIVE_ROOT = '/projects/braincount/archives/'
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880 
 